@@ -0,0 +1,104 @@
+"""
+The original per-pixel encoders of `Pixoo` (16x16) and `PixooMax` (32x32), kept as the
+reference the optimized encoders must match byte for byte, the golden corpus of frames they
+are compared on and the comparison itself (used by tests/test_encoder.py and benchmarks/run.py).
+"""
+import random
+from math import ceil, log10
+
+from PIL import Image
+
+from modules.pixoo_client import Pixoo, PixooMax
+from modules.time import draw_time
+
+COLOR_COUNTS = (2, 16, 256, 1024)
+ENCODERS = ((Pixoo, 16, False), (PixooMax, 32, True))  # device class, size, pads the pixel data
+
+
+def random_image(size, nb_colors, seed=0):
+    """
+    A size x size RGBA image using (at most) nb_colors random colors.
+    """
+    rand = random.Random(seed)
+    colors = [bytes(rand.randrange(256) for _ in range(3)) + b"\xff" for _ in range(nb_colors)]
+    pixels = [colors[i % nb_colors] for i in range(size * size)]  # every color shows up
+    rand.shuffle(pixels)
+    return Image.frombytes("RGBA", (size, size), b"".join(pixels))
+
+
+def golden_corpus(size):
+    """
+    The frames a `size` px encoder is checked on: random frames with 2 to 1024 colors (RGBA and
+    RGB), clock frames and a frame that has to be scaled down first.
+    """
+    corpus = [random_image(size, n, seed) for n in COLOR_COUNTS if n <= size * size for seed in range(3)]
+    corpus += [img.convert(mode="RGB") for img in corpus[::3]]
+    corpus += [draw_time(32, 32).resize((size, size)), draw_time(size, size), random_image(size * 2, 50)]
+    return corpus
+
+
+def reference_encode(img, size, pad):
+    """
+    Encode a `size` x `size` image like the original encoders did. `pad` selects the PixooMax
+    behaviour of always appending the leftover bits as one last byte.
+    """
+    w, h = img.size
+    if w != h:
+        return None
+    if w > size:
+        img = img.resize((size, size))
+
+    # create palette and pixel array
+    pixels = []
+    palette = []
+    for y in range(size):
+        for x in range(size):
+            r, g, b = img.getpixel((x, y))[:3]
+            if (r, g, b) not in palette:
+                palette.append((r, g, b))
+                idx = len(palette) - 1
+            else:
+                idx = palette.index((r, g, b))
+            pixels.append(idx)
+
+    # encode pixels
+    bitwidth = ceil(log10(len(palette)) / log10(2))
+    encoded_pixels = []
+    encoded_byte = ""
+    if pad:
+        # PixooMax: build the whole bitstream, then cut it into bytes
+        for i in pixels:
+            encoded_byte = bin(i)[2:].rjust(bitwidth, "0") + encoded_byte
+        while len(encoded_byte) >= 8:
+            encoded_pixels.append(encoded_byte[-8:])
+            encoded_byte = encoded_byte[:-8]
+
+        # if some bits are left, pack and encode
+        encoded_pixels.append(encoded_byte.rjust(bitwidth, "0"))
+    else:
+        for i in pixels:
+            encoded_byte = bin(i)[2:].rjust(bitwidth, "0") + encoded_byte
+            if len(encoded_byte) >= 8:
+                encoded_pixels.append(encoded_byte[-8:])
+                encoded_byte = encoded_byte[:-8]
+
+    encoded_data = [int(c, 2) for c in encoded_pixels]
+    encoded_palette = []
+    for r, g, b in palette:
+        encoded_palette += [r, g, b]
+    return (len(palette), encoded_palette, encoded_data)
+
+
+def encoder_mismatches():
+    """
+    Compare the encoders against the reference implementation, return the list of mismatches.
+    """
+    mismatches = []
+    for device_class, size, pad in ENCODERS:
+        device = device_class("record://")
+        for img in golden_corpus(size):
+            nb_colors, palette, pixel_data = device.encode_raw_image(img)
+            if (nb_colors, list(palette), list(pixel_data)) != reference_encode(img, size, pad):
+                colors = len(img.getcolors(1 << 24))
+                mismatches.append(f"{device_class.__name__} {img.mode} {img.size} {colors} colors")
+    return mismatches
@@ -0,0 +1,168 @@
+"""
+Benchmarks for the render, encode and framing hot paths.
+
+    python -m benchmarks.run                   # run and compare against benchmarks/baseline.json
+    python -m benchmarks.run --save-baseline   # run and store the results as the new baseline
+    python -m benchmarks.run encode            # only run benchmarks whose name contains "encode"
+
+Every benchmark reports per-call latency percentiles and the memory blocks a call leaves
+allocated (from tracemalloc snapshots before and after it), e.g. caches growing or leaks.
+The run fails (exit code 1) if an encoder doesn't match the reference encoder byte for byte,
+or if a p50 got slower than the baseline by more than the tolerance. Timings only compare on
+the same machine, so the baseline is not part of the repository: save your own first.
+"""
+import argparse
+import json
+import sys
+import tempfile
+import tracemalloc
+from io import BytesIO
+from pathlib import Path
+from statistics import quantiles
+from time import perf_counter_ns
+
+from benchmarks.reference_encoder import COLOR_COUNTS, encoder_mismatches, random_image, reference_encode
+from modules.container import FrameContainer, compile_frames, load_frames, play
+from modules.fake_device import FakePixoo
+from modules.pixoo_client import Pixoo, PixooMax, spp_checksum
+from modules.quantize import Quantizer
+from modules.time import draw_time
+
+BASELINE_FILE = Path(__file__).with_name("baseline.json")
+
+
+def animated_gif(nb_frames=20, size=16):
+    buffer = BytesIO()
+    frames = [random_image(size, 16, seed).convert(mode="RGB") for seed in range(nb_frames)]
+    frames[0].save(buffer, format="GIF", save_all=True, append_images=frames[1:], duration=100, loop=0)
+    return buffer.getvalue()
+
+
+def measure(func, iterations, warmup=3):
+    """
+    Run func repeatedly, return the per-call latencies (ns) and the number and size (bytes) of
+    the memory blocks a call leaves allocated.
+    """
+    for _ in range(warmup):
+        func()
+
+    timings = []
+    for _ in range(iterations):
+        started = perf_counter_ns()
+        func()
+        timings.append(perf_counter_ns() - started)
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    func()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    ignored = (tracemalloc.Filter(False, tracemalloc.__file__),)
+    stats = after.filter_traces(ignored).compare_to(before.filter_traces(ignored), "lineno")
+    blocks = sum(stat.count_diff for stat in stats)
+    size = sum(stat.size_diff for stat in stats)
+    return timings, (blocks, size)
+
+
+def benchmarks():
+    """
+    Yield (name, function, iterations) for every benchmark.
+    """
+    for size in (16, 21, 32):
+        yield f"draw_time[{size}]", lambda size=size: draw_time(size, size), 300
+
+    for device_class, size in ((Pixoo, 16), (PixooMax, 32)):
+        device = device_class("record://")
+        for nb_colors in COLOR_COUNTS:
+            if nb_colors > size * size:
+                continue
+            img = random_image(size, nb_colors)
+            yield f"{device_class.__name__}.encode_raw_image[{nb_colors}]", lambda d=device, i=img: (
+                d.encode_raw_image(i)
+            ), 100
+
+    photo = random_image(32, 1024).convert(mode="RGB")
+    for quantizer in (Quantizer(256), Quantizer(16), Quantizer(16, stable=True), Quantizer(256, "web")):
+        device = PixooMax("record://", quantizer=quantizer)
+        name = f"{quantizer.method}[{quantizer.colors}{', stable' if quantizer.stable else ''}]"
+        yield f"PixooMax.encode_pil_image {name}", lambda d=device: d.encode_pil_image(photo), 100
+
+    img = random_image(32, 256)
+    yield "reference_encode[256] (original encoder)", lambda: reference_encode(img, 32, True), 20
+
+    device = PixooMax("record://")
+    payload = bytes(device.encode_pic(random_image(32, 256))[4:-3])
+    frame_encode = getattr(device, "_Pixoo__spp_frame_encode")
+    frame = frame_encode(0x44, payload)
+    yield "spp_frame_encode[256 colors]", lambda: frame_encode(0x44, payload), 1000
+    yield "spp_frame_checksum[256 colors]", lambda: spp_checksum(frame), 1000
+
+    gif = animated_gif()
+    recorder = Pixoo("record://")
+    recorder.connect()
+    yield "Pixoo.draw_gif[20 frames]", lambda: recorder.draw_gif(BytesIO(gif)), 20
+
+    with tempfile.TemporaryDirectory() as temporary:
+        directory = Path(temporary)
+        (directory / "anim.gif").write_bytes(gif)
+        frames = load_frames([directory / "anim.gif"])
+        paced_file, unpaced_file = directory / "anim.pxf", directory / "unpaced.pxf"
+        compile_frames(frames, paced_file, Pixoo)
+        compile_frames([(img, 0) for img, _ in frames], unpaced_file, Pixoo)  # played live without waiting
+        with FrameContainer(paced_file) as container, FrameContainer(unpaced_file) as unpaced:
+            yield "play[20 frames, compiled draw_gif]", lambda: play(container, recorder), 20
+            yield "play[20 frames, live]", lambda: play(unpaced, recorder, live=True), 20
+
+    fake = FakePixoo()
+    fake.start()
+    device = PixooMax(fake.address, skip_unchanged=False)
+    device.connect()
+    yield "end_to_end[draw_time + PixooMax.draw_image over tcp]", lambda: (
+        device.draw_image(draw_time(32, 32))
+    ), 200
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    arg_parser.add_argument("filter", nargs="?", default="", help="only run benchmarks containing this")
+    arg_parser.add_argument("--save-baseline", action="store_true", help="store the results as baseline")
+    arg_parser.add_argument("--tolerance", type=float, default=0.25, help="allowed p50 slowdown, 0.25 = 25%%")
+    options = arg_parser.parse_args()
+
+    failed = False
+    mismatches = encoder_mismatches()
+    for mismatch in mismatches:
+        print(f"[!] Encoder output differs from the reference: {mismatch}")
+        failed = True
+
+    baseline = json.loads(BASELINE_FILE.read_text(encoding="utf-8")) if BASELINE_FILE.exists() else {}
+    results = {}
+    print(f"{'benchmark':<58} {'p50 us':>9} {'p90 us':>9} {'p99 us':>9} {'blocks':>7} {'KiB':>7}")
+    for name, func, iterations in benchmarks():
+        if options.filter not in name:
+            continue
+        timings, (blocks, size) = measure(func, iterations)
+        p50, p90, p99 = (quantiles(timings, n=100)[i] / 1000 for i in (49, 89, 98))
+        results[name] = {"p50": p50, "p90": p90, "p99": p99, "blocks": blocks, "bytes": size}
+
+        line = f"{name:<58} {p50:9.1f} {p90:9.1f} {p99:9.1f} {blocks:7d} {size / 1024:7.1f}"
+        if name in baseline and not options.save_baseline:
+            change = p50 / baseline[name]["p50"] - 1
+            line += f"  {change:+.0%} vs baseline"
+            if change > options.tolerance:
+                line += "  <-- REGRESSION"
+                failed = True
+        print(line)
+
+    if options.save_baseline:
+        baseline.update(results)
+        BASELINE_FILE.write_text(json.dumps(baseline, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+        print(f"Baseline saved to {BASELINE_FILE}")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
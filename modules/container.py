@@ -0,0 +1,231 @@
+"""
+Animations compiled once into a file of ready to send frames, played from a memory map.
+
+A container holds the frames of one animation for one device type: every frame as a complete
+picture (0x44) SPP frame with its duration, and the animation upload (0x49) chunks if the
+animation fits the 64 KiB the device accepts. Playing it only hands out slices of the memory
+mapped file, made once when it is opened: nothing is decoded, encoded or copied, the kernel pages
+the frames in as they are sent.
+
+    python -m modules.container compile nyan.gif nyan.pxf                  # a Gif
+    python -m modules.container compile frames/ frames.pxf --speed 80      # a folder of pictures
+    python -m modules.container compile a.png b.png abc.pxf --device pixoo # files, like draw_anim
+    python -m modules.container play nyan.pxf tcp://127.0.0.1:4000          # upload, the device loops it
+    python -m modules.container play nyan.pxf tcp://127.0.0.1:4000 --live --loops 0
+    python -m modules.container info nyan.pxf
+
+File layout (little endian): the header, the frame index, the chunk index, the frames and chunks.
+    header:      magic "PXFC", version (u8), display size (u8), frame count (u16), chunk count (u16)
+    frame index: offset (u32), length (u32) and duration in ms (u16) of every picture frame
+    chunk index: offset (u32) and length (u32) of every upload chunk
+"""
+import argparse
+import mmap
+import os
+import struct
+from pathlib import Path
+from threading import Event
+from time import monotonic
+
+from PIL import Image
+
+from modules.devices import DEFAULT_DEVICE_TYPE, DEVICE_TYPES
+from modules.pixoo_client import PixooMax
+
+MAGIC = b"PXFC"
+VERSION = 1
+HEADER = struct.Struct("<4sBBHH")
+FRAME_ENTRY = struct.Struct("<IIH")
+CHUNK_ENTRY = struct.Struct("<II")
+MAX_ANIMATION_SIZE = 0xFFFF  # bytes of frame data an upload can carry
+EXTENSIONS = (".png", ".gif", ".jpg", ".jpeg", ".bmp", ".webp")
+
+
+def load_frames(inputs, speed=100):
+    """
+    (RGBA image, duration in ms) of every frame of the inputs: Gifs (with their own durations),
+    folders of pictures (sorted by name) and picture files, shown `speed` ms each.
+    """
+    frames = []
+    for path in map(Path, inputs):
+        paths = [path]
+        if path.is_dir():
+            paths = sorted(picture for picture in path.iterdir() if picture.suffix.lower() in EXTENSIONS)
+        for picture in paths:
+            with Image.open(picture) as img:
+                for n in range(getattr(img, "n_frames", 1)):
+                    img.seek(n)
+                    frames.append((img.convert(mode="RGBA"), img.info.get("duration") or speed))
+    return frames
+
+
+def upload_chunks(device, frames):
+    """
+    The animation upload (0x49) chunks of the frames, ValueError if they don't fit an upload.
+    """
+    if isinstance(device, PixooMax):
+        return list(device.iter_anim_chunks(lambda: iter(frames)))
+
+    # the Pixoo animation format has a single speed, the one of the first frame
+    encoded = [device.encode_pil_image(img) for img, _ in frames]
+    total_size = sum(7 + len(palette) + len(pixel_data) for _, palette, pixel_data in encoded)
+    if total_size > MAX_ANIMATION_SIZE:
+        raise ValueError(f"Animation too large ({total_size} bytes, {MAX_ANIMATION_SIZE} max)")
+    return device.build_anim_frames(encoded, frames[0][1])
+
+
+def compile_frames(frames, path, device_class=PixooMax):
+    """
+    Encode frames ((image, duration in ms) pairs) for device_class and write them to a container.
+    Returns (number of frames, number of upload chunks, file size).
+    """
+    assert frames, "Nothing to compile"
+    device = device_class("record://")
+    pictures = [(device.build_pic(img), min(duration, 0xFFFF)) for img, duration in frames]
+    try:
+        chunks = upload_chunks(device, frames)
+    except ValueError as error:
+        print(f"[!] {error}, the animation can only be played live")
+        chunks = []
+
+    offset = HEADER.size + len(pictures) * FRAME_ENTRY.size + len(chunks) * CHUNK_ENTRY.size
+    index = bytearray(HEADER.pack(MAGIC, VERSION, device_class.SIZE, len(pictures), len(chunks)))
+    for frame, duration in pictures:
+        index += FRAME_ENTRY.pack(offset, len(frame), duration)
+        offset += len(frame)
+    for chunk in chunks:
+        index += CHUNK_ENTRY.pack(offset, len(chunk))
+        offset += len(chunk)
+
+    path = Path(path)
+    temporary = path.with_name(path.name + ".tmp")
+    with open(temporary, "wb") as file:
+        file.write(index)
+        for frame, _ in pictures:
+            file.write(frame)
+        for chunk in chunks:
+            file.write(chunk)
+    os.replace(temporary, path)  # a player never sees a half written container
+    return len(pictures), len(chunks), offset
+
+
+class FrameContainer:
+    """
+    A compiled container, memory mapped read only.
+
+    `frames` are (picture frame, duration in ms) and `chunks` the upload frames, all of them
+    memoryviews into the file, valid until `close`.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.size, frame_count, chunk_count = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or version != VERSION:
+            self.map.close()
+            raise ValueError(f"{path} is no frame container (version {VERSION})")
+
+        self.view = memoryview(self.map)
+        offset = HEADER.size
+        self.frames = []
+        for _ in range(frame_count):
+            start, length, duration = FRAME_ENTRY.unpack_from(self.map, offset)
+            self.frames.append((self.view[start : start + length], duration))
+            offset += FRAME_ENTRY.size
+        self.chunks = []
+        for _ in range(chunk_count):
+            start, length = CHUNK_ENTRY.unpack_from(self.map, offset)
+            self.chunks.append(self.view[start : start + length])
+            offset += CHUNK_ENTRY.size
+
+    @property
+    def duration(self):
+        """
+        Milliseconds one loop takes.
+        """
+        return sum(duration for _, duration in self.frames)
+
+    def close(self):
+        for frame, _ in self.frames:
+            frame.release()
+        for chunk in self.chunks:
+            chunk.release()
+        self.frames, self.chunks = [], []
+        self.view.release()
+        self.map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def play(container, device, live=False, loops=1, stop_event=None):
+    """
+    Upload the animation to a device (which then loops it on its own), or with `live` send its
+    pictures one by one, `loops` times (0: until `stop_event` is set), paced by their durations.
+    Returns False if the upload was not (fully) sent.
+    """
+    assert container.size == device.SIZE, f"Compiled for {container.size}px, the device has {device.SIZE}px"
+    if not live:
+        assert container.chunks, "The animation is too large to upload, play it live"
+        return device.send_anim_chunks(container.chunks)
+
+    stop_event = stop_event or Event()
+    deadline = monotonic()
+    loop = 0
+    while not loops or loop < loops:
+        for frame, duration in container.frames:
+            device.send_pic(frame)
+            deadline += duration / 1000
+            if stop_event.wait(max(deadline - monotonic(), 0)):
+                return True
+        loop += 1
+    return True
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Compile animations into containers and play them.")
+    commands = arg_parser.add_subparsers(dest="command", required=True)
+    compile_parser = commands.add_parser("compile", help="compile a Gif, a folder or picture files")
+    compile_parser.add_argument("inputs", nargs="+", help="Gifs, folders of pictures or picture files")
+    compile_parser.add_argument("output", help="the container to write")
+    compile_parser.add_argument("--device", choices=DEVICE_TYPES, default=DEFAULT_DEVICE_TYPE)
+    compile_parser.add_argument("--speed", type=int, default=100, help="ms per picture without a duration")
+    play_parser = commands.add_parser("play", help="play a container on a device")
+    play_parser.add_argument("container")
+    play_parser.add_argument("address", help="a Bluetooth mac address or e.g. tcp://127.0.0.1:4000")
+    play_parser.add_argument("--live", action="store_true", help="send picture frames instead of uploading")
+    play_parser.add_argument("--loops", type=int, default=1, help="loops to play live, 0 = forever")
+    info_parser = commands.add_parser("info", help="describe a container")
+    info_parser.add_argument("container")
+    options = arg_parser.parse_args()
+
+    if options.command == "compile":
+        frame_count, chunk_count, file_size = compile_frames(
+            load_frames(options.inputs, options.speed), options.output, DEVICE_TYPES[options.device]
+        )
+        print(f"{options.output}: {frame_count} frames, {chunk_count} upload chunks, {file_size} bytes")
+    elif options.command == "info":
+        with FrameContainer(options.container) as compiled:
+            print(
+                f"{options.container}: {compiled.size}x{compiled.size}, {len(compiled.frames)} frames, "
+                f"{compiled.duration} ms per loop, {len(compiled.chunks)} upload chunks"
+            )
+    else:
+        with FrameContainer(options.container) as compiled:
+            device_class = next(cls for cls in DEVICE_TYPES.values() if cls.SIZE == compiled.size)
+            pixoo = device_class(options.address)
+            pixoo.connect()
+            try:
+                if not play(compiled, pixoo, options.live, options.loops):
+                    print("[!] The upload was not fully sent")
+            except KeyboardInterrupt:
+                pass
+            finally:
+                pixoo.transport.close()
+
+
+if __name__ == "__main__":
+    main()
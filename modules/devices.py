@@ -0,0 +1,109 @@
+from modules.pixoo_client import Pixoo, PixooMax, frame_fingerprint
+
+DEVICE_TYPES = {"pixoo": Pixoo, "pixoo_max": PixooMax}
+DEFAULT_DEVICE_TYPE = "pixoo_max"
+MAX_RECONNECT_DELAY = 30  # seconds
+
+
+def parse_devices(config):
+    """
+    Parse a device list like "11:75:58:F0:DE:D6=pixoo_max, 11:75:58:F0:DE:D7=pixoo" into
+    (address, device class) tuples. The type is optional and defaults to pixoo_max.
+    """
+    devices = []
+    for entry in config.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        address, _, type_name = entry.partition("=")
+        type_name = type_name.strip() or DEFAULT_DEVICE_TYPE
+        assert type_name in DEVICE_TYPES, f"Unknown device type {type_name!r} (use {list(DEVICE_TYPES)})"
+        devices.append((address.strip(), DEVICE_TYPES[type_name]))
+    return devices
+
+
+class DeviceManager:
+    """
+    Drive several Pixoo devices with the same scene.
+
+    A frame is encoded once per device type and handed to every device that needs it. Each
+    device connects and sends from its own LinkSupervisor, so an offline device only delays
+    itself and sending never blocks. Settings sent with `command` are sent again whenever a
+    device reconnects. `device_options` are passed on to every device (e.g. a shared frame_cache).
+    """
+
+    def __init__(self, devices, **device_options):
+        self.devices = [device_class(address, **device_options) for address, device_class in devices]
+        self.commands = {}  # method name: arguments of the last call
+
+    def start(self):
+        for device in self.devices:
+            device.supervise(max_delay=MAX_RECONNECT_DELAY, on_connect=self.__restore)
+
+    def stop(self):
+        for device in self.devices:
+            if device.supervisor is not None:
+                device.supervisor.stop()
+
+    @property
+    def dropped(self):
+        return sum(device.supervisor.health.dropped for device in self.devices if device.supervisor)
+
+    def encode(self, img):
+        """
+        Encode a frame for every device that didn't show it yet.
+        Returns a {device index: payload} dict, or None if no device needs the frame.
+        """
+        fingerprint = frame_fingerprint(img)
+        payloads_by_type = {}
+        payloads = {}
+        for idx, device in enumerate(self.devices):
+            if not device.connected:
+                continue  # offline devices get the first frame after they reconnect
+            if device.is_unchanged(img, fingerprint):
+                device.frames_skipped += 1
+                continue
+
+            device.remember_frame(img, fingerprint)
+            device_type = type(device)
+            if device_type not in payloads_by_type:
+                payloads_by_type[device_type] = device.encode_pic(img, fingerprint)
+            payloads[idx] = payloads_by_type[device_type]
+        return payloads or None
+
+    def send(self, payloads):
+        """
+        Hand encoded payloads to their devices, replacing frames they didn't send yet.
+        """
+        for idx, payload in payloads.items():
+            self.devices[idx].send_pic(payload)
+
+    def command(self, name, *args):
+        """
+        Call a device method (e.g. "set_system_brightness") on every connected device.
+        """
+        self.commands[name] = args
+        for device in self.devices:
+            if device.connected:
+                getattr(device, name)(*args)
+
+    def forget_frames(self):
+        """
+        Send the next frame to every device, even if it didn't change (see Pixoo.forget_frame).
+        """
+        for device in self.devices:
+            device.forget_frame()
+
+    def health(self):
+        """
+        Link health statistics (see LinkHealth.stats) by device address.
+        """
+        return {
+            device.mac_address: device.supervisor.health.stats()
+            for device in self.devices
+            if device.supervisor is not None
+        }
+
+    def __restore(self, device):
+        for name, args in list(self.commands.items()):
+            getattr(device, name)(*args)
@@ -0,0 +1,204 @@
+"""
+A stand-in for a Pixoo device: parses the SPP frames sent by `Pixoo`, checks their checksums,
+decodes pictures back into images and simulates a slow link.
+
+Run `python -m modules.fake_device --port 4000` and use "tcp://127.0.0.1:4000" as device address.
+"""
+import argparse
+import socket
+import socketserver
+from collections import Counter
+from threading import Lock, Thread
+from time import monotonic, sleep
+
+from PIL import Image
+
+PIC_PREFIX = bytes([0x0, 0x0A, 0x0A, 0x04])
+
+
+class SppFrameParser:
+    """
+    Split a byte stream into (cmd, args) frames:
+    0x01, payload size (2 bytes, cmd + args + checksum), cmd, args, checksum (2 bytes), 0x02.
+    Garbage and frames with a bad checksum are counted and skipped.
+    """
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.bad_checksums = 0
+        self.garbage_bytes = 0
+
+    def feed(self, data):
+        """
+        Add received bytes, return the list of frames completed by them.
+        """
+        self.buffer += data
+        frames = []
+        while True:
+            start = self.buffer.find(1)
+            if start < 0:
+                self.garbage_bytes += len(self.buffer)
+                self.buffer.clear()
+                return frames
+            if start > 0:
+                self.garbage_bytes += start
+                del self.buffer[:start]
+            if len(self.buffer) < 3:
+                return frames
+
+            frame_size = 3 + (self.buffer[1] | (self.buffer[2] << 8)) + 1
+            if len(self.buffer) < frame_size:
+                return frames
+
+            frame = memoryview(self.buffer)[:frame_size]
+            checksum = frame[-3] | (frame[-2] << 8)
+            valid = frame[-1] == 2 and sum(frame[1:-3]) & 0xFFFF == checksum
+            cmd, args = frame[3], bytes(frame[4:-3])
+            frame.release()
+            if not valid:
+                self.bad_checksums += 1
+                self.garbage_bytes += 1
+                del self.buffer[:1]  # resync on the next start byte
+                continue
+
+            frames.append((cmd, args))
+            del self.buffer[:frame_size]
+
+
+def decode_pic(args):
+    """
+    Decode the arguments of a picture (0x44) command back into an RGB image.
+    """
+    if args[:4] != PIC_PREFIX or args[4] != 0xAA:
+        raise ValueError("Not a picture frame")
+
+    if args[9] == 3:  # 32x32, the number of colors takes 2 bytes
+        size, nb_colors, offset = 32, args[10] | (args[11] << 8), 12
+    else:
+        size, nb_colors, offset = 16, args[10] or 256, 11
+
+    palette = args[offset : offset + 3 * nb_colors]
+    if len(palette) != 3 * nb_colors:
+        raise ValueError("Truncated palette")
+
+    bitwidth = max((nb_colors - 1).bit_length(), 1)
+    bits = int.from_bytes(args[offset + 3 * nb_colors :], "little")
+    mask = (1 << bitwidth) - 1
+    rgb = bytearray()
+    for i in range(size * size):
+        idx = (bits >> (i * bitwidth)) & mask
+        if idx >= nb_colors:
+            raise ValueError(f"Pixel {i} uses color {idx} of {nb_colors}")
+        rgb += palette[3 * idx : 3 * idx + 3]
+    return Image.frombytes("RGB", (size, size), bytes(rgb))
+
+
+class FakePixooHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        server = self.server
+        parser = SppFrameParser()
+        self.request.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, server.receive_buffer)
+        while True:
+            data = self.request.recv(server.receive_buffer)
+            if not data:
+                break
+            if server.bandwidth:
+                sleep(len(data) / server.bandwidth)  # bytes per second of the simulated link
+
+            for cmd, args in parser.feed(data):
+                if server.latency:
+                    sleep(server.latency)
+                server.handle_frame(cmd, args)
+
+            with server.lock:
+                server.bytes_received += len(data)
+                server.bad_checksums += parser.bad_checksums
+                server.garbage_bytes += parser.garbage_bytes
+            parser.bad_checksums = parser.garbage_bytes = 0
+
+
+class FakePixoo(socketserver.ThreadingTCPServer):
+    """
+    TCP server that behaves like a Pixoo device. `bandwidth` (bytes/s) and `latency` (seconds
+    per frame) slow it down like a Bluetooth link would.
+    """
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, address=("127.0.0.1", 0), bandwidth=0, latency=0, receive_buffer=4096, save=None):
+        super().__init__(address, FakePixooHandler)
+        self.bandwidth = bandwidth
+        self.latency = latency
+        self.receive_buffer = receive_buffer
+        self.save = save
+
+        self.lock = Lock()
+        self.commands = Counter()
+        self.bytes_received = 0
+        self.bad_checksums = 0
+        self.garbage_bytes = 0
+        self.bad_pictures = 0
+        self.last_image = None
+        self.last_frame_at = None
+
+    @property
+    def address(self):
+        host, port = self.server_address[:2]
+        return f"tcp://{host}:{port}"
+
+    def handle_frame(self, cmd, args):
+        image = None
+        if cmd == 0x44:
+            try:
+                image = decode_pic(args)
+            except (ValueError, IndexError) as error:
+                print(f"[!] Bad picture: {error}")
+                with self.lock:
+                    self.bad_pictures += 1
+
+        with self.lock:
+            self.commands[cmd] += 1
+            self.last_frame_at = monotonic()
+            if image is not None:
+                self.last_image = image
+        if image is not None and self.save:
+            image.save(self.save)
+
+    def start(self):
+        """
+        Serve from a background thread, returns the thread.
+        """
+        thread = Thread(target=self.serve_forever, name="fake-pixoo", daemon=True)
+        thread.start()
+        return thread
+
+    def stats(self):
+        with self.lock:
+            return {
+                "commands": dict(self.commands),
+                "bytes_received": self.bytes_received,
+                "bad_checksums": self.bad_checksums,
+                "garbage_bytes": self.garbage_bytes,
+                "bad_pictures": self.bad_pictures,
+            }
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Pretend to be a Pixoo device on a TCP port.")
+    arg_parser.add_argument("--host", default="127.0.0.1")
+    arg_parser.add_argument("--port", type=int, default=4000)
+    arg_parser.add_argument("--bandwidth", type=float, default=0, help="link speed in bytes/s, 0 = unlimited")
+    arg_parser.add_argument("--latency", type=float, default=0, help="seconds spent on every frame")
+    arg_parser.add_argument("--save", help="save the last received picture to this file")
+    options = arg_parser.parse_args()
+
+    fake = FakePixoo((options.host, options.port), options.bandwidth, options.latency, save=options.save)
+    print(f"Fake Pixoo listening on {fake.address}")
+    fake.start()
+    try:
+        while True:
+            sleep(10)
+            print(fake.stats())
+    except KeyboardInterrupt:
+        fake.shutdown()
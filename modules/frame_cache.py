@@ -0,0 +1,180 @@
+import hashlib
+import os
+import struct
+from collections import OrderedDict
+from pathlib import Path
+from threading import Lock
+
+MAGIC = b"PXFC"  # a frame file: MAGIC, 1 if the payload is a list, then length prefixed parts
+FILE_HEADER = struct.Struct("<4sB")
+LENGTH = struct.Struct("<I")
+
+
+def content_hash(*sources):
+    """
+    Digest of the content of files (paths or binary file objects) and other hashable values.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for source in sources:
+        if hasattr(source, "read"):
+            position = source.tell()
+            digest.update(source.read())
+            source.seek(position)
+        elif isinstance(source, (str, Path)):
+            digest.update(Path(source).read_bytes())
+        else:
+            digest.update(repr(source).encode())
+    return digest.digest()
+
+
+class FrameCache:
+    """
+    LRU cache of encoded payloads (a bytes object or a list of them), bounded by their total size.
+
+    With a `directory` every new entry is also written to disk (once, atomically) and loaded
+    again on startup, so a restart begins with a warm cache. A file is named by the digest of its
+    key and holds only the payload, nothing in it is evaluated. Files that can't be loaded are
+    treated as misses and removed.
+
+    Entries are kept by the digest of their keys, the keys only need a stable repr.
+    """
+
+    def __init__(self, max_bytes=8 * 1024 * 1024, directory=None):
+        self.max_bytes = max_bytes
+        self.directory = Path(directory) if directory else None
+        self.entries = OrderedDict()
+        self.lock = Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if self.directory:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self.__load()
+
+    @staticmethod
+    def size_of(value):
+        return len(value) if isinstance(value, (bytes, bytearray)) else sum(len(part) for part in value)
+
+    @staticmethod
+    def name_of(key):
+        return hashlib.blake2b(repr(key).encode(), digest_size=16).hexdigest()
+
+    def get(self, key):
+        name = self.name_of(key)
+        with self.lock:
+            value = self.entries.get(name)
+            if value is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(name)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        size = self.size_of(value)
+        if size > self.max_bytes:
+            return
+
+        name = self.name_of(key)
+        with self.lock:
+            known = name in self.entries
+            if known:
+                self.bytes -= self.size_of(self.entries.pop(name))
+            self.entries[name] = value
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                old_name, old_value = self.entries.popitem(last=False)
+                self.bytes -= self.size_of(old_value)
+                self.evictions += 1
+                if self.directory:
+                    self.__file_for(old_name).unlink(missing_ok=True)
+            if self.directory and not known:  # keys are content hashes, a known entry is on disk already
+                self.__write(name, value)
+
+    def get_or_build(self, key, build):
+        """
+        Return the cached value for key, or build, cache and return it.
+        """
+        value = self.get(key)
+        if value is None:
+            value = build()
+            self.put(key, value)
+        return value
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "bytes": self.bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def __file_for(self, name):
+        return self.directory / f"{name}.frame"
+
+    def __write(self, name, value):
+        path = self.__file_for(name)
+        temporary = path.with_suffix(".tmp")
+        parts = [value] if isinstance(value, (bytes, bytearray)) else value
+        try:
+            with open(temporary, "wb") as file:
+                file.write(FILE_HEADER.pack(MAGIC, parts is value))
+                for part in parts:
+                    file.write(LENGTH.pack(len(part)))
+                    file.write(part)
+            os.replace(temporary, path)  # a crash while writing never leaves a truncated entry
+        except OSError as error:
+            print(f"[!] Writing the frame cache failed: {error}")
+
+    @staticmethod
+    def read_file(path):
+        """
+        The payload of a frame file, raises ValueError if it is truncated or not a frame file.
+        """
+        data = path.read_bytes()
+        if len(data) < FILE_HEADER.size:
+            raise ValueError("Truncated")
+        magic, is_list = FILE_HEADER.unpack_from(data)
+        if magic != MAGIC or is_list > 1:
+            raise ValueError("Not a frame file")
+        parts, offset = [], FILE_HEADER.size
+        while offset < len(data):
+            if offset + LENGTH.size > len(data):
+                raise ValueError("Truncated")
+            (length,) = LENGTH.unpack_from(data, offset)
+            offset += LENGTH.size
+            if offset + length > len(data):
+                raise ValueError("Truncated")
+            parts.append(data[offset : offset + length])
+            offset += length
+        if is_list:
+            return parts
+        if len(parts) != 1:
+            raise ValueError("Not a frame file")
+        return parts[0]
+
+    def __load(self):
+        for path in self.directory.glob("*.tmp"):
+            path.unlink(missing_ok=True)  # left over by a crash while writing
+        # the most recently written files are the most recently used ones
+        files = sorted(self.directory.glob("*.frame"), key=lambda path: path.stat().st_mtime)
+        for path in files:
+            try:
+                value = self.read_file(path)
+            except (OSError, ValueError):
+                # truncated, from another version or not ours at all: a miss, built again when needed
+                path.unlink(missing_ok=True)
+                continue
+            self.entries[path.stem] = value
+            self.bytes += self.size_of(value)
+
+        while self.bytes > self.max_bytes:
+            old_name, old_value = self.entries.popitem(last=False)
+            self.bytes -= self.size_of(old_value)
+            self.__file_for(old_name).unlink(missing_ok=True)
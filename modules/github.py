@@ -1,55 +1,237 @@
-from datetime import date, datetime
+import math
+from datetime import date
+from functools import partial
 from os import getenv
+from threading import Event, Lock, Thread
+from time import monotonic, time
+from typing import NamedTuple
+
 import requests
-from dotenv import load_dotenv
-from cachetools import cached, TTLCache
 from PIL import Image, ImageDraw
-from threading import Thread
 
-load_dotenv("local.env", verbose=True)
+from modules.widgets import PixelIndicator
 
 ENDPOINT = "https://api.github.com/graphql"
-__github_token = getenv("GITHUB_TOKEN")
-assert __github_token is not None, "Did you copy the example.env to local.env?"
-assert __github_token != "here_goes_your_token", "Please add your github token to local.env"
+DEBUG = False
+POLL_INTERVAL = 10 if DEBUG else 60  # seconds, the rate limit is 5000 queries per hour
+MAX_BACKOFF = 15 * 60  # seconds
+REQUEST_TIMEOUT = 10  # seconds
 
-HEADERS = {"Authorization": "Bearer " + __github_token}
 
-DEBUG = False
-SECONDS_TO_CACHE = 0 if DEBUG else 60  # the rate limit is 5000 of this query per hour
-USER_CONTRIBUTIONS_DICT = {}
-REQ_THREAD: Thread = None
+def token_headers(token=None):
+    """
+    The authorization headers for `token`, by default the GITHUB_TOKEN setting.
+    """
+    token = getenv("GITHUB_TOKEN") if token is None else token
+    assert token is not None, "Did you copy the example.env to local.env?"
+    assert token != "here_goes_your_token", "Please add your github token to local.env"
+    return {"Authorization": "Bearer " + token}
 
 
-@cached(cache=TTLCache(maxsize=1024, ttl=SECONDS_TO_CACHE))
-def fill_contributions_for_day_for_user(user: str, date_to_check: date = None) -> int:
+class Snapshot(NamedTuple):
     """
-    Fills the `USER_CONTRIBUTIONS_DICT` for the given user with the contributions for the given date.
-    The return is cached for 1 minute.
-    If date_to_check is None (default case) it will return the contributions for today.
+    The latest poll results: contributions and error messages by username.
     """
-    if date_to_check is None:
-        date_to_check = datetime.today()
 
-    date_to_check = date_to_check.strftime("%Y-%m-%dT00:00:00Z")
+    contributions: dict
+    errors: dict
+    updated_at: float = None  # monotonic() of the last successful poll
+
 
-    query = f"""
-    query {{
-        user(login: "{user}") {{
-            contributionsCollection(from: "{date_to_check}", to: "{date_to_check}") {{
+def build_query(usernames):
+    """
+    One GraphQL query for all users, every user gets an alias (u0, u1, ...).
+    The logins are passed as variables, so they need no escaping.
+    """
+    variables = "".join(f", $u{idx}: String!" for idx in range(len(usernames)))
+    fields = "".join(
+        f"""
+        u{idx}: user(login: $u{idx}) {{
+            contributionsCollection(from: $day, to: $day) {{
                 totalCommitContributions
             }}
-        }}
-    }}"""
+        }}"""
+        for idx in range(len(usernames))
+    )
+    return f"query($day: DateTime!{variables}) {{{fields}\n    }}"
+
+
+def header_seconds(value):
+    """
+    A number of seconds from a header, None if it is missing or no finite number (e.g. a date).
+    """
+    try:
+        seconds = float(value)
+    except (TypeError, ValueError):
+        return None
+    return seconds if math.isfinite(seconds) else None
+
+
+class GithubPoller:
+    """
+    Fetch the daily commit contributions of some users from a background thread.
+
+    All users are requested with a single query through one pooled HTTP session. Failures are
+    retried with exponential backoff and an exhausted rate limit is waited out. The results are
+    published as an immutable `Snapshot` that is replaced as a whole, so renderers can read
+    `snapshot` without locking and never wait for the network. Without `headers` the token is
+    taken from the GITHUB_TOKEN setting.
+    """
+
+    def __init__(self, usernames=(), endpoint=ENDPOINT, headers=None, interval=POLL_INTERVAL):
+        self.usernames = list(dict.fromkeys(usernames))
+        self.endpoint = endpoint
+        self.interval = interval
+        self.session = requests.Session()
+        self.session.headers.update(token_headers() if headers is None else headers)
+
+        self.lock = Lock()
+        self.snapshot = Snapshot({}, {})
+        self.stop_event = Event()
+        self.wake_event = Event()
+        self.thread = None
+        self.failures = 0
+        self.requests = 0
+
+    def watch(self, username):
+        """
+        Add a user, it is fetched right away if the poller is running.
+        """
+        with self.lock:
+            if username in self.usernames:
+                return
+            self.usernames.append(username)
+        self.wake_event.set()
+
+    def start(self):
+        self.stop_event.clear()
+        self.thread = Thread(target=self.__poll_loop, name="github-poller", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.wake_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=REQUEST_TIMEOUT + 1)
+            self.thread = None
+        self.session.close()
+
+    def poll(self, day: date = None):
+        """
+        Fetch the contributions of all users for `day` (default today) and publish them.
+        Returns the number of seconds to wait before the next poll.
+        """
+        with self.lock:
+            usernames = list(self.usernames)
+        if not usernames:
+            return self.interval
+
+        day = day or date.today()
+        variables = {f"u{idx}": username for idx, username in enumerate(usernames)}
+        variables["day"] = day.strftime("%Y-%m-%dT00:00:00Z")
+
+        self.requests += 1
+        response = None
+        try:
+            response = self.session.post(
+                self.endpoint,
+                json={"query": build_query(usernames), "variables": variables},
+                timeout=REQUEST_TIMEOUT,
+            )
+            if response.status_code != 200:
+                raise requests.RequestException(f"Query failed to run - return code: {response.status_code}")
+            contributions, errors = self.__parse(usernames, response.json())
+        except requests.RequestException as error:
+            return self.__failed(usernames, str(error), response)
+        except (ValueError, KeyError, TypeError, AttributeError) as error:
+            return self.__failed(usernames, f"Invalid response: {error!r}", response)
 
-    req = requests.post(ENDPOINT, json={"query": query}, headers=HEADERS)
-    print(f"Requesting data from github is cached for {SECONDS_TO_CACHE/60 :.1f} minutes")
+        self.failures = 0
+        with self.lock:
+            self.snapshot = Snapshot(contributions, errors, monotonic())
+        return max(self.interval, self.rate_limit_wait(response))
 
-    if req.status_code != 200:
-        raise requests.RequestException(f"Query failed to run - return code: {req.status_code}")
+    def __parse(self, usernames, body):
+        """
+        (contributions, errors) by username from a response body, raises if it is malformed.
+        """
+        data = body.get("data") or {}
+        contributions, errors = dict(self.snapshot.contributions), {}
+        for idx, username in enumerate(usernames):
+            user = data.get(f"u{idx}")
+            if user is None:
+                errors[username] = "Unknown user or missing data"
+                continue
+            contributions[username] = int(user["contributionsCollection"]["totalCommitContributions"])
+        return contributions, errors
 
-    c_count = req.json()["data"]["user"]["contributionsCollection"]["totalCommitContributions"]
-    USER_CONTRIBUTIONS_DICT[user] = c_count
+    @staticmethod
+    def rate_limit_wait(response):
+        """
+        Seconds to wait according to the rate limit headers, 0 if the limit is not exhausted
+        (or the headers can't be read).
+        """
+        headers = response.headers
+        retry_after = header_seconds(headers.get("Retry-After"))
+        if retry_after is not None:
+            return max(retry_after, 0)
+        reset = header_seconds(headers.get("X-RateLimit-Reset"))
+        if headers.get("X-RateLimit-Remaining") == "0" and reset is not None:
+            return max(reset - time(), 0)
+        return 0
+
+    def __failed(self, usernames, message, response):
+        self.failures += 1
+        backoff = min(self.interval * 2 ** (self.failures - 1), MAX_BACKOFF)
+        wait = self.rate_limit_wait(response) if response is not None else 0
+        print(f"[!] Github poll failed ({message}), retrying in {max(backoff, wait):.0f}s")
+
+        with self.lock:
+            # keep the last known contributions, but flag every user as failed
+            self.snapshot = self.snapshot._replace(errors=dict.fromkeys(usernames, message))
+        return max(backoff, wait)
+
+    def __poll_loop(self):
+        while not self.stop_event.is_set():
+            self.wake_event.clear()  # users added while polling trigger the next poll right away
+            delay = self.poll()
+            self.wake_event.wait(delay)
+
+
+POLLER: GithubPoller = None
+
+
+def shared_poller():
+    """
+    The poller used when none is given, started on first use.
+    """
+    global POLLER
+    if POLLER is None:
+        POLLER = GithubPoller()
+        POLLER.start()
+    return POLLER
+
+
+def contribution_color(
+    username: str,
+    required_contributions=1,
+    colors=((0, 255, 0, 255), (255, 0, 0, 255), (255, 255, 0, 255)),  # green, red, yellow
+    poller: GithubPoller = None,
+):
+    """
+    The color showing if `username` reached the daily contribution goal (see `draw_github_contribution`).
+    Cheap enough to be used as the source of a PixelIndicator widget.
+    """
+    good, bad, error = colors
+    poller = poller or shared_poller()
+    poller.watch(username)
+
+    snapshot = poller.snapshot
+    if username in snapshot.errors:
+        return error
+    if snapshot.contributions.get(username, 0) >= required_contributions:
+        return good
+    return bad
 
 
 def draw_github_contribution(
@@ -58,6 +240,7 @@ def draw_github_contribution(
     required_contributions=1,
     colors=((0, 255, 0, 255), (255, 0, 0, 255), (255, 255, 0, 255)),  # green, red, yellow
     position=(31, 0),
+    poller: GithubPoller = None,
 ):
     """
     Draw a github contribution pixel on position x, y it shows if you have
@@ -66,20 +249,19 @@ def draw_github_contribution(
     `colors` is a tuple of 3 tuples of the form (r, g, b, a) where the first one is the good color
     the second one is the bad color and the third one is the error color.
     Eg: ( (0, 255, 0, 255), (255, 0, 0, 255), (255, 255, 0, 255) )
-    """
-    good, bad, error = colors
-    global REQ_THREAD
 
-    if REQ_THREAD is None or REQ_THREAD.is_alive() is False:
-        REQ_THREAD = Thread(target=fill_contributions_for_day_for_user, args=(username,))
-        REQ_THREAD.start()
+    The contributions come from `poller`, by default a shared poller started on first use.
+    """
+    color = contribution_color(username, required_contributions, colors, poller)
+    ImageDraw.Draw(base).point(position, fill=color)
 
-    eventually_correct_contributions = USER_CONTRIBUTIONS_DICT.get(username, 0)
 
-    try:
-        if eventually_correct_contributions >= required_contributions:
-            ImageDraw.Draw(base).point(position, fill=(good))
-        else:
-            ImageDraw.Draw(base).point(position, fill=(bad))
-    except requests.RequestException:
-        ImageDraw.Draw(base).point(position, fill=(error))
+def contribution_widget(user, required=1, position=(31, 0), refresh=1):
+    """
+    The "github" scene plugin: a pixel showing if `user` reached the daily contribution goal.
+    """
+    return PixelIndicator(
+        partial(contribution_color, user, required_contributions=required),
+        position=position,
+        refresh_interval=refresh,
+    )
@@ -0,0 +1,221 @@
+"""
+Keep the connection to a device alive from a background thread.
+
+A `LinkSupervisor` owns the connection of one device: it (re)connects with exponential backoff
+and jitter and sends everything that was submitted, so callers never wait for the link. While
+the link is down only the latest picture is kept, everything else is dropped. Batches (e.g. the
+chunks of an animation upload) are queued or dropped as a whole.
+"""
+import random
+from bisect import bisect_left
+from collections import deque
+from threading import Condition, Lock, Thread
+from time import monotonic
+
+LATENCY_BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0)  # seconds
+MAX_PENDING_FRAMES = 256  # ordered frames (commands, animation chunks) waiting to be sent, beyond a batch
+
+
+class LinkHealth:
+    """
+    Statistics of one link: reconnects, time spent disconnected, send latencies (as histogram
+    over LATENCY_BUCKETS) and throughput.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.reconnects = 0
+        self.connect_failures = 0
+        self.send_failures = 0
+        self.dropped = 0
+        self.disconnected_since = monotonic()
+        self.disconnected_total = 0.0
+        self.latency_counts = [0] * (len(LATENCY_BUCKETS) + 1)  # the last one counts the slower sends
+        self.bytes_sent = 0
+        self.rate_since = monotonic()
+        self.rate_bytes = 0
+
+    def connected(self):
+        with self.lock:
+            if self.disconnected_since is not None:
+                self.disconnected_total += monotonic() - self.disconnected_since
+                self.disconnected_since = None
+            self.reconnects += 1
+
+    def disconnected(self):
+        with self.lock:
+            if self.disconnected_since is None:
+                self.disconnected_since = monotonic()
+
+    def sent(self, size, seconds):
+        with self.lock:
+            self.latency_counts[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+            self.bytes_sent += size
+            self.rate_bytes += size
+
+    def count(self, name, amount=1):
+        with self.lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def stats(self):
+        """
+        The statistics as dict, bytes_per_second is measured since the previous call.
+        """
+        with self.lock:
+            now = monotonic()
+            disconnected = self.disconnected_total
+            if self.disconnected_since is not None:
+                disconnected += now - self.disconnected_since
+            rate = self.rate_bytes / max(now - self.rate_since, 1e-9)
+            self.rate_since, self.rate_bytes = now, 0
+            bounds = [f"<={bound * 1000:g}ms" for bound in LATENCY_BUCKETS] + ["slower"]
+            return {
+                "connected": self.disconnected_since is None,
+                "reconnects": max(self.reconnects - 1, 0),  # the first connect is no reconnect
+                "connect_failures": self.connect_failures,
+                "send_failures": self.send_failures,
+                "dropped": self.dropped,
+                "seconds_disconnected": round(disconnected, 3),
+                "bytes_sent": self.bytes_sent,
+                "bytes_per_second": round(rate, 1),
+                "send_latency": dict(zip(bounds, self.latency_counts)),
+            }
+
+
+class LinkSupervisor:
+    """
+    Connect and send for one device (a Pixoo) from a background thread.
+
+    `submit` never blocks. Reconnects wait `min_delay` seconds, doubling up to `max_delay`, plus
+    up to `jitter` (a fraction) of that at random, so several devices don't retry in lockstep.
+    `on_connect(device)` is called from the supervisor thread after every (re)connect, e.g. to
+    restore settings.
+    """
+
+    def __init__(self, device, min_delay=1, max_delay=30, jitter=0.3, on_connect=None):
+        self.device = device
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.on_connect = on_connect
+
+        self.health = LinkHealth()
+        self.condition = Condition()
+        self.batches = deque()  # lists of ordered frames, all of them are sent
+        self.pending = 0  # frames in batches
+        self.latest = None  # the newest picture, replaced by newer ones
+        self.stopped = False
+        self.up = False
+        self.thread = None
+
+    @property
+    def connected(self):
+        return self.up
+
+    def start(self):
+        self.stopped = False
+        self.thread = Thread(target=self.__run, name=f"link-{self.device.mac_address}", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
+        if self.thread is not None:
+            self.thread.join(timeout=2)
+            self.thread = None
+        self.device.transport.close()
+
+    def submit(self, frame, replace=False):
+        """
+        Queue a frame, returns False if it was dropped.
+
+        With `replace` (pictures) the frame replaces a picture that wasn't sent yet and is kept
+        while the link is down. Other frames are sent in order, but dropped while the link is down.
+        """
+        if not replace:
+            return self.submit_batch([frame])
+        with self.condition:
+            if self.latest is not None:
+                self.health.count("dropped")
+            self.latest = frame
+            self.condition.notify()
+        return True
+
+    def submit_batch(self, frames):
+        """
+        Queue frames sent in order and together, returns False if all of them were dropped: while
+        the link is down or if they would make more than MAX_PENDING_FRAMES frames wait (a batch
+        that is larger on its own is queued once nothing else waits).
+        """
+        frames = list(frames)
+        with self.condition:
+            if not self.up or (self.pending and self.pending + len(frames) > MAX_PENDING_FRAMES):
+                self.health.count("dropped", len(frames))
+                return False
+            self.batches.append(frames)
+            self.pending += len(frames)
+            self.condition.notify()
+        return True
+
+    def __next_batch(self):
+        with self.condition:
+            while not self.stopped and not self.batches and self.latest is None:
+                self.condition.wait()
+            if self.stopped:
+                return None
+            if self.batches:
+                return self.batches[0]  # removed once it was sent
+            frame, self.latest = self.latest, None
+            return [frame]
+
+    def __connect(self, delay):
+        try:
+            self.device.connect()
+        except OSError as error:
+            self.device.transport.close()
+            self.health.count("connect_failures")
+            wait = delay * (1 + random.uniform(0, self.jitter))
+            print(f"[!] {self.device.mac_address}: {error}. Reconnecting in {wait:.1f}s...")
+            with self.condition:
+                self.condition.wait_for(lambda: self.stopped, timeout=wait)
+            return False
+
+        self.up = True
+        self.health.connected()
+        if self.on_connect is not None:
+            self.on_connect(self.device)  # frames it sends are queued and sent by this thread
+        return True
+
+    def __run(self):
+        delay = self.min_delay
+        while not self.stopped:
+            if not self.up:
+                if self.__connect(delay):
+                    delay = self.min_delay
+                else:
+                    delay = min(delay * 2, self.max_delay)
+                continue
+
+            batch = self.__next_batch()
+            if batch is None:
+                break
+            try:
+                for frame in batch:
+                    started = monotonic()
+                    self.device.transport.send(frame)
+                    self.health.sent(len(frame), monotonic() - started)
+            except (OSError, ValueError) as error:  # including the send timeout and a closed socket
+                print(f"[!] {self.device.mac_address}: {error}. Reconnecting...")
+                self.device.transport.close()
+                self.health.count("send_failures")
+                self.health.disconnected()
+                with self.condition:
+                    self.up = False
+                    self.batches.clear()  # half sent animations and old commands are useless now
+                    self.pending = 0
+                continue
+            with self.condition:
+                if self.batches and self.batches[0] is batch:
+                    self.batches.popleft()
+                    self.pending -= len(batch)
@@ -0,0 +1,271 @@
+"""
+Timers for the hot paths, a Prometheus style /metrics endpoint and a sampling profiler.
+
+Nothing is measured until `enable()` is called: it wraps the functions listed in TIMED with
+timers, so a disabled process runs the original functions without any overhead. Only modules
+that were imported before `enable()` are instrumented.
+
+    enable()
+    serve_metrics(9100)        # GET /metrics, GET /profile?seconds=10 (collapsed stacks)
+    start_log_summary(60)      # print a summary every minute
+"""
+import sys
+import traceback
+from collections import Counter
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Event, Lock, Thread, enumerate as enumerate_threads, get_ident
+from time import monotonic, perf_counter, sleep
+from urllib.parse import parse_qs, urlparse
+
+# (module, attribute path, stage): the functions timed once enabled. For a method of a class,
+# the method of every subclass overriding it is timed too, labeled with the class name.
+TIMED = (
+    ("modules.widgets", "WidgetScene.render", "render"),
+    ("modules.widgets", "Widget.draw", "widget_draw"),
+    ("modules.quantize", "Quantizer.quantize", "quantize"),
+    ("modules.pixoo_client", "Pixoo.encode_raw_image", "encode"),
+    ("modules.pixoo_client", "spp_frame", "frame_build"),
+    ("modules.transport", "Transport.send", "transmit"),
+    ("modules.github", "GithubPoller.poll", "github_fetch"),
+)
+MAX_PROFILE_SECONDS = 300
+
+
+class Timer:
+    """
+    Number, total and maximum of the durations of one stage.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        with self.lock:
+            self.count += 1
+            self.total += seconds
+            self.max = max(self.max, seconds)
+
+
+class Registry:
+    def __init__(self):
+        self.lock = Lock()
+        self.timers = {}  # (stage, label): Timer
+        self.gauges = {}  # name: function returning a number or a {label: number} dict
+        self.enabled = False
+        self.originals = []  # (owner, attribute, original function), to undo enable()
+
+    def timer(self, stage, label=""):
+        key = (stage, label)
+        timer = self.timers.get(key)
+        if timer is None:
+            with self.lock:
+                timer = self.timers.setdefault(key, Timer())
+        return timer
+
+    def gauge(self, name, read):
+        """
+        Export the value returned by read() (a number, or numbers by label) as gauge `name`.
+        """
+        self.gauges[name] = read
+
+
+REGISTRY = Registry()
+
+
+def timed(func, timer):
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        started = perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            timer.record(perf_counter() - started)
+
+    return wrapper
+
+
+def subclasses(cls):
+    for subclass in cls.__subclasses__():
+        yield subclass
+        yield from subclasses(subclass)
+
+
+def enable(registry=REGISTRY):
+    """
+    Start timing the functions in TIMED (those of already imported modules).
+    """
+    if registry.enabled:
+        return
+    registry.enabled = True
+    for module_name, path, stage in TIMED:
+        module = sys.modules.get(module_name)
+        if module is None:
+            continue
+        owner_name, _, attribute = path.rpartition(".")
+        if not owner_name:
+            __wrap(registry, module, attribute, registry.timer(stage))
+            continue
+        owner = getattr(module, owner_name)
+        for cls in (owner, *subclasses(owner)):
+            if attribute in cls.__dict__:
+                label = cls.__name__ if cls is not owner or stage == "widget_draw" else ""
+                __wrap(registry, cls, attribute, registry.timer(stage, label))
+
+
+def disable(registry=REGISTRY):
+    """
+    Put the original functions back.
+    """
+    for owner, attribute, original in reversed(registry.originals):
+        setattr(owner, attribute, original)
+    registry.originals.clear()
+    registry.enabled = False
+
+
+def __wrap(registry, owner, attribute, timer):
+    original = owner.__dict__[attribute] if isinstance(owner, type) else getattr(owner, attribute)
+    registry.originals.append((owner, attribute, original))
+    setattr(owner, attribute, timed(original, timer))
+
+
+def render_metrics(registry=REGISTRY):
+    """
+    All metrics in the Prometheus text format, the samples of a metric family together.
+    """
+    with registry.lock:
+        timers = sorted(registry.timers.items())
+    samples = []  # (labels, count, total, max) of every timer, read once
+    for (stage, label), timer in timers:
+        labels = f'stage="{stage}"' + (f',class="{label}"' if label else "")
+        with timer.lock:
+            samples.append((labels, timer.count, timer.total, timer.max))
+
+    lines = ["# TYPE pixoo_stage_seconds summary"]
+    for labels, count, total, _ in samples:
+        lines.append(f"pixoo_stage_seconds_count{{{labels}}} {count}")
+        lines.append(f"pixoo_stage_seconds_sum{{{labels}}} {total:.6f}")
+    lines.append("# TYPE pixoo_stage_seconds_max gauge")
+    lines += [f"pixoo_stage_seconds_max{{{labels}}} {peak:.6f}" for labels, _, _, peak in samples]
+
+    for name, read in sorted(registry.gauges.items()):
+        try:
+            value = read()
+        except Exception as error:  # pylint: disable=broad-except
+            lines.append(f"# {name} failed: {error!r}")
+            continue
+        lines.append(f"# TYPE pixoo_{name} gauge")
+        if isinstance(value, dict):
+            lines += [f'pixoo_{name}{{label="{label}"}} {number}' for label, number in sorted(value.items())]
+        else:
+            lines.append(f"pixoo_{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def summary(registry=REGISTRY):
+    """
+    One line per stage: calls, mean and max milliseconds. Resets the maximums.
+    """
+    with registry.lock:
+        timers = sorted(registry.timers.items())
+    parts = []
+    for (stage, label), timer in timers:
+        with timer.lock:
+            if not timer.count:
+                continue
+            mean = timer.total / timer.count
+            name = f"{stage}/{label}" if label else stage
+            parts.append(f"{name} {timer.count}x {mean * 1000:.2f}/{timer.max * 1000:.2f}")
+            timer.max = 0.0
+    return "Metrics (calls mean/max ms): " + (", ".join(parts) or "nothing measured yet")
+
+
+def start_log_summary(interval=60, registry=REGISTRY):
+    """
+    Print `summary()` every `interval` seconds from a background thread, returns its stop Event.
+    """
+    stop_event = Event()
+
+    def log_loop():
+        while not stop_event.wait(interval):
+            print(summary(registry))
+
+    Thread(target=log_loop, name="metrics-log", daemon=True).start()
+    return stop_event
+
+
+class SamplingProfiler:
+    """
+    Sample the stacks of all threads every `interval` seconds, in the collapsed format
+    ("thread;module:function;... count" per line) flamegraph.pl and speedscope read.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.stacks = Counter()
+
+    def run(self, seconds):
+        """
+        Sample for `seconds` (at most MAX_PROFILE_SECONDS), returns the collapsed stacks.
+        """
+        own_thread = get_ident()
+        deadline = monotonic() + min(seconds, MAX_PROFILE_SECONDS)
+        while monotonic() < deadline:
+            names = {thread.ident: thread.name for thread in enumerate_threads()}
+            for ident, frame in sys._current_frames().items():  # pylint: disable=protected-access
+                if ident == own_thread:
+                    continue
+                calls = [
+                    f"{entry.filename.rpartition('/')[2]}:{entry.name}"
+                    for entry in traceback.extract_stack(frame)
+                ]
+                self.stacks[";".join((names.get(ident, str(ident)), *calls))] += 1
+            sleep(self.interval)
+        return self.collapsed()
+
+    def collapsed(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):  # pylint: disable=invalid-name
+        url = urlparse(self.path)
+        if url.path == "/metrics":
+            self.__reply(render_metrics(self.server.registry))
+        elif url.path == "/profile":
+            value = parse_qs(url.query).get("seconds", ["10"])[0]
+            try:
+                seconds = float(value)
+            except ValueError:
+                seconds = None
+            if seconds is None or not 0 < seconds <= MAX_PROFILE_SECONDS:  # also rejects nan
+                self.send_error(400, f"seconds must be from 0 to {MAX_PROFILE_SECONDS}, got {value!r}")
+                return
+            self.__reply(SamplingProfiler().run(seconds))
+        else:
+            self.send_error(404)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        pass  # scraping every few seconds shouldn't flood the log
+
+    def __reply(self, text):
+        body = text.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve_metrics(port, host="127.0.0.1", registry=REGISTRY):
+    """
+    Serve /metrics and /profile?seconds=N from a background thread, returns the server.
+    """
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    server.registry = registry
+    Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
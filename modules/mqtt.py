@@ -0,0 +1,298 @@
+"""
+Push data onto the display over MQTT and control it from Home Assistant.
+
+An `MqttBridge` subscribes to the topics the scene uses (the plugins mqtt_pixel, mqtt_text and
+mqtt_image show the last message of a topic) and tells its listeners when a value changed, so
+with event driven rendering (TICK) a frame is only rendered when something changed or the clock
+ticks. It publishes the state of the display and the links to "<prefix>/state", takes commands
+like {"state": "OFF"} or {"brightness": 40} on "<prefix>/set" and announces the display as a
+light (plus a connectivity sensor per device) through Home Assistant MQTT discovery.
+
+paho-mqtt is optional, it is only needed with MQTT_HOST set (pip install paho-mqtt). To try it
+with a local broker:
+
+    mosquitto -v
+    MQTT_HOST=localhost SCENE="clock; mqtt_text topic=home/text size=32,8" python pixoo.py
+    mosquitto_pub -t home/text -m "Hello"
+    mosquitto_pub -t pixoo/set -m '{"brightness": 40}'
+"""
+import json
+import re
+from functools import partial
+from os import getenv
+from threading import Event, Lock, Thread
+
+try:
+    import paho.mqtt.client as mqtt
+except ImportError:  # optional, only needed when MQTT is used
+    mqtt = None
+
+from modules.plugins import color as parse_color
+from modules.text import TextBox
+from modules.widgets import ImageWidget, PixelIndicator
+
+DISCOVERY_PREFIX = "homeassistant"
+STATE_INTERVAL = 30  # seconds, the link states are published when they changed
+TRUTHY = ("on", "1", "true", "yes", "home", "open")
+
+
+def new_client():
+    if hasattr(mqtt, "CallbackAPIVersion"):  # paho-mqtt 2
+        return mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+    return mqtt.Client()
+
+
+def slug(text):
+    return re.sub(r"[^a-z0-9]+", "_", text.lower()).strip("_")
+
+
+def discovery_payloads(node_id, prefix, addresses, discovery_prefix=DISCOVERY_PREFIX):
+    """
+    (topic, payload) of the Home Assistant discovery messages: the display as a dimmable light
+    and a connectivity sensor for every device address.
+    """
+    device = {"identifiers": [node_id], "name": f"Pixoo {node_id}", "manufacturer": "Divoom"}
+    common = {
+        "availability_topic": f"{prefix}/availability",
+        "state_topic": f"{prefix}/state",
+        "device": device,
+    }
+    yield f"{discovery_prefix}/light/{node_id}/display/config", {
+        "name": "Display",
+        "unique_id": f"{node_id}_display",
+        "schema": "json",
+        "command_topic": f"{prefix}/set",
+        "supported_color_modes": ["brightness"],
+        "brightness_scale": 100,
+        **common,
+    }
+    for address in addresses:
+        yield f"{discovery_prefix}/binary_sensor/{node_id}/{slug(address)}/config", {
+            "name": f"Link {address}",
+            "unique_id": f"{node_id}_{slug(address)}_link",
+            "device_class": "connectivity",
+            "value_template": f"{{{{ 'ON' if value_json.devices[{json.dumps(address)}] else 'OFF' }}}}",
+            **common,
+        }
+
+
+class MqttBridge:
+    """
+    One MQTT connection, kept up by the paho network thread.
+
+    `source(topic)` returns a data source for a widget: the payload (bytes) of the last message
+    on that topic, None before the first one. `listeners` are called (from the network thread)
+    whenever a subscribed value changed. After `attach` the bridge publishes the state of a
+    DeviceManager and FramePipeline and applies the commands it receives to them.
+    """
+
+    def __init__(
+        self,
+        host,
+        port=1883,
+        username=None,
+        password=None,
+        prefix="pixoo",
+        discovery_prefix=DISCOVERY_PREFIX,
+        state_interval=STATE_INTERVAL,
+    ):
+        assert mqtt is not None, "MQTT needs paho-mqtt: pip install paho-mqtt"
+        self.host = host
+        self.port = port
+        self.prefix = prefix
+        self.node_id = slug(prefix)
+        self.discovery_prefix = discovery_prefix
+        self.state_interval = state_interval
+        self.availability_topic = f"{prefix}/availability"
+        self.state_topic = f"{prefix}/state"
+        self.command_topic = f"{prefix}/set"
+
+        self.lock = Lock()
+        self.topics = set()
+        self.values = {}  # topic: payload of the last message
+        self.listeners = []
+        self.manager = None
+        self.pipeline = None
+        self.display_on = True
+        self.brightness = 100
+        self.published_state = None
+        self.messages = 0
+        self.stop_event = Event()
+        self.thread = None
+
+        self.client = new_client()
+        if username:
+            self.client.username_pw_set(username, password)
+        self.client.will_set(self.availability_topic, "offline", retain=True)
+        self.client.on_connect = self.__on_connect
+        self.client.on_message = self.__on_message
+
+    def start(self):
+        self.stop_event.clear()
+        self.client.connect_async(self.host, self.port)
+        self.client.loop_start()  # connects and reconnects in the background
+        self.thread = Thread(target=self.__state_loop, name="mqtt-state", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=2)
+            self.thread = None
+        if self.client.is_connected():
+            self.client.publish(self.availability_topic, "offline", retain=True).wait_for_publish(2)
+        self.client.disconnect()
+        self.client.loop_stop()
+
+    def source(self, topic):
+        """
+        A data source returning the last payload of `topic` (no wildcards), subscribed right away.
+        """
+        assert "+" not in topic and "#" not in topic, f"Wildcards can't be shown, got {topic!r}"
+        with self.lock:
+            self.topics.add(topic)
+        if self.client.is_connected():
+            self.client.subscribe(topic)
+        return lambda: self.values.get(topic)
+
+    def attach(self, manager, pipeline=None):
+        """
+        Publish the state of the devices of `manager` and control them (and pause `pipeline`).
+        """
+        self.manager = manager
+        self.pipeline = pipeline
+        if self.client.is_connected():
+            self.__announce()
+
+    def state(self):
+        state = {
+            "state": "ON" if self.display_on else "OFF",
+            "brightness": self.brightness,
+            "color_mode": "brightness",
+        }
+        if self.manager is not None:
+            state["devices"] = {device.mac_address: device.connected for device in self.manager.devices}
+        return state
+
+    def publish_state(self, force=False):
+        text = json.dumps(self.state(), sort_keys=True)
+        if force or text != self.published_state:
+            self.published_state = text
+            self.client.publish(self.state_topic, text, retain=True)
+
+    def __announce(self):
+        addresses = [device.mac_address for device in self.manager.devices] if self.manager else []
+        for topic, payload in discovery_payloads(self.node_id, self.prefix, addresses, self.discovery_prefix):
+            self.client.publish(topic, json.dumps(payload), retain=True)
+        self.client.publish(self.availability_topic, "online", retain=True)
+        self.publish_state(force=True)
+
+    def __on_connect(self, client, userdata, flags, reason_code, properties=None):
+        if reason_code != 0:
+            print(f"[!] MQTT: connecting to {self.host}:{self.port} failed: {reason_code}")
+            return
+        print(f"MQTT: connected to {self.host}:{self.port}")
+        with self.lock:
+            topics = [self.command_topic, *sorted(self.topics)]
+        client.subscribe([(topic, 0) for topic in topics])
+        self.__announce()
+
+    def __on_message(self, client, userdata, message):
+        if message.topic == self.command_topic:
+            self.__command(message.payload)
+            return
+        with self.lock:
+            changed = self.values.get(message.topic) != message.payload
+            self.values[message.topic] = message.payload
+            self.messages += 1
+        if changed:
+            for listener in list(self.listeners):
+                listener()
+
+    def __command(self, payload):
+        try:
+            command = json.loads(payload)
+            if "brightness" in command:
+                self.brightness = min(max(int(command["brightness"]), 0), 100)
+            if "state" in command:
+                self.display_on = command["state"] == "ON"
+        except (ValueError, TypeError) as error:
+            print(f"[!] MQTT: invalid command {payload!r}: {error}")
+            return
+
+        if self.manager is not None:
+            self.manager.command("set_system_brightness", self.brightness if self.display_on else 0)
+        if self.pipeline is not None:
+            if self.display_on:
+                self.pipeline.resume()
+            else:
+                self.pipeline.pause()  # a dark display needs no frames
+        self.publish_state()
+
+    def __state_loop(self):
+        while not self.stop_event.wait(self.state_interval):
+            if self.client.is_connected():
+                self.publish_state()  # e.g. a device went offline
+
+
+BRIDGE: MqttBridge = None
+
+
+def shared_bridge():
+    """
+    The bridge configured by the MQTT_* settings, started on first use.
+    """
+    global BRIDGE
+    if BRIDGE is None:
+        host = getenv("MQTT_HOST")
+        assert host, "Set MQTT_HOST in local.env to use MQTT"
+        BRIDGE = MqttBridge(
+            host,
+            int(getenv("MQTT_PORT") or 1883),
+            getenv("MQTT_USERNAME") or None,
+            getenv("MQTT_PASSWORD") or None,
+            getenv("MQTT_PREFIX") or "pixoo",
+        )
+        BRIDGE.start()
+    return BRIDGE
+
+
+def payload_text(payload):
+    return None if payload is None else payload.decode(errors="replace").strip()
+
+
+def payload_color(payload, on=(0, 255, 0, 255), off=(255, 0, 0, 255)):
+    """
+    The color of a message: "#rrggbb" as is, on for "ON", "1", "true", ... and off otherwise.
+    """
+    text = payload_text(payload).lower()
+    if text.startswith("#"):
+        try:
+            return parse_color(text)
+        except ValueError:
+            return off
+    return on if text in TRUTHY else off
+
+
+def pixel_widget(topic, position=(31, 0), on=(0, 255, 0, 255), off=(255, 0, 0, 255)):
+    """
+    The "mqtt_pixel" scene plugin, off until the first message.
+    """
+    return PixelIndicator(
+        shared_bridge().source(topic), partial(payload_color, on=on, off=off), off, position=position
+    )
+
+
+def text_widget(topic, position=(0, 0), size=(32, 32), color=(255, 255, 255, 255), font=None):
+    """
+    The "mqtt_text" scene plugin.
+    """
+    source = shared_bridge().source(topic)
+    return TextBox(lambda: payload_text(source()), size, color, font, position=position)
+
+
+def image_widget(topic, position=(0, 0), size=(32, 32)):
+    """
+    The "mqtt_image" scene plugin, messages are picture files (PNG, JPEG, ...).
+    """
+    return ImageWidget(shared_bridge().source(topic), size, position=position)
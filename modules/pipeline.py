@@ -0,0 +1,261 @@
+import traceback
+from queue import Empty, Full, Queue
+from threading import Event, Lock, Thread
+from time import monotonic, time
+
+
+class StageStats:
+    """
+    Latency statistics of one pipeline stage, collected between two reports.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        with self.lock:
+            self.count += 1
+            self.total += seconds
+            self.max = max(self.max, seconds)
+
+    def take(self):
+        """
+        Return (count, mean, max) and start over.
+        """
+        with self.lock:
+            result = (self.count, self.total / self.count if self.count else 0.0, self.max)
+            self.count, self.total, self.max = 0, 0.0, 0.0
+        return result
+
+
+def put_latest(queue, item):
+    """
+    Put an item into a bounded queue, dropping the oldest item if it is full.
+    Returns the number of dropped items.
+    """
+    dropped = 0
+    while True:
+        try:
+            queue.put_nowait(item)
+            return dropped
+        except Full:
+            try:
+                queue.get_nowait()
+                dropped += 1
+            except Empty:
+                pass
+
+
+class FramePipeline:
+    """
+    Render, encode and send frames in three threads connected by bounded queues.
+
+    `render()` returns a frame, `encode(frame)` returns a payload (or None if there is nothing
+    to send) and `send(payload)` transmits it. Rendering is paced by a deadline based scheduler
+    targeting `fps`; when a later stage falls behind, stale frames are dropped instead of queued.
+    A frame whose render, encode or send raises is dropped and counted as failed, the traceback
+    is printed when a stage fails differently than before.
+    `render` and `fps` can be changed while running, `pause()` stops rendering until `resume()`.
+
+    With `tick` (seconds) rendering is event driven: a frame is only rendered when one was
+    requested with `request_frame()` (e.g. because a data source changed) or at the next whole
+    multiple of `tick` on the wall clock (e.g. every second for a clock), at most `fps` a second.
+    """
+
+    def __init__(self, render, encode, send, fps=10, queue_size=1, report_interval=10, tick=None):
+        self.render = render
+        self.encode = encode
+        self.send = send
+        self.fps = fps
+        self.tick = tick
+        self.report_interval = report_interval
+
+        self.encode_queue = Queue(maxsize=queue_size)
+        self.send_queue = Queue(maxsize=queue_size)
+        self.stop_event = Event()
+        self.running = Event()  # cleared while paused
+        self.running.set()
+        self.wake = Event()  # set by request_frame()
+        self.threads = []
+
+        self.stats = {"render": StageStats(), "encode": StageStats(), "send": StageStats()}
+        self.latency = StageStats()  # from the start of rendering until the frame was sent
+        self.counter_lock = Lock()
+        self.rendered = 0
+        self.sent = 0
+        self.dropped = 0
+        self.skipped = 0
+        self.missed_deadlines = 0
+        self.failed = 0
+        self.errors = {}  # stage: repr of its last error, so a failing stage doesn't flood the log
+        self.last_report = monotonic()
+
+    def count(self, name, amount=1):
+        with self.counter_lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def start(self):
+        """
+        Start the encode and send stages and the render scheduler in background threads.
+        """
+        self.stop_event.clear()
+        self.last_report = monotonic()
+        self.threads = [
+            Thread(target=self.__render_loop, name="pipeline-render", daemon=True),
+            Thread(target=self.__encode_loop, name="pipeline-encode", daemon=True),
+            Thread(target=self.__send_loop, name="pipeline-send", daemon=True),
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def pause(self):
+        """
+        Stop rendering (and so encoding and sending) without using any CPU until resumed.
+        """
+        self.running.clear()
+
+    def resume(self):
+        self.running.set()
+
+    @property
+    def paused(self):
+        return not self.running.is_set()
+
+    def request_frame(self):
+        """
+        Render a frame soon (with `tick`), can be called from any thread.
+        """
+        self.wake.set()
+
+    def stop(self):
+        self.stop_event.set()
+        self.running.set()  # wake up a paused render loop
+        self.wake.set()
+        for thread in self.threads:
+            thread.join(timeout=2)
+        self.threads = []
+
+    def run(self):
+        """
+        Run the pipeline until interrupted, printing a report every `report_interval` seconds.
+        """
+        self.start()
+        try:
+            while not self.stop_event.wait(self.report_interval):
+                report = self.report()
+                if not self.paused:
+                    print(report)
+        finally:
+            self.stop()
+
+    def report(self):
+        """
+        Summarize (and reset) the statistics gathered since the last report.
+        """
+        now = monotonic()
+        interval = max(now - self.last_report, 1e-9)
+        self.last_report = now
+        with self.counter_lock:
+            rendered, sent, dropped, skipped, missed, failed = (
+                self.rendered,
+                self.sent,
+                self.dropped,
+                self.skipped,
+                self.missed_deadlines,
+                self.failed,
+            )
+            self.rendered = self.sent = self.dropped = self.skipped = self.missed_deadlines = self.failed = 0
+
+        stages = []
+        for name, stats in (*self.stats.items(), ("total", self.latency)):
+            _, mean, peak = stats.take()
+            stages.append(f"{name} {mean * 1000:.1f}/{peak * 1000:.1f}")
+
+        return (
+            f"Pipeline: {rendered / interval:.1f} fps rendered, {sent / interval:.1f} fps sent, "
+            f"{skipped} unchanged, {dropped} dropped, {failed} failed, {missed} missed deadlines - "
+            f"ms mean/max: {', '.join(stages)}"
+        )
+
+    def __render_loop(self):
+        deadline = monotonic()
+        while not self.stop_event.is_set():
+            if not self.running.is_set():
+                self.running.wait()
+                deadline = monotonic()
+            if self.tick:
+                # sleep until a frame is requested or the next tick, a late frame missed no deadline
+                self.wake.wait(self.tick - time() % self.tick)
+                self.wake.clear()
+                deadline = max(deadline, monotonic())
+                if self.stop_event.is_set():
+                    break
+
+            period = 1.0 / self.fps
+            started = monotonic()
+            try:
+                frame = self.render()
+            except Exception as error:  # pylint: disable=broad-except
+                self.__failed("render", error)
+            else:
+                self.stats["render"].record(monotonic() - started)
+                self.count("rendered")
+                self.count("dropped", put_latest(self.encode_queue, (started, frame)))
+
+            deadline += period
+            delay = deadline - monotonic()
+            if delay < -period:
+                # we are more than a frame late, don't try to catch up with a burst of frames
+                self.count("missed_deadlines")
+                deadline = monotonic()
+            elif delay > 0:
+                self.stop_event.wait(delay)
+
+    def __encode_loop(self):
+        while not self.stop_event.is_set():
+            try:
+                started, frame = self.encode_queue.get(timeout=0.1)
+            except Empty:
+                self.running.wait()  # paused, sleep until resumed (or stopped)
+                continue
+
+            encode_started = monotonic()
+            try:
+                payload = self.encode(frame)
+            except Exception as error:  # pylint: disable=broad-except
+                self.__failed("encode", error)
+                continue
+            self.stats["encode"].record(monotonic() - encode_started)
+            if payload is None:
+                self.count("skipped")
+                continue
+            self.count("dropped", put_latest(self.send_queue, (started, payload)))
+
+    def __send_loop(self):
+        while not self.stop_event.is_set():
+            try:
+                started, payload = self.send_queue.get(timeout=0.1)
+            except Empty:
+                self.running.wait()  # paused, sleep until resumed (or stopped)
+                continue
+
+            send_started = monotonic()
+            try:
+                self.send(payload)
+            except Exception as error:  # pylint: disable=broad-except
+                self.__failed("send", error)
+                continue
+            now = monotonic()
+            self.stats["send"].record(now - send_started)
+            self.latency.record(now - started)
+            self.count("sent")
+
+    def __failed(self, stage, error):
+        self.count("failed")
+        if repr(error) != self.errors.get(stage):
+            self.errors[stage] = repr(error)
+            print(f"[!] Pipeline: {stage} failed: {error!r}")
+            traceback.print_exc()
@@ -1,8 +1,120 @@
-import math
-import socket
-from math import log10, ceil
-from time import sleep
-from PIL import Image
+import hashlib
+from array import array
+from sys import byteorder
+from math import ceil
+from PIL import Image, ImageChops
+
+from modules.frame_cache import content_hash
+from modules.link import LinkSupervisor
+from modules.quantize import Quantizer
+from modules.transport import transport_for
+
+PIC_PREFIX = bytes([0x0, 0x0A, 0x0A, 0x04])
+SEND_RETRIES = 3  # reconnects a send may try before the frame is given up
+SEND_TIMEOUT = 5  # seconds
+
+
+def frame_fingerprint(img):
+    """
+    Cheap digest of the pixels of an image, used to detect frames that did not change.
+    """
+    digest = hashlib.blake2b(f"{img.mode}{img.size}".encode(), digest_size=16)
+    digest.update(img.tobytes())
+    if img.mode == "P":
+        digest.update(bytes(img.getpalette()))
+    return digest.digest()
+
+
+def count_changed_pixels(img_a, img_b):
+    """
+    Count the pixels whose color differs between two images of the same size.
+    """
+    diff = ImageChops.difference(img_a.convert(mode="RGB"), img_b.convert(mode="RGB"))
+    red, green, blue = diff.split()
+    changed = ImageChops.lighter(ImageChops.lighter(red, green), blue)
+    return changed.width * changed.height - changed.histogram()[0]
+
+
+def spp_frame(cmd, *parts):
+    """
+    Build a complete SPP frame (0x01, size, cmd, payload, checksum, 0x02) in one buffer.
+    The payload parts (bytes-like objects or sequences of ints) are copied straight into place.
+    """
+    payload_size = sum(len(part) for part in parts)
+    size = payload_size + 3
+    frame = bytearray(4 + payload_size + 3)
+    frame[0:4] = (1, size & 0xFF, (size >> 8) & 0xFF, cmd)
+
+    offset = 4
+    for part in parts:
+        frame[offset : offset + len(part)] = part
+        offset += len(part)
+
+    checksum = spp_checksum(frame)  # the trailing bytes are still zero
+    frame[offset:] = (checksum & 0xFF, (checksum >> 8) & 0xFF, 2)
+    return frame
+
+
+def spp_checksum(frame):
+    """
+    Checksum of a frame, the start byte excluded (summed in place instead of slicing it off).
+    """
+    return (sum(frame) - frame[0]) & 0xFFFF
+
+
+def index_pixels(img):
+    """
+    Return the palette (3 byte RGB colors, in order of first appearance) and the palette index of
+    every pixel, in row-major order.
+    """
+    # one 32 bit word per pixel lets the lookups below run over plain ints
+    colors = array("I", img.convert(mode="RGB").convert(mode="RGBA").tobytes())
+    palette = {color: idx for idx, color in enumerate(dict.fromkeys(colors))}
+    pixels = list(map(palette.__getitem__, colors))
+    return [color.to_bytes(4, byteorder)[:3] for color in palette], pixels
+
+
+def index_palette_pixels(img):
+    """
+    Like `index_pixels` for a P mode image: its indices are renumbered in order of first
+    appearance (dropping unused palette entries and merging entries of the same RGB color, e.g.
+    ones only differing in alpha) with a translation table instead of a lookup per pixel.
+    """
+    indices = img.tobytes()
+    raw_palette = bytes(img.getpalette(rawmode="RGB"))
+    table = bytearray(256)
+    colors = {}  # RGB color: new index, in order of first appearance
+    for idx in dict.fromkeys(indices):
+        table[idx] = colors.setdefault(raw_palette[3 * idx : 3 * idx + 3], len(colors))
+    return list(colors), indices.translate(table)
+
+
+def index_colors(img):
+    """
+    The palette and pixel indices the encoders use: `index_palette_pixels` for P mode images,
+    `index_pixels` for all others.
+    """
+    return index_palette_pixels(img) if img.mode == "P" else index_pixels(img)
+
+
+def pack_pixels(pixels, bitwidth, pad=False):
+    """
+    Pack palette indices into an LSB-first bitstream (the first pixel goes in the lowest bits).
+    Trailing bits that don't fill a byte are dropped, or emitted as one last byte if `pad` is set.
+    """
+    if bitwidth == 8:
+        encoded, leftover = bytes(pixels), 0
+    else:
+        # build the whole stream as one binary number, last pixel first (most significant)
+        codes = [format(i, f"0{bitwidth}b") for i in range(max(pixels) + 1)]
+        bitstream = "".join(map(codes.__getitem__, reversed(pixels)))
+        nleft = len(bitstream) % 8
+        encoded = int(bitstream[nleft:] or "0", 2).to_bytes(len(bitstream) // 8, "little")
+        leftover = int(bitstream[:nleft] or "0", 2)
+
+    if pad:
+        encoded += bytes([leftover])
+    return encoded
 
 
 class Pixoo:
@@ -15,14 +127,46 @@ class Pixoo:
     BOX_MODE_COLOR = 2
     BOX_MODE_SPECIAL = 3
 
+    SIZE = 16
+    PAD_PIXEL_DATA = False  # append the leftover bits as an extra (possibly empty) byte
+
     instance = None
 
-    def __init__(self, mac_address):
+    def __init__(
+        self,
+        mac_address,
+        skip_unchanged=True,
+        min_changed_pixels=0,
+        transport=None,
+        frame_cache=None,
+        quantizer=None,
+        send_timeout=SEND_TIMEOUT,
+    ):
         """
         Constructor
+
+        `mac_address` can also be any address understood by `transport_for` (e.g. "tcp://host:port"),
+        or an explicit `transport` can be given.
+        Encoded pictures and animations are reused from `frame_cache` (a FrameCache) if given.
+        `quantizer` (a Quantizer) reduces the colors of pictures (PixooMax: 256 adaptive colors by default).
+        A send that takes longer than `send_timeout` seconds counts as a broken connection.
+        Frames identical to the last one sent are skipped unless `skip_unchanged` is False.
+        With `min_changed_pixels` > 0 frames that differ in fewer pixels are skipped as well,
+        so small flickers get coalesced into the next real change.
         """
         self.mac_address = mac_address
-        self.btsock = None
+        self.transport = transport or transport_for(mac_address)
+        self.transport.timeout = send_timeout
+        self.supervisor = None
+        self.frame_cache = frame_cache
+        self.quantizer = quantizer or self.default_quantizer()
+
+        self.skip_unchanged = skip_unchanged
+        self.min_changed_pixels = min_changed_pixels
+        self.last_fingerprint = None
+        self.last_image = None
+        self.frames_sent = 0
+        self.frames_skipped = 0
 
     @staticmethod
     def get():
@@ -31,66 +175,69 @@ class Pixoo:
             Pixoo.instance.connect()
         return Pixoo.instance
 
+    @property
+    def connected(self):
+        if self.supervisor is not None:
+            return self.supervisor.connected
+        return self.transport.connected
+
+    def supervise(self, **options):
+        """
+        Hand connecting and sending over to a background LinkSupervisor (options are passed on).
+        Sends don't block anymore: while the link is down only the latest picture is kept.
+        """
+        self.supervisor = LinkSupervisor(self, **options)
+        self.supervisor.start()
+        return self.supervisor
+
     def connect(self):
         """
-        Connect to SPP.
+        Connect to SPP (or whatever the transport is).
         """
         print(f"Connecting to {self.mac_address}...")
-        self.btsock = socket.socket(socket.AF_BLUETOOTH, socket.SOCK_STREAM, socket.BTPROTO_RFCOMM)
-        self.btsock.connect((self.mac_address, 1))
-        sleep(1)  # mandatory to wait at least 1 second
+        self.forget_frame()  # the device might have been power cycled, send the next frame
+        self.transport.connect()
         print("Connected.")
 
-    def __spp_frame_checksum(self, args):
+    def __spp_frame_encode(self, cmd, args):
         """
-        Compute frame checksum
+        Encode frame for given command and arguments (bytes or list).
         """
-        return sum(args[1:]) & 0xFFFF
+        return spp_frame(cmd, args)
 
-    def __spp_frame_encode(self, cmd, args):
+    def send(self, cmd, args, retry_count=SEND_RETRIES):
         """
-        Encode frame for given command and arguments (list).
+        Send data to SPP. Try to reconnect if the socket got closed.
         """
-        payload_size = len(args) + 3
-
-        # create our header
-        frame_header = [1, payload_size & 0xFF, (payload_size >> 8) & 0xFF, cmd]
-
-        # concatenate our args (byte array)
-        frame_buffer = frame_header + args
+        self.send_frame(self.__spp_frame_encode(cmd, args), retry_count)
 
-        # compute checksum (first byte excluded)
-        cs = self.__spp_frame_checksum(frame_buffer)
-
-        # create our suffix (including checksum)
-        frame_suffix = [cs & 0xFF, (cs >> 8) & 0xFF, 2]
-
-        # return output buffer
-        return frame_buffer + frame_suffix
-
-    def send(self, cmd, args, retry_count=math.inf):
+    def send_frame(self, frame, retry_count=SEND_RETRIES):
         """
-        Send data to SPP. Try to reconnect if the socket got closed.
+        Send an already encoded SPP frame (see `spp_frame`).
+        Returns False if it was dropped (or given up on after `retry_count` reconnects).
         """
-        spp_frame = self.__spp_frame_encode(cmd, args)
-        self.__send_with_retry_reconnect(bytes(spp_frame), retry_count)
+        if self.supervisor is not None:
+            return self.supervisor.submit(frame)
+        return self.__send_with_retry_reconnect(frame, retry_count)
 
     def __send_with_retry_reconnect(self, bytes_to_send, retry_count=5):
         """
-        Send data with a retry in case of socket errors.
+        Send data with a retry in case of socket errors, returns False if all tries failed.
         """
         while retry_count >= 0:
             try:
-                if self.btsock is not None:
-                    self.btsock.send(bytes_to_send)
-                    return
+                if self.transport.connected:
+                    self.transport.send(bytes_to_send)
+                    return True
 
                 print(f"[!] Socket is closed. Reconnecting... ({retry_count} tries left)")
                 retry_count -= 1
                 self.connect()
             except (ConnectionResetError, OSError):  # OSError is for Device is Offline
-                self.btsock = None  # reset the btsock
+                self.transport.close()  # reset the connection
                 print("[!] Connection was reset. Retrying...")
+        print("[!] Giving up, the frame was not sent.")
+        return False
 
     def set_system_brightness(self, brightness):
         """
@@ -112,225 +259,348 @@ class Pixoo:
 
     def encode_image(self, filepath):
         img = Image.open(filepath)
+        return self.encode_pil_image(img)
+
+    def encode_pil_image(self, img):
+        """
+        Encode an in-memory PIL image, reducing its colors first if the device has a quantizer.
+        """
+        if self.quantizer is not None:
+            if img.width == img.height and img.width != self.SIZE:
+                img = img.resize((self.SIZE, self.SIZE))  # resize first, indexed images only allow NEAREST
+            img = self.quantizer.quantize(img)
         return self.encode_raw_image(img)
 
+    def default_quantizer(self):
+        return None
+
     def encode_raw_image(self, img):
         """
-        Encode a 16x16 image.
+        Encode a SIZE x SIZE image into (number of colors, palette, pixel data).
         """
-        # ensure image is 16x16
         w, h = img.size
-        if w == h:
-            # resize if image is too big
-            if w > 16:
-                img = img.resize((16, 16))
-
-            # create palette and pixel array
-            pixels = []
-            palette = []
-            for y in range(16):
-                for x in range(16):
-                    pix = img.getpixel((x, y))
-
-                    if len(pix) == 4:
-                        r, g, b, a = pix
-                    elif len(pix) == 3:
-                        r, g, b = pix
-                    if (r, g, b) not in palette:
-                        palette.append((r, g, b))
-                        idx = len(palette) - 1
-                    else:
-                        idx = palette.index((r, g, b))
-                    pixels.append(idx)
-
-            # encode pixels
-            bitwidth = ceil(log10(len(palette)) / log10(2))
-            nbytes = ceil((256 * bitwidth) / 8.0)
-            encoded_pixels = [0] * nbytes
-
-            encoded_pixels = []
-            encoded_byte = ""
-            for i in pixels:
-                encoded_byte = bin(i)[2:].rjust(bitwidth, "0") + encoded_byte
-                if len(encoded_byte) >= 8:
-                    encoded_pixels.append(encoded_byte[-8:])
-                    encoded_byte = encoded_byte[:-8]
-            encoded_data = [int(c, 2) for c in encoded_pixels]
-            encoded_palette = []
-            for r, g, b in palette:
-                encoded_palette += [r, g, b]
-            return (len(palette), encoded_palette, encoded_data)
-        else:
+        if w != h:
             print("[!] Image must be square.")
+            return None
+
+        if w != self.SIZE:
+            img = img.resize((self.SIZE, self.SIZE))
+
+        palette, pixels = index_colors(img)
+        bitwidth = max((len(palette) - 1).bit_length(), 1)
+        encoded_data = pack_pixels(pixels, bitwidth, self.PAD_PIXEL_DATA)
+        return (len(palette), b"".join(palette), encoded_data)
 
     def draw_gif(self, filepath, speed=100):
         """
-        Parse Gif file and draw as animation.
+        Parse Gif file and draw as animation, returns False if the upload was not (fully) sent.
+        """
+        key = self.anim_cache_key("gif", filepath, speed)
+        return self.send_anim_chunks(self.__cached(key, lambda: self.build_gif_chunks(filepath, speed)))
+
+    def draw_anim(self, filepaths, speed=100):
+        """
+        Draw a list of image files as animation, returns False if the upload was not (fully) sent.
+        """
+        key = self.anim_cache_key("anim", *filepaths, speed)
+        return self.send_anim_chunks(self.__cached(key, lambda: self.build_anim_chunks(filepaths, speed)))
+
+    def build_gif_chunks(self, filepath, speed=100):
+        """
+        Encode a Gif file into animation (0x49) chunk frames.
         """
-        # encode frames
-        frames = []
-        timecode = 0
         anim_gif = Image.open(filepath)
+        images = []
         for n in range(anim_gif.n_frames):
             anim_gif.seek(n)
-            nb_colors, palette, pixel_data = self.encode_raw_image(anim_gif.convert(mode="RGB"))
-            frame_size = 7 + len(pixel_data) + len(palette)
-            frame_header = [
-                0xAA,
-                frame_size & 0xFF,
-                (frame_size >> 8) & 0xFF,
-                timecode & 0xFF,
-                (timecode >> 8) & 0xFF,
-                0,
-                nb_colors,
-            ]
-            frame = frame_header + palette + pixel_data
-            frames += frame
-            timecode += speed
+            images.append(self.encode_raw_image(anim_gif.convert(mode="RGB")))
+        return self.build_anim_frames(images, speed)
 
-        # send animation
-        nchunks = ceil(len(frames) / 200.0)
-        total_size = len(frames)
-        for i in range(nchunks):
-            chunk = [total_size & 0xFF, (total_size >> 8) & 0xFF, i]
-            self.send(0x49, chunk + frames[i * 200 : (i + 1) * 200])
-
-    def draw_anim(self, filepaths, speed=100):
-        timecode = 0
+    def build_anim_chunks(self, filepaths, speed=100):
+        """
+        Encode image files into animation (0x49) chunk frames.
+        """
+        return self.build_anim_frames([self.encode_image(filepath) for filepath in filepaths], speed)
 
+    def build_anim_frames(self, encoded_images, speed):
         # encode frames
-        frames = []
-        n = 0
-        for filepath in filepaths:
-            nb_colors, palette, pixel_data = self.encode_image(filepath)
+        frames = bytearray()
+        timecode = 0
+        for nb_colors, palette, pixel_data in encoded_images:
             frame_size = 7 + len(pixel_data) + len(palette)
-            frame_header = [
-                0xAA,
-                frame_size & 0xFF,
-                (frame_size >> 8) & 0xFF,
-                timecode & 0xFF,
-                (timecode >> 8) & 0xFF,
-                0,
-                nb_colors,
-            ]
-            frame = frame_header + palette + pixel_data
-            frames += frame
+            frames += bytes(
+                [
+                    0xAA,
+                    frame_size & 0xFF,
+                    (frame_size >> 8) & 0xFF,
+                    timecode & 0xFF,
+                    (timecode >> 8) & 0xFF,
+                    0,
+                    nb_colors & 0xFF,
+                ]
+            )
+            frames += palette
+            frames += pixel_data
             timecode += speed
-            n += 1
 
-        # send animation
+        # split animation into chunks
         nchunks = ceil(len(frames) / 200.0)
         total_size = len(frames)
-        for i in range(nchunks):
-            chunk = [total_size & 0xFF, (total_size >> 8) & 0xFF, i]
-            self.send(0x49, chunk + frames[i * 200 : (i + 1) * 200])
+        size_bytes = (total_size & 0xFF, (total_size >> 8) & 0xFF)
+        with memoryview(frames) as view:
+            return [spp_frame(0x49, size_bytes, (i,), view[i * 200 : (i + 1) * 200]) for i in range(nchunks)]
+
+    def send_anim_chunks(self, chunks):
+        """
+        Send the chunks of an animation upload, all or none of them with a link supervisor.
+        Returns False if the upload was dropped or broke off.
+        """
+        if self.supervisor is not None:
+            return self.supervisor.submit_batch(chunks)
+        return all(self.send_frame(chunk) for chunk in chunks)  # stops at the first failed chunk
+
+    def anim_cache_key(self, kind, *sources):
+        """
+        The frame cache key of an animation from files, None without a frame cache or if the
+        quantizer keeps state between frames (its chunks then depend on what was encoded before).
+        """
+        quantizer_key = self.anim_quantizer_key()
+        if self.frame_cache is None or quantizer_key is None:  # the files are only read for a key
+            return None
+        return (kind, type(self).__name__, quantizer_key, content_hash(*sources))
+
+    def anim_quantizer_key(self):
+        return self.quantizer.key if self.quantizer is not None else ()
+
+    def __cached(self, key, build):
+        if self.frame_cache is None or key is None:
+            return build()
+        return self.frame_cache.get_or_build(key, build)
 
     def draw_pic(self, filepath):
         """
-        Draw encoded picture.
+        Draw encoded picture from a file.
         """
-        nb_colors, palette, pixel_data = self.encode_image(filepath)
+        self.draw_image(Image.open(filepath))
+
+    def draw_frame(self, buffer):
+        """
+        Draw a raw RGB buffer (SIZE x SIZE x 3 bytes, row-major).
+        """
+        self.draw_image(Image.frombytes("RGB", (self.SIZE, self.SIZE), bytes(buffer)))
+
+    def draw_image(self, img):
+        """
+        Draw an in-memory PIL image, unless it is the same as the last frame.
+        Returns True if the frame was sent.
+        """
+        payload = self.prepare_pic(img)
+        if payload is None:
+            return False
+
+        self.send_pic(payload)
+        return True
+
+    def prepare_pic(self, img):
+        """
+        Encode a PIL image into a picture (0x44) frame.
+        Returns None (and counts the frame as skipped) if it didn't change since the last frame.
+        """
+        fingerprint = frame_fingerprint(img)
+        if self.is_unchanged(img, fingerprint):
+            self.frames_skipped += 1
+            return None
+
+        self.remember_frame(img, fingerprint)
+        return self.encode_pic(img, fingerprint)
+
+    def forget_frame(self):
+        """
+        Send the next frame even if it didn't change, e.g. after the device showed something else.
+        """
+        self.last_fingerprint = None
+        self.last_image = None
+
+    def remember_frame(self, img, fingerprint):
+        """
+        Record a frame as the last one sent, for the unchanged frame check.
+        """
+        self.last_fingerprint = fingerprint
+        if self.min_changed_pixels > 0:
+            self.last_image = img.copy()
+
+    def is_unchanged(self, img, fingerprint):
+        """
+        Check a frame against the last one sent.
+        """
+        if not self.skip_unchanged or self.last_fingerprint is None:
+            return False
+        if fingerprint == self.last_fingerprint:
+            return True
+        if self.min_changed_pixels > 0 and self.last_image is not None and self.last_image.size == img.size:
+            return count_changed_pixels(self.last_image, img) < self.min_changed_pixels
+        return False
+
+    def send_pic(self, frame):
+        """
+        Send an encoded picture (0x44) frame.
+        """
+        if self.supervisor is not None:
+            sent = self.supervisor.submit(frame, replace=True)  # a newer picture replaces an unsent one
+        else:
+            sent = self.send_frame(frame)
+        if sent:
+            self.frames_sent += 1
+
+    def encode_pic(self, img, fingerprint=None):
+        """
+        Encode a PIL image into a picture (0x44) frame, reusing it from the frame cache if possible.
+        """
+        quantizer_key = self.quantizer.key if self.quantizer is not None else ()
+        if self.frame_cache is None or quantizer_key is None:
+            return self.build_pic(img)
+        key = ("pic", type(self).__name__, quantizer_key, fingerprint or frame_fingerprint(img))
+        return self.frame_cache.get_or_build(key, lambda: self.build_pic(img))
+
+    def build_pic(self, img):
+        """
+        Encode a PIL image into a picture (0x44) frame, ready to send.
+        """
+        nb_colors, palette, pixel_data = self.encode_pil_image(img)
         frame_size = 7 + len(pixel_data) + len(palette)
-        frame_header = [0xAA, frame_size & 0xFF, (frame_size >> 8) & 0xFF, 0, 0, 0, nb_colors]
-        frame = frame_header + palette + pixel_data
-        prefix = [0x0, 0x0A, 0x0A, 0x04]
-        self.send(0x44, prefix + frame)
+        frame_header = (0xAA, frame_size & 0xFF, (frame_size >> 8) & 0xFF, 0, 0, 0, nb_colors & 0xFF)
+        return spp_frame(0x44, PIC_PREFIX, frame_header, palette, pixel_data)
 
 
 class PixooMax(Pixoo):
     """
-    PixooMax class, derives from Pixoo but does not support animation yet.
+    PixooMax class, derives from Pixoo for the 32x32 Pixoo-Max.
     """
 
-    def __init__(self, mac_address):
-        super().__init__(mac_address)
+    SIZE = 32
+    PAD_PIXEL_DATA = True
+    ANIM_CHUNK_SIZE = 200
 
-    def draw_pic(self, filepath):
+    def __init__(self, mac_address, **kwargs):
+        super().__init__(mac_address, **kwargs)
+
+    def build_pic(self, img):
         """
-        Draw encoded picture.
+        Encode a PIL image into a picture (0x44) frame, ready to send.
+        """
+        nb_colors, palette, pixel_data = self.encode_pil_image(img)
+        frame_header = self.frame_header(nb_colors, palette, pixel_data)
+        return spp_frame(0x44, PIC_PREFIX, frame_header, palette, pixel_data)
+
+    def frame_header(self, nb_colors, palette, pixel_data, duration=0):
+        """
+        Header of a 32x32 frame, followed by the palette and the pixel data.
         """
-        nb_colors, palette, pixel_data = self.encode_image(filepath)
         frame_size = 8 + len(pixel_data) + len(palette)
-        frame_header = [
+        return (
             0xAA,
             frame_size & 0xFF,
             (frame_size >> 8) & 0xFF,
-            0,
-            0,
+            duration & 0xFF,
+            (duration >> 8) & 0xFF,
             3,
             nb_colors & 0xFF,
             (nb_colors >> 8) & 0xFF,
-        ]
-        frame = frame_header + palette + pixel_data
-        prefix = [0x0, 0x0A, 0x0A, 0x04]
-        self.send(0x44, prefix + frame)
+        )
+
+    def frame_size(self, nb_colors):
+        """
+        Size of an encoded frame with the given number of colors.
+        """
+        bitwidth = max((nb_colors - 1).bit_length(), 1)
+        pixel_data_size = self.SIZE * self.SIZE * bitwidth // 8 + (1 if self.PAD_PIXEL_DATA else 0)
+        return 8 + 3 * nb_colors + pixel_data_size
 
     def draw_gif(self, filepath, speed=100):
-        raise "NotYetImplemented"
+        """
+        Stream a Gif file to the device as animation, one frame at a time.
+        The frame durations of the Gif are used, `speed` (ms) only for frames without one.
+        Returns False if the upload was not (fully) sent.
+        """
+
+        def frames():
+            anim_gif = Image.open(filepath)
+            for n in range(getattr(anim_gif, "n_frames", 1)):
+                anim_gif.seek(n)
+                yield anim_gif.convert(mode="RGBA"), anim_gif.info.get("duration") or speed
+
+        return self.__stream_anim(self.anim_cache_key("gif", filepath, speed), frames)
 
     def draw_anim(self, filepaths, speed=100):
-        raise "NotYetImplemented"
+        """
+        Stream a list of image files to the device as animation, showing each for `speed` ms.
+        Returns False if the upload was not (fully) sent.
+        """
 
-    def encode_image(self, filepath):
-        img = Image.open(filepath)
-        img = img.convert(mode="P", palette=Image.ADAPTIVE, colors=256).convert(mode="RGBA")
-        return self.encode_raw_image(img)
+        def frames():
+            for filepath in filepaths:
+                yield Image.open(filepath), speed
 
-    def encode_raw_image(self, img):
+        return self.__stream_anim(self.anim_cache_key("anim", *filepaths, speed), frames)
+
+    def iter_anim_chunks(self, frames):
         """
-        Encode a 32x32 image.
+        Encode frames into animation (0x49) chunk frames, lazily.
+
+        `frames` is called twice and must return a fresh iterator of (image, duration in ms) each
+        time: the chunks carry the total size, so a first pass only counts the colors of every
+        frame. After that each frame is encoded and its chunks are emitted before the next one
+        is decoded, so memory doesn't grow with the length of the animation.
         """
-        # ensure image is 32x32
-        w, h = img.size
-        if w == h:
-            # resize if image is too big
-            if w > 32:
-                img = img.resize((32, 32))
-
-            # create palette and pixel array
-            pixels = []
-            palette = []
-            for y in range(32):
-                for x in range(32):
-                    pix = img.getpixel((x, y))
-
-                    if len(pix) == 4:
-                        r, g, b, a = pix
-                    elif len(pix) == 3:
-                        r, g, b = pix
-                    if (r, g, b) not in palette:
-                        palette.append((r, g, b))
-                        idx = len(palette) - 1
-                    else:
-                        idx = palette.index((r, g, b))
-                    pixels.append(idx)
-
-            # encode pixels
-            bitwidth = ceil(log10(len(palette)) / log10(2))
-            nbytes = ceil((256 * bitwidth) / 8.0)
-            encoded_pixels = [0] * nbytes
-
-            encoded_pixels = []
-            encoded_byte = ""
-
-            # Create our pixels bitstream
-            for i in pixels:
-                encoded_byte = bin(i)[2:].rjust(bitwidth, "0") + encoded_byte
-
-            # Encode pixel data
-            while len(encoded_byte) >= 8:
-                encoded_pixels.append(encoded_byte[-8:])
-                encoded_byte = encoded_byte[:-8]
-
-            # If some bits left, pack and encode
-            padding = 8 - len(encoded_byte)
-            encoded_pixels.append(encoded_byte.rjust(bitwidth, "0"))
-
-            # Convert into array of 8-bit values
-            encoded_data = [int(c, 2) for c in encoded_pixels]
-            encoded_palette = []
-            for r, g, b in palette:
-                encoded_palette += [r, g, b]
-            return (len(palette), encoded_palette, encoded_data)
-        else:
-            print("[!] Image must be square.")
+        total_size = 0
+        for img, _ in frames():
+            # counted like the encoder does, e.g. merging palette entries only differing in alpha
+            total_size += self.frame_size(len(index_colors(self.__anim_image(img))[0]))
+        if total_size > 0xFFFF:
+            raise ValueError(f"Animation too large ({total_size} bytes, 65535 max)")
+
+        size_bytes = (total_size & 0xFF, (total_size >> 8) & 0xFF)
+        pending = bytearray()
+        index = 0
+        for img, duration in frames():
+            nb_colors, palette, pixel_data = self.encode_raw_image(self.__anim_image(img))
+            pending += bytes(self.frame_header(nb_colors, palette, pixel_data, duration))
+            pending += palette
+            pending += pixel_data
+
+            start = 0
+            while len(pending) - start >= self.ANIM_CHUNK_SIZE:
+                chunk = memoryview(pending)[start : start + self.ANIM_CHUNK_SIZE]
+                yield spp_frame(0x49, size_bytes, (index & 0xFF,), chunk)
+                chunk.release()
+                start += self.ANIM_CHUNK_SIZE
+                index += 1
+            del pending[:start]
+
+        if pending:
+            yield spp_frame(0x49, size_bytes, (index & 0xFF,), pending)
+
+    def anim_quantizer_key(self):
+        # animation frames are always reduced by a stateless copy of the quantizer
+        return self.quantizer.stateless().key if self.quantizer is not None else ()
+
+    def __anim_image(self, img):
+        if img.size != (self.SIZE, self.SIZE):
+            img = img.convert(mode="RGBA").resize((self.SIZE, self.SIZE))
+        # both passes over the frames must give the same colors, so no palette is kept between frames
+        return (self.quantizer or self.default_quantizer()).stateless().quantize(img)
+
+    def __stream_anim(self, key, frames):
+        cache = self.frame_cache if key is not None else None
+        chunks = cache.get(key) if cache is not None else None
+        if chunks is None and (cache is not None or self.supervisor is not None):
+            # a supervised upload is queued as a whole, at most 64 KiB
+            chunks = list(self.iter_anim_chunks(frames))
+            if cache is not None:
+                cache.put(key, chunks)
+        if chunks is not None:
+            return self.send_anim_chunks(chunks)
+        return self.send_anim_chunks(self.iter_anim_chunks(frames))  # encoded while sending
+
+    def default_quantizer(self):
+        return Quantizer(256)
@@ -0,0 +1,226 @@
+"""
+The widgets a scene can be built from, each imported only when a scene uses it.
+
+A scene is a list of plugins drawn bottom first, separated by ";" like a schedule (e.g. the
+SCENE setting):
+
+    clock; github user=HoroTW position=31,0; graph metric=cpu position=0,24
+
+Every plugin names its factory as "module:function" and lists its options with a parser and a
+default, so a whole scene is checked (options and required settings like GITHUB_TOKEN) before
+anything is imported. Only then the modules of the plugins in use are imported, a scene without
+the GitHub pixel never loads requests.
+"""
+import importlib
+from os import getenv
+
+REQUIRED = object()  # the default of options that have to be given
+GRAPH_METRICS = ("cpu", "memory", "net_rx", "net_tx", "disk_read", "disk_write")  # modules.system.METRICS
+
+
+def point(value):
+    """
+    Parse "31,0" into (31, 0).
+    """
+    x, y = (int(part) for part in value.split(","))
+    return (x, y)
+
+
+def color(value):
+    """
+    Parse "#5aff5a", "#5aff5aff" or "90,255,90[,255]" into an RGBA tuple.
+    """
+    if value.startswith("#"):
+        if len(value) not in (7, 9):
+            raise ValueError("use #rrggbb[aa] or r,g,b[,a]")
+        channels = [int(value[idx : idx + 2], 16) for idx in range(1, len(value), 2)]
+    else:
+        channels = [int(part) for part in value.split(",")]
+    if len(channels) not in (3, 4) or not all(0 <= channel <= 255 for channel in channels):
+        raise ValueError("use #rrggbb[aa] or r,g,b[,a]")
+    return tuple(channels) + (255,) * (4 - len(channels))
+
+
+def flag(value):
+    if value.lower() not in ("1", "0", "true", "false", "yes", "no"):
+        raise ValueError("use true or false")
+    return value.lower() in ("1", "true", "yes")
+
+
+def choice(*values):
+    """
+    A parser accepting only one of `values`.
+    """
+
+    def parse(value):
+        if value not in values:
+            raise ValueError(f"use one of {', '.join(values)}")
+        return value
+
+    return parse
+
+
+class Plugin:
+    """
+    A widget factory ("module:function") with its options: {name: (parser, default)}.
+    `settings` are environment settings the plugin can't work without.
+    """
+
+    def __init__(self, factory, options=None, settings=()):
+        self.factory = factory
+        self.options = {"position": (point, (0, 0)), **(options or {})}
+        self.settings = settings
+
+    def validate(self, name, raw_options):
+        """
+        Parse the options of a scene entry (strings by option name), with the defaults filled in.
+        """
+        unknown = set(raw_options) - set(self.options)
+        assert not unknown, f"Unknown option(s) {sorted(unknown)} of {name!r}, use {sorted(self.options)}"
+        for setting in self.settings:
+            assert getenv(setting), f"{name!r} needs the {setting} setting, see example.env"
+
+        options = {}
+        for option, (parse, default) in self.options.items():
+            if option not in raw_options:
+                assert default is not REQUIRED, f"{name!r} needs the option {option}=..."
+                options[option] = default
+                continue
+            try:
+                options[option] = parse(raw_options[option])
+            except ValueError as error:
+                message = f"Invalid {option}={raw_options[option]!r} of {name!r}: {error}"
+                raise AssertionError(message) from error
+        return options
+
+    def load(self):
+        """
+        Import the module of the factory, returns the factory.
+        """
+        module_name, _, function_name = self.factory.partition(":")
+        return getattr(importlib.import_module(module_name), function_name)
+
+
+PLUGINS = {
+    "clock": Plugin("modules.time:clock_widget"),
+    "github": Plugin(
+        "modules.github:contribution_widget",
+        {"user": (str, REQUIRED), "required": (int, 1), "position": (point, (31, 0)), "refresh": (float, 1)},
+        settings=("GITHUB_TOKEN",),
+    ),
+    "graph": Plugin(
+        "modules.system:graph_widget",
+        {
+            "metric": (choice(*GRAPH_METRICS), "cpu"),
+            "position": (point, (0, 24)),
+            "size": (point, (32, 8)),
+            "color": (color, (90, 255, 90, 255)),
+            "max_value": (float, None),
+        },
+    ),
+    "text": Plugin(
+        "modules.text:text_widget",
+        {
+            "text": (str, REQUIRED),
+            "size": (point, (32, 32)),
+            "color": (color, (255, 255, 255, 255)),
+            "font": (str, None),
+        },
+    ),
+    "marquee": Plugin(
+        "modules.text:marquee_widget",
+        {
+            "text": (str, REQUIRED),
+            "position": (point, (0, 24)),
+            "width": (int, 32),
+            "font_size": (int, 8),
+            "color": (color, (255, 255, 255, 255)),
+            "speed": (float, 10),
+            "font": (str, None),
+        },
+    ),
+    "slideshow": Plugin(
+        "modules.slideshow:slideshow_widget",
+        {
+            "folder": (str, REQUIRED),
+            "size": (int, 32),
+            "duration": (float, 10),
+            "pan_zoom": (flag, True),
+            "shuffle": (flag, False),
+        },
+    ),
+    "mqtt_pixel": Plugin(
+        "modules.mqtt:pixel_widget",
+        {
+            "topic": (str, REQUIRED),
+            "position": (point, (31, 0)),
+            "on": (color, (0, 255, 0, 255)),
+            "off": (color, (255, 0, 0, 255)),
+        },
+        settings=("MQTT_HOST",),
+    ),
+    "mqtt_text": Plugin(
+        "modules.mqtt:text_widget",
+        {
+            "topic": (str, REQUIRED),
+            "size": (point, (32, 32)),
+            "color": (color, (255, 255, 255, 255)),
+            "font": (str, None),
+        },
+        settings=("MQTT_HOST",),
+    ),
+    "mqtt_image": Plugin(
+        "modules.mqtt:image_widget",
+        {"topic": (str, REQUIRED), "size": (point, (32, 32))},
+        settings=("MQTT_HOST",),
+    ),
+}
+
+
+def register(name, plugin):
+    """
+    Make a Plugin (e.g. of your own module) usable in scenes.
+    """
+    PLUGINS[name] = plugin
+
+
+def parse_scene(text):
+    """
+    Parse "clock; github user=HoroTW position=31,0" into (plugin name, {option: string}) tuples.
+    Values can't contain spaces, use "_" instead (it is replaced by a space in text options).
+    """
+    entries = []
+    for entry in text.split(";"):
+        words = entry.split()
+        if not words:
+            continue
+        options = {}
+        for word in words[1:]:
+            key, has_value, value = word.partition("=")
+            assert has_value, f"Options are key=value, got {word!r} in {entry.strip()!r}"
+            options[key] = value.replace("_", " ") if key == "text" else value
+        entries.append((words[0], options))
+    return entries
+
+
+def validate_scene(text):
+    """
+    Check a whole scene without importing any plugin, returns (plugin, options) tuples.
+    """
+    plugins = []
+    for name, raw_options in parse_scene(text):
+        assert name in PLUGINS, f"Unknown plugin {name!r}, use one of {sorted(PLUGINS)}"
+        plugin = PLUGINS[name]
+        plugins.append((plugin, plugin.validate(name, raw_options)))
+    assert plugins, "The scene is empty"
+    return plugins
+
+
+def build_widgets(text):
+    """
+    Validate a scene, then import its plugins and build their widgets.
+    """
+    widgets = []
+    for plugin, options in validate_scene(text):
+        widgets.append(plugin.load()(**options))
+    return widgets
@@ -0,0 +1,96 @@
+from PIL import Image
+
+METHODS = ("adaptive", "mediancut", "fastoctree", "web")
+
+
+def web_palette(colors=256):
+    """
+    A palette image holding the 216 color web palette, or for fewer colors the largest evenly
+    spaced color cube that fits (e.g. 64 colors for 64 to 124, 8 for 8 to 26).
+    """
+    steps = 6
+    while steps > 2 and steps**3 > colors:
+        steps -= 1
+    palette = Image.new("P", (1, 1))
+    levels = [round(255 * step / (steps - 1)) for step in range(steps)]
+    palette.putpalette([channel for r in levels for g in levels for b in levels for channel in (r, g, b)])
+    return palette
+
+
+def colors_for_bits(colors):
+    """
+    Round a color count down to a power of two: the device packs pixels with
+    ceil(log2(colors)) bits, so e.g. 20 colors cost as much as 32 but look hardly better than 16.
+    """
+    return 1 << (max(colors, 2).bit_length() - 1)
+
+
+class Quantizer:
+    """
+    Reduce frames to an indexed (P mode) image the encoders can use without rediscovering the palette.
+
+    `method` is one of:
+    - "adaptive": what `convert(mode="P", palette=Image.ADAPTIVE)` does (median cut for RGB,
+      fast octree for RGBA images)
+    - "mediancut": median cut, best quality but the slowest
+    - "fastoctree": fast octree
+    - "web": the fixed 216 color web palette, no palette computation at all (a smaller color
+      cube for fewer than 216 colors)
+
+    With `stable=True` the palette of one frame is reused for the following frames (mapping to a
+    known palette is much cheaper than computing one, and colors don't flicker between frames).
+    It is recomputed every `refresh` frames, or never if `refresh` is 0.
+    """
+
+    def __init__(self, colors=256, method="adaptive", stable=False, refresh=0, dither=False):
+        assert method in METHODS, f"Unknown quantization method {method!r}, use one of {METHODS}"
+        self.colors = colors_for_bits(colors)
+        self.method = method
+        self.stable = stable
+        self.refresh = refresh
+        self.dither = Image.Dither.FLOYDSTEINBERG if dither else Image.Dither.NONE
+
+        self.palette = web_palette(self.colors) if method == "web" else None
+        self.frames_since_palette = 0
+
+    @property
+    def key(self):
+        """
+        Identifies the output of this quantizer for a given input, None if it depends on earlier frames.
+        """
+        if self.stable and self.method != "web":
+            return None
+        return (self.method, self.colors, self.dither)
+
+    def stateless(self):
+        """
+        A quantizer with the same settings that doesn't keep a palette between frames.
+        """
+        return Quantizer(self.colors, self.method, dither=self.dither != Image.Dither.NONE)
+
+    def quantize(self, img):
+        """
+        Return img as a P mode image with at most `colors` colors.
+        """
+        if img.mode == "P" and len(img.getcolors(256)) <= self.colors:
+            return img  # already indexed and small enough
+
+        if self.palette is not None:
+            if self.method == "web" or not self.refresh or self.frames_since_palette < self.refresh:
+                self.frames_since_palette += 1
+                return img.convert(mode="RGB").quantize(palette=self.palette, dither=self.dither)
+
+        quantized = self.__compute_palette(img)
+        if self.stable:
+            self.palette = quantized
+            self.frames_since_palette = 1
+        return quantized
+
+    def __compute_palette(self, img):
+        if self.method == "adaptive":
+            return img.convert(mode="P", palette=Image.ADAPTIVE, colors=self.colors)
+        if self.method == "mediancut":
+            return img.convert(mode="RGB").quantize(self.colors, Image.Quantize.MEDIANCUT, dither=self.dither)
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert(mode="RGBA")
+        return img.quantize(self.colors, Image.Quantize.FASTOCTREE, dither=self.dither)
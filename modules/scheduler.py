@@ -0,0 +1,215 @@
+"""
+Switch scenes, brightness and frame rate by the time of day.
+
+A schedule is a list of rules, each starting at a time of day on some weekdays and lasting until
+the next rule starts. As a string (e.g. the SCHEDULE setting) rules are separated by ";":
+
+    07:00 mon-fri default brightness=80 fps=10; 09:00 sat,sun default; 23:00 off
+
+A rule is "HH:MM [days] [scene or off] [brightness=0-100] [fps=n] [box_mode=n]", days default
+to every day, and values a rule doesn't set are kept from the rule before. While a rule is "off"
+(or has fps=0) nothing is rendered or sent: the pipeline and the widget refreshes are paused and
+the scheduler sleeps until the next rule starts, which shows the last scene again. With box_mode
+the device shows one of its built-in modes (e.g. its own clock) in the meantime.
+"""
+from datetime import datetime, timedelta
+from threading import Event, Lock, Thread
+
+WEEKDAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+OFF = "off"
+
+
+def parse_days(spec):
+    """
+    Parse "mon-fri", "sat,sun" or "*" into a set of weekday numbers (monday is 0).
+    """
+    if spec in ("*", ""):
+        return frozenset(range(7))
+    days = set()
+    for part in spec.lower().split(","):
+        first, _, last = part.partition("-")
+        start = WEEKDAYS.index(first)
+        end = WEEKDAYS.index(last) if last else start
+        days.update(range(start, end + 1) if start <= end else (*range(start, 7), *range(0, end + 1)))
+    return frozenset(days)
+
+
+class Rule:
+    """
+    From `at` ("HH:MM") on `days` show `scene` at `brightness` and `fps`, nothing if the scene
+    is "off" or fps is 0. Unset values keep the setting of the previous rule.
+    """
+
+    def __init__(self, at, days="*", scene=None, brightness=None, fps=None, box_mode=None):
+        hour, minute = (int(value) for value in at.split(":"))
+        assert 0 <= hour < 24 and 0 <= minute < 60, f"Invalid time {at!r}"
+        self.at = at
+        self.time = (hour, minute)
+        self.days = parse_days(days) if isinstance(days, str) else frozenset(days)
+        self.off = scene == OFF or fps == 0
+        self.scene = None if scene == OFF else scene
+        self.brightness = brightness
+        self.fps = fps or None
+        self.box_mode = box_mode
+
+    def start_on(self, day):
+        """
+        The start of this rule on the date of `day` (a datetime), None if it doesn't run that day.
+        """
+        if day.weekday() not in self.days:
+            return None
+        return day.replace(hour=self.time[0], minute=self.time[1], second=0, microsecond=0)
+
+    def __repr__(self):
+        scene = OFF if self.off else self.scene
+        return f"Rule({self.at!r}, scene={scene!r}, brightness={self.brightness}, fps={self.fps})"
+
+
+def parse_schedule(text):
+    """
+    Parse rules like "07:00 mon-fri default brightness=80 fps=10; 23:00 off" (see the module doc).
+    """
+    rules = []
+    for entry in text.split(";"):
+        words = entry.split()
+        if not words:
+            continue
+        options = {"at": words[0]}
+        for word in words[1:]:
+            key, has_value, value = word.partition("=")
+            if has_value:
+                assert key in ("brightness", "fps", "box_mode"), f"Unknown schedule option {key!r}"
+                options[key] = float(value) if key == "fps" else int(value)
+            elif key == "*" or all(day in WEEKDAYS for day in key.replace("-", ",").split(",")):
+                options["days"] = key
+            else:
+                options["scene"] = key
+        rules.append(Rule(**options))
+    return rules
+
+
+class Schedule:
+    """
+    A list of Rules, each in effect from its start until the next rule starts.
+    """
+
+    def __init__(self, rules):
+        self.rules = list(rules)
+
+    def settings(self, now):
+        """
+        The merged settings at `now`: the active rule, with unset values taken from earlier rules.
+        """
+        settings = {"scene": None, "off": False, "brightness": None, "fps": None, "box_mode": None}
+        for _, rule in sorted(self.__starts(now - timedelta(days=8), now), key=lambda item: item[0]):
+            settings["off"] = rule.off
+            for key in ("scene", "brightness", "fps", "box_mode"):
+                if getattr(rule, key) is not None:
+                    settings[key] = getattr(rule, key)
+        return settings
+
+    def next_transition(self, now):
+        """
+        When the next rule starts after `now`, None if there are no rules.
+        """
+        starts = [start for start, _ in self.__starts(now, now + timedelta(days=8)) if start > now]
+        return min(starts, default=None)
+
+    def __starts(self, since, until):
+        day = since
+        while day.date() <= until.date():
+            for rule in self.rules:
+                start = rule.start_on(day)
+                if start is not None and since <= start <= until:
+                    yield start, rule
+            day += timedelta(days=1)
+
+
+class Scheduler:
+    """
+    Apply a Schedule to a FramePipeline and the devices of a DeviceManager.
+
+    `scenes` maps scene names to render functions. At every transition the render function,
+    frame rate and device brightness are switched; while the schedule is off the pipeline is
+    paused, the devices get no frames at all and `services` (e.g. the WidgetScene refreshing the
+    widget data) are stopped until it is on again. Between transitions the scheduler just sleeps.
+    """
+
+    def __init__(self, schedule, scenes, pipeline, manager, services=(), now=datetime.now):
+        self.schedule = schedule
+        self.scenes = scenes
+        self.pipeline = pipeline
+        self.manager = manager
+        self.services = list(services)
+        self.now = now
+        for rule in schedule.rules:
+            assert rule.scene is None or rule.scene in scenes, f"Unknown scene {rule.scene!r} in {rule}"
+
+        self.lock = Lock()
+        self.stop_event = Event()
+        self.thread = None
+        self.current = None
+
+    def start(self):
+        self.stop_event.clear()
+        self.apply()
+        self.thread = Thread(target=self.__schedule_loop, name="scheduler", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=2)
+            self.thread = None
+
+    def apply(self):
+        """
+        Apply the settings in effect now, returns the time of the next transition.
+        """
+        with self.lock:
+            now = self.now()
+            settings = self.schedule.settings(now)
+            if settings != self.current:
+                self.__switch(settings)
+        return self.schedule.next_transition(now)
+
+    def __switch(self, settings):
+        print(f"Schedule: {settings}")
+        previous, self.current = self.current or {}, settings
+        self.__command_devices(settings, previous)
+        if settings["off"]:
+            self.pipeline.pause()
+            if not previous.get("off"):
+                for service in self.services:
+                    service.stop()
+            return
+
+        if settings["scene"] is not None:
+            self.pipeline.render = self.scenes[settings["scene"]]
+        if settings["fps"]:
+            self.pipeline.fps = settings["fps"]
+        if previous.get("off"):
+            for service in self.services:
+                service.start()
+        self.pipeline.resume()
+
+    def __command_devices(self, settings, previous):
+        if settings["brightness"] is not None and settings["brightness"] != previous.get("brightness"):
+            self.manager.command("set_system_brightness", settings["brightness"])
+        # the box mode is only shown while off, the carried over value of an "on" rule is ignored
+        box_mode = (
+            settings["off"]
+            and settings["box_mode"] is not None
+            and (settings["box_mode"] != previous.get("box_mode") or not previous.get("off"))
+        )
+        if box_mode:
+            self.manager.command("set_box_mode", settings["box_mode"])
+        if box_mode or previous.get("off"):
+            self.manager.forget_frames()  # the devices show something else, send the scene again
+
+    def __schedule_loop(self):
+        while not self.stop_event.is_set():
+            transition = self.apply()
+            # sleep until the next rule starts, but look again every hour in case the clock jumped
+            delay = (transition - self.now()).total_seconds() if transition else 3600
+            self.stop_event.wait(min(max(delay, 0.1), 3600))
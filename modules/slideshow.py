@@ -0,0 +1,220 @@
+"""
+Show the pictures of a folder one after another, optionally slowly panning and zooming.
+
+The folder is scanned lazily and the next pictures are decoded by a background thread, already
+reduced to a small working resolution (JPEGs are decoded at a reduced scale right away), so
+memory stays bounded by the prefetch count however large the folder or the pictures are.
+"""
+import os
+import random
+from queue import Empty, Full, Queue
+from threading import Event, Thread
+from time import monotonic
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from modules.widgets import Widget
+
+EXTENSIONS = (".jpg", ".jpeg", ".png", ".gif", ".bmp", ".webp")
+SOURCE_SIZE = 128  # pixels, the shorter side of the working copy pan and zoom crop from
+
+
+def scan(directory, extensions=EXTENSIONS):
+    """
+    Yield the pictures in directory (not recursive), without listing the whole folder first.
+    """
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.name.lower().endswith(extensions) and entry.is_file():
+                yield entry.path
+
+
+def load_image(path, min_size):
+    """
+    Open a picture, reduced to a size whose shorter side is at least min_size pixels.
+
+    JPEGs are decoded at a reduced scale with `draft`, other formats are shrunk by an integer
+    factor with `reduce` before the final resize, both much cheaper than resizing the original.
+    """
+    with Image.open(path) as img:
+        img.draft("RGB", (min_size, min_size))  # a no-op for everything but JPEG
+        img = ImageOps.exif_transpose(img).convert("RGB")
+
+    factor = min(img.size) // min_size
+    if factor > 1:
+        img = img.reduce(factor)
+    if min(img.size) > min_size:
+        scale = min_size / min(img.size)
+        img = img.resize((max(round(img.width * scale), 1), max(round(img.height * scale), 1)), Image.LANCZOS)
+    return img
+
+
+def fit_box(source_size, aspect=1.0, zoom=1.0, center=(0.5, 0.5)):
+    """
+    The largest box of `aspect` (width / height) inside source_size, shrunk by zoom and moved
+    as close to center (fractions of the source size) as fits.
+    """
+    width, height = source_size
+    box_width = min(width, height * aspect) / zoom
+    box_height = box_width / aspect
+    left = min(max(center[0] * width - box_width / 2, 0), width - box_width)
+    top = min(max(center[1] * height - box_height / 2, 0), height - box_height)
+    return (left, top, left + box_width, top + box_height)
+
+
+class Slide:
+    """
+    One decoded picture and the camera movement over it: from box `start` to box `end`.
+    """
+
+    def __init__(self, path, source, start, end):
+        self.path = path
+        self.source = source
+        self.start = start
+        self.end = end
+
+    def box(self, progress):
+        return tuple(a + (b - a) * progress for a, b in zip(self.start, self.end))
+
+
+class Slideshow:
+    """
+    Frames showing the pictures of `directory` for `duration` seconds each.
+
+    A background thread decodes the next `prefetch` pictures. With `pan_zoom` every picture
+    moves slowly between two random views, a frame is cropped and resized from the small
+    working copy of the picture.
+    """
+
+    def __init__(
+        self, directory, size=32, duration=10, prefetch=2, pan_zoom=True, max_zoom=1.6, shuffle=False
+    ):
+        self.directory = directory
+        self.size = size
+        self.duration = duration
+        self.pan_zoom = pan_zoom
+        self.max_zoom = max_zoom
+        self.shuffle = shuffle
+
+        self.queue = Queue(maxsize=prefetch)
+        self.stop_event = Event()
+        self.thread = None
+        self.slide = None
+        self.shown_at = 0.0
+        self.still = None  # the frame of a slide without pan and zoom
+        self.failed = 0
+
+    def start(self):
+        self.stop_event.clear()
+        self.thread = Thread(target=self.__decode_loop, name="slideshow", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=2)
+            self.thread = None
+
+    def position(self, now=None):
+        """
+        (slide, progress from 0 to 1) at monotonic time now, switching to the next decoded slide
+        when the current one was shown long enough.
+        """
+        now = now or monotonic()
+        if self.slide is None or now - self.shown_at >= self.duration:
+            try:
+                self.slide, self.shown_at, self.still = self.queue.get_nowait(), now, None
+            except Empty:
+                pass  # the next picture isn't decoded yet, keep showing this one
+        if self.slide is None:
+            return None, 0.0
+        return self.slide, min((now - self.shown_at) / self.duration, 1.0)
+
+    def frame(self, now=None):
+        """
+        The current frame as RGB image, None until the first picture is decoded.
+        """
+        slide, progress = self.position(now)
+        if slide is None:
+            return None
+        if not self.pan_zoom:
+            if self.still is None:
+                self.still = slide.source.resize((self.size, self.size), Image.LANCZOS, box=slide.start)
+            return self.still
+        return slide.source.resize((self.size, self.size), Image.BILINEAR, box=slide.box(progress))
+
+    def __camera(self, source):
+        if not self.pan_zoom:
+            box = fit_box(source.size)
+            return box, box
+
+        def view():
+            zoom = random.uniform(1, self.max_zoom)
+            return fit_box(source.size, zoom=zoom, center=(random.random(), random.random()))
+
+        return view(), view()
+
+    def __paths(self):
+        while not self.stop_event.is_set():
+            paths = scan(self.directory)
+            if self.shuffle:
+                paths = list(paths)  # shuffling needs the whole listing
+                random.shuffle(paths)
+            found = False
+            for path in paths:
+                found = True
+                yield path
+            if not found:
+                self.stop_event.wait(self.duration)  # empty folder, look again later
+
+    def __decode_loop(self):
+        for path in self.__paths():
+            try:
+                source = load_image(path, max(SOURCE_SIZE, self.size))
+            except (OSError, UnidentifiedImageError) as error:
+                self.failed += 1
+                print(f"[!] Skipping {path}: {error}")
+                continue
+
+            slide = Slide(path, source, *self.__camera(source))
+            while not self.stop_event.is_set():
+                try:
+                    self.queue.put(slide, timeout=0.5)  # blocks while enough slides are prefetched
+                    break
+                except Full:
+                    continue
+            if self.stop_event.is_set():
+                return
+
+
+class SlideshowWidget(Widget):
+    """
+    A widget showing a Slideshow, redrawn only when the view moved (every frame while panning).
+    """
+
+    def __init__(self, slideshow, **kwargs):
+        super().__init__(self.__view, **kwargs)
+        self.slideshow = slideshow
+
+    def __view(self):
+        slide, progress = self.slideshow.position()
+        if slide is None:
+            return None
+        # a pan moves by less than a pixel per frame, this only changes when the crop does
+        box = slide.box(progress) if self.slideshow.pan_zoom else slide.start
+        return (id(slide), tuple(round(value, 1) for value in box))
+
+    def draw(self, data):
+        frame = self.slideshow.frame() if data is not None else None
+        if frame is None:
+            return Image.new("RGBA", (self.slideshow.size, self.slideshow.size), (0, 0, 0, 0))
+        return frame.convert("RGBA")
+
+
+def slideshow_widget(folder, position=(0, 0), size=32, duration=10, pan_zoom=True, shuffle=False):
+    """
+    The "slideshow" scene plugin, the pictures are decoded from now on.
+    """
+    slideshow = Slideshow(folder, size, duration, pan_zoom=pan_zoom, shuffle=shuffle)
+    slideshow.start()
+    return SlideshowWidget(slideshow, position=position)
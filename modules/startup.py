@@ -0,0 +1,101 @@
+"""
+Measure the cold start and show the last frame of the previous run while it is still going.
+
+`StartupTimer` marks the steps until the first frame is sent. `FirstFrame` keeps the last sent
+picture of every device type on disk: at the next start it is queued right after the devices
+start connecting, before the scene and its heavy dependencies are loaded, so the display shows
+something (a few minutes old) instead of staying dark.
+
+Only the standard library is imported here, so this module can be imported first.
+"""
+import os
+from pathlib import Path
+from threading import Lock
+from time import monotonic, perf_counter
+
+SAVE_INTERVAL = 60  # seconds between writes of the first frame
+IMPORTED = perf_counter()  # a script importing this module first is timed from here on
+
+
+class StartupTimer:
+    """
+    Seconds from `started` (by default when this module was imported) to every `mark`.
+    """
+
+    def __init__(self, started=IMPORTED):
+        self.started = started
+        self.marks = []  # (step, seconds since started)
+
+    def mark(self, step):
+        self.marks.append((step, perf_counter() - self.started))
+
+    def report(self):
+        return "Startup: " + ", ".join(f"{step} {seconds:.3f}s" for step, seconds in self.marks)
+
+
+class FirstFrame:
+    """
+    The last picture (0x44) frame sent to each device type, written to `directory` at most
+    every `interval` seconds.
+    """
+
+    def __init__(self, directory, interval=SAVE_INTERVAL):
+        self.directory = Path(directory)
+        self.interval = interval
+        self.lock = Lock()
+        self.saved_at = None
+
+    def path_for(self, device_class):
+        return self.directory / f"{device_class.__name__}.first"
+
+    def load(self, device_class):
+        try:
+            return self.path_for(device_class).read_bytes() or None
+        except OSError:
+            return None
+
+    def save(self, device_class, frame):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.path_for(device_class)
+        temporary = path.with_suffix(".tmp")
+        temporary.write_bytes(frame)
+        os.replace(temporary, path)  # a start while writing still finds a complete frame
+
+    def show(self, manager):
+        """
+        Queue the saved frame for every device of a DeviceManager, sent as soon as it connects.
+        Returns the number of devices that got one.
+        """
+        shown = 0
+        for device in manager.devices:
+            frame = self.load(type(device))
+            if frame is not None:
+                device.send_pic(frame)
+                shown += 1
+        return shown
+
+    def recording(self, manager, send, timer=None):
+        """
+        Wrap the send function of a FramePipeline (`manager.send`): the payloads are saved every
+        `interval` seconds and the first call is marked on `timer`.
+        """
+
+        def send_and_record(payloads):
+            send(payloads)
+            now = monotonic()
+            with self.lock:
+                due = self.saved_at is None or now - self.saved_at >= self.interval
+                if due:
+                    if self.saved_at is None and timer is not None:
+                        timer.mark("first frame")
+                        print(timer.report())
+                    self.saved_at = now
+            if not due:
+                return
+            try:
+                for idx, payload in payloads.items():
+                    self.save(type(manager.devices[idx]), payload)
+            except OSError as error:
+                print(f"[!] Saving the first frame failed: {error}")
+
+        return send_and_record
@@ -0,0 +1,245 @@
+"""
+CPU, memory, network and disk graphs of the local machine.
+
+A `ProcCollector` samples /proc from a background thread into fixed size ring buffers and
+`MetricGraph` widgets draw them, one new column per sample.
+"""
+import os
+from array import array
+from threading import Event, Lock, Thread
+from time import monotonic
+
+from PIL import Image
+
+from modules.widgets import Widget
+
+METRICS = ("cpu", "memory", "net_rx", "net_tx", "disk_read", "disk_write")
+SECTOR_SIZE = 512  # /proc/diskstats counts 512 byte sectors, whatever the disk uses
+READ_SIZE = 64 * 1024
+
+
+class RingBuffer:
+    """
+    The last `size` values in a preallocated array, iterated oldest first.
+    """
+
+    def __init__(self, size, typecode="f"):
+        self.values = array(typecode, bytes(array(typecode).itemsize * size))
+        self.size = size
+        self.start = 0
+        self.count = 0
+
+    def append(self, value):
+        end = (self.start + self.count) % self.size
+        self.values[end] = value
+        if self.count < self.size:
+            self.count += 1
+        else:
+            self.start = (self.start + 1) % self.size
+
+    def latest(self, default=0):
+        return self.values[(self.start + self.count - 1) % self.size] if self.count else default
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        for idx in range(self.count):
+            yield self.values[(self.start + idx) % self.size]
+
+
+class ProcCollector:
+    """
+    Sample the system load from /proc every `interval` seconds, keeping `history` samples per
+    metric (see METRICS): cpu and memory as fractions of 1, the others in bytes per second.
+
+    The files are opened once and read with a single pread per sample, so a sample costs a few
+    dozen microseconds.
+    """
+
+    def __init__(self, interval=1.0, history=32, proc="/proc"):
+        self.interval = interval
+        self.proc = proc
+        self.history = {metric: RingBuffer(history) for metric in METRICS}
+        self.lock = Lock()
+        self.samples = 0  # number of samples taken, widgets use it to notice new ones
+
+        self.files = {}
+        self.disks = self.__whole_disks()
+        self.previous = None  # (time, cpu busy, cpu total, counters) of the last sample
+        self.stop_event = Event()
+        self.thread = None
+
+    def start(self):
+        self.stop_event.clear()
+        self.sample()  # the first sample only sets the baseline of the counters
+        self.thread = Thread(target=self.__sample_loop, name="proc-collector", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=2)
+            self.thread = None
+        for fd in self.files.values():
+            os.close(fd)
+        self.files.clear()
+
+    def values(self, metric):
+        """
+        A copy of the history of metric, oldest first.
+        """
+        with self.lock:
+            return list(self.history[metric])
+
+    def sample(self):
+        """
+        Read /proc once, append a value to every metric (except on the first call).
+        """
+        now = monotonic()
+        busy, total = self.__cpu()
+        counters = (*self.__net(), *self.__disk())
+        memory = self.__memory()
+
+        previous, self.previous = self.previous, (now, busy, total, counters)
+        if previous is None:
+            return
+        elapsed = now - previous[0] or 1e-9
+        cpu = (busy - previous[1]) / ((total - previous[2]) or 1)
+        rates = [(new - old) / elapsed for new, old in zip(counters, previous[3])]
+
+        with self.lock:
+            for metric, value in zip(METRICS, (cpu, memory, *rates)):
+                self.history[metric].append(max(value, 0))
+            self.samples += 1
+
+    def __read(self, name):
+        fd = self.files.get(name)
+        if fd is None:
+            fd = self.files[name] = os.open(os.path.join(self.proc, name), os.O_RDONLY)
+        return os.pread(fd, READ_SIZE, 0)
+
+    def __cpu(self):
+        # cpu  user nice system idle iowait irq softirq steal ...
+        fields = [int(value) for value in self.__read("stat").split(b"\n", 1)[0].split()[1:9]]
+        idle = fields[3] + fields[4]
+        total = sum(fields)
+        return total - idle, total
+
+    def __memory(self):
+        info = {}
+        for line in self.__read("meminfo").splitlines():
+            key, _, value = line.partition(b":")
+            if key in (b"MemTotal", b"MemAvailable"):
+                info[key] = int(value.split()[0])
+        return 1 - info[b"MemAvailable"] / info[b"MemTotal"]
+
+    def __net(self):
+        received = sent = 0
+        for line in self.__read("net/dev").splitlines()[2:]:
+            interface, _, values = line.partition(b":")
+            if interface.strip() == b"lo":
+                continue
+            fields = values.split()
+            received += int(fields[0])
+            sent += int(fields[8])
+        return received, sent
+
+    def __disk(self):
+        read = written = 0
+        for line in self.__read("diskstats").splitlines():
+            fields = line.split()
+            if fields[2] in self.disks:
+                read += int(fields[5])
+                written += int(fields[9])
+        return read * SECTOR_SIZE, written * SECTOR_SIZE
+
+    @staticmethod
+    def __whole_disks():
+        # partitions would count their IO twice, loop and ram devices are no real disks
+        try:
+            names = os.listdir("/sys/block")
+        except OSError:
+            return set()
+        return {name.encode() for name in names if not name.startswith(("loop", "ram", "zram"))}
+
+    def __sample_loop(self):
+        next_at = monotonic()
+        while not self.stop_event.is_set():
+            next_at += self.interval
+            self.stop_event.wait(max(next_at - monotonic(), 0))
+            try:
+                self.sample()
+            except (OSError, ValueError, IndexError, KeyError) as error:
+                print(f"[!] Sampling /proc failed: {error!r}")
+
+
+class MetricGraph(Widget):
+    """
+    A scrolling bar graph of one metric of a ProcCollector, the newest sample on the right.
+
+    For every new sample the bitmap is shifted left and only the new column is drawn. With
+    `max_value` None the graph scales to the largest value shown and is only redrawn completely
+    when that scale changes.
+    """
+
+    def __init__(
+        self, collector, metric, size=(32, 8), color=(90, 255, 90, 255), max_value=None, **kwargs
+    ):
+        kwargs.setdefault("refresh_interval", collector.interval)
+        super().__init__(lambda: collector.samples, **kwargs)
+        assert metric in METRICS, f"Unknown metric {metric!r}, use one of {METRICS}"
+        self.collector = collector
+        self.metric = metric
+        self.size = size
+        self.color = color
+        self.max_value = max_value if max_value is not None else (1 if metric in ("cpu", "memory") else None)
+
+        self.bitmap = Image.new("RGBA", size, (0, 0, 0, 0))
+        self.drawn_samples = 0
+        self.scale = None
+
+    def draw(self, data):
+        width, height = self.size
+        with self.collector.lock:
+            history = self.collector.history[self.metric]
+            new_samples = min(data - self.drawn_samples, len(history), width)
+            values = list(history)[-width:]
+        self.drawn_samples = data
+
+        scale = self.max_value or max(values, default=0) or 1
+        if scale != self.scale:
+            self.scale = scale  # everything has to be drawn at the new scale
+            new_samples = len(values)
+            self.bitmap.paste((0, 0, 0, 0), (0, 0, width, height))
+        elif new_samples < width:
+            self.bitmap.paste(self.bitmap.crop((new_samples, 0, width, height)), (0, 0))
+
+        self.bitmap.paste((0, 0, 0, 0), (width - new_samples, 0, width, height))
+        for x, value in enumerate(values[len(values) - new_samples :], start=width - new_samples):
+            bar_height = round(min(value / scale, 1) * height)
+            if bar_height:
+                self.bitmap.paste(self.color, (x, height - bar_height, x + 1, height))
+        return self.bitmap
+
+
+COLLECTOR: ProcCollector = None
+
+
+def shared_collector():
+    """
+    The collector of the graphs built by `graph_widget`, started on first use.
+    """
+    global COLLECTOR
+    if COLLECTOR is None:
+        COLLECTOR = ProcCollector()
+        COLLECTOR.start()
+    return COLLECTOR
+
+
+def graph_widget(metric="cpu", position=(0, 24), size=(32, 8), color=(90, 255, 90, 255), max_value=None):
+    """
+    The "graph" scene plugin, all graphs share one collector.
+    """
+    assert metric in METRICS, f"Unknown metric {metric!r}, use one of {METRICS}"
+    return MetricGraph(shared_collector(), metric, size, color, max_value, position=position)
@@ -0,0 +1,224 @@
+"""
+Text that fits the display: the font size and line breaks are chosen so the text fills its
+box, longer text can scroll by as a marquee.
+
+Glyphs are rasterized once per font and size into a `GlyphAtlas`, layouts are memoized and a
+marquee only moves a window over a strip rendered once, so changing or scrolling text doesn't
+redraw it with ImageDraw on every frame.
+"""
+from functools import lru_cache
+from math import ceil
+from time import monotonic
+
+from PIL import Image, ImageDraw, ImageFont
+
+from modules.widgets import Widget
+
+MIN_FONT_SIZE = 5
+MAX_FONT_SIZE = 32
+
+
+@lru_cache(maxsize=64)
+def load_font(font_path, size):
+    """
+    A TrueType font at `size` pixels, the font bundled with Pillow if font_path is None.
+    """
+    if font_path is None:
+        return ImageFont.load_default(size)
+    return ImageFont.truetype(font_path, size)
+
+
+class GlyphAtlas:
+    """
+    The glyphs of one font at one size, each rasterized once into a coverage mask.
+    """
+
+    def __init__(self, font_path, size):
+        self.font = load_font(font_path, size)
+        ascent, descent = self.font.getmetrics()
+        self.line_height = ascent + descent
+        self.glyphs = {}  # char: (mask, x offset, advance)
+
+    def glyph(self, char):
+        glyph = self.glyphs.get(char)
+        if glyph is None:
+            left, _, right, _ = self.font.getbbox(char)
+            left = min(left, 0)
+            mask = Image.new("L", (max(right - left, 1), self.line_height))
+            mask.frombytes(self.__raster(char, -left, mask.size))
+            glyph = self.glyphs[char] = (mask, left, self.font.getlength(char))
+        return glyph
+
+    def width(self, text):
+        return ceil(sum(self.glyph(char)[2] for char in text))
+
+    def draw(self, coverage, text, position):
+        """
+        Add text to an L mode coverage image, position is the top left corner of the line.
+        """
+        x, y = position
+        for char in text:
+            mask, left, advance = self.glyph(char)
+            coverage.paste(255, (round(x + left), y), mask)  # full coverage, blended by the mask
+            x += advance
+
+    def __raster(self, char, x, size):
+        image = Image.new("L", size)
+        ImageDraw.Draw(image).text((x, 0), char, font=self.font, fill=255)
+        return image.tobytes()
+
+
+@lru_cache(maxsize=64)
+def atlas_for(font_path, size):
+    return GlyphAtlas(font_path, size)
+
+
+def wrap(atlas, text, width, break_words=False):
+    """
+    Break text into lines no wider than width (greedy, at spaces and newlines).
+    Returns None if a word doesn't fit on a line and break_words is False.
+    """
+    lines = []
+    space = atlas.width(" ")
+    for paragraph in text.split("\n"):
+        line, line_width = [], 0
+        for word in paragraph.split():
+            word_width = atlas.width(word)
+            if line and line_width + space + word_width <= width:
+                line.append(word)
+                line_width += space + word_width
+                continue
+            if line:
+                lines.append(" ".join(line))
+            if word_width > width:
+                if not break_words:
+                    return None
+                while len(word) > 1 and atlas.width(word) > width:
+                    cut = 1
+                    while cut < len(word) and atlas.width(word[: cut + 1]) <= width:
+                        cut += 1
+                    lines.append(word[:cut])
+                    word = word[cut:]
+                word_width = atlas.width(word)
+            line, line_width = [word], word_width
+        lines.append(" ".join(line))
+    return lines
+
+
+@lru_cache(maxsize=256)
+def fit_text(text, width, height, font_path=None, min_size=MIN_FONT_SIZE, max_size=MAX_FONT_SIZE):
+    """
+    Find the largest font size at which text fits into width x height.
+    Returns (font size, lines). Binary search over the sizes, the result is memoized.
+    If not even min_size fits, words are broken and the text is cut at the bottom.
+    """
+    low, high, best = min_size, max_size, None
+    while low <= high:
+        size = (low + high) // 2
+        atlas = atlas_for(font_path, size)
+        lines = wrap(atlas, text, width)
+        if lines is not None and len(lines) * atlas.line_height <= height:
+            best, low = (size, tuple(lines)), size + 1
+        else:
+            high = size - 1
+    if best is None:
+        atlas = atlas_for(font_path, min_size)
+        lines = wrap(atlas, text, width, break_words=True)
+        best = (min_size, tuple(lines[: max(height // atlas.line_height, 1)]))
+    return best
+
+
+def render_text(text, size=(32, 32), color=(255, 255, 255, 255), font_path=None, max_size=MAX_FONT_SIZE):
+    """
+    An RGBA image of `size` showing text as large as possible, centered.
+    """
+    width, height = size
+    font_size, lines = fit_text(text, width, height, font_path, min(MIN_FONT_SIZE, max_size), max_size)
+    atlas = atlas_for(font_path, font_size)
+
+    coverage = Image.new("L", size)
+    top = (height - len(lines) * atlas.line_height) // 2
+    for idx, line in enumerate(lines):
+        left = (width - atlas.width(line)) // 2
+        atlas.draw(coverage, line, (left, top + idx * atlas.line_height))
+
+    image = Image.new("RGBA", size, color)
+    image.putalpha(coverage)
+    return image
+
+
+class Marquee:
+    """
+    A line of text scrolling from right to left through a `width` pixels wide window,
+    `speed` pixels per second.
+
+    The text is rendered once into a strip (repeated, so the window can wrap around), a frame
+    is a crop of that strip.
+    """
+
+    def __init__(
+        self, text, width=32, font_size=8, color=(255, 255, 255, 255), speed=10, gap=8, font_path=None
+    ):
+        atlas = atlas_for(font_path, font_size)
+        self.width = width
+        self.speed = speed
+        self.period = max(atlas.width(text) + gap, 1)  # pixels until the text repeats
+        self.height = atlas.line_height
+        self.started = monotonic()
+
+        coverage = Image.new("L", (self.period + width, self.height))
+        for start in range(0, coverage.width, self.period):
+            atlas.draw(coverage, text, (start, 0))
+        self.strip = Image.new("RGBA", coverage.size, color)
+        self.strip.putalpha(coverage)
+
+    def offset(self, now=None):
+        return int(((now or monotonic()) - self.started) * self.speed) % self.period
+
+    def frame(self, offset=None):
+        offset = self.offset() if offset is None else offset
+        return self.strip.crop((offset, 0, offset + self.width, self.height))
+
+
+class TextBox(Widget):
+    """
+    A widget showing the text of its source as large as fits into `size`.
+    """
+
+    def __init__(self, source, size=(32, 32), color=(255, 255, 255, 255), font_path=None, **kwargs):
+        super().__init__(source, **kwargs)
+        self.size = size
+        self.color = color
+        self.font_path = font_path
+
+    def draw(self, data):
+        return render_text("" if data is None else str(data), self.size, self.color, self.font_path)
+
+
+class MarqueeText(Widget):
+    """
+    A widget scrolling a Marquee, redrawn only when it moved by a whole pixel.
+    """
+
+    def __init__(self, marquee, **kwargs):
+        super().__init__(marquee.offset, **kwargs)
+        self.marquee = marquee
+
+    def draw(self, data):
+        return self.marquee.frame(data)
+
+
+def text_widget(text, position=(0, 0), size=(32, 32), color=(255, 255, 255, 255), font=None):
+    """
+    The "text" scene plugin: a fixed text as large as fits.
+    """
+    return TextBox(lambda: text, size, color, font, position=position, refresh_interval=3600)
+
+
+def marquee_widget(
+    text, position=(0, 24), width=32, font_size=8, color=(255, 255, 255, 255), speed=10, font=None
+):
+    """
+    The "marquee" scene plugin: a fixed text scrolling by.
+    """
+    return MarqueeText(Marquee(text, width, font_size, color, speed, font_path=font), position=position)
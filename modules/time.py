@@ -1,5 +1,8 @@
+from functools import lru_cache
 from PIL import Image, ImageDraw
 
+from modules.widgets import DrawWidget
+
 DEBUG = False
 x_size = 32
 y_size = 32
@@ -10,6 +13,63 @@ bgcolor = (120, 120, 120, 255)
 fgcolor1 = (255, 90, 255, 255)  # red
 fgcolor2 = (90, 255, 90, 255)  # green
 fgcolor3 = (90, 90, 255, 255)  # blue
+ANGLE_STEP = 1  # degrees, a hand moves in steps of this size (0.24 px at the tip of the second hand)
+
+
+@lru_cache(maxsize=16)
+def __draw_static_layers(x_max, y_max, face_color, dot_color, mul=4):
+    """
+    Draw the parts of the clock that never move, once per size and color scheme.
+    Returns the face (drawn below the hands) and the center dot plus frame (drawn above).
+    """
+    middle_point = (x_max / 2 * mul, y_max / 2 * mul)
+    x_middle, y_middle = middle_point
+
+    center_dot = Image.new("RGBA", (x_size * mul, y_size * mul), (255, 255, 255, 0))
+    frame = Image.new("RGBA", (x_size * mul, y_size * mul), (255, 255, 255, 0))
+    face = Image.new("RGBA", (x_size * mul, y_size * mul), (255, 255, 255, 0))
+
+    # center dot
+    center_dot_tl = (x_middle - 1.5 * mul, y_middle - 1.5 * mul)
+    center_dot_br = (x_middle + 1.5 * mul, y_middle + 1.5 * mul)
+    ImageDraw.Draw(center_dot).rounded_rectangle(
+        (*center_dot_tl, *center_dot_br), radius=1.5 * mul, fill=dot_color
+    )
+
+    # frame
+    ImageDraw.Draw(frame).rounded_rectangle(
+        (0, 0, x_max * mul, y_max * mul), outline=face_color, radius=13 * mul, width=1 * mul
+    )
+
+    # face
+    ImageDraw.Draw(face).line(((x_middle, 0), (x_middle, 3.2 * mul)), fill=face_color, width=1 * mul)
+    face.alpha_composite(face.copy().rotate(180, center=middle_point))
+    face.alpha_composite(face.copy().rotate(90, center=middle_point))
+    temp = face.copy()
+    face.alpha_composite(temp.copy().rotate(30, center=middle_point))
+    face.alpha_composite(temp.copy().rotate(-30, center=middle_point))
+
+    below = face.resize((x_size, y_size), Image.LANCZOS)
+    above = Image.alpha_composite(
+        center_dot.resize((x_size, y_size), Image.NEAREST), frame.resize((x_size, y_size), Image.LANCZOS)
+    )
+    return below, above
+
+
+@lru_cache(maxsize=4 * 3 * 360)
+def __draw_hand(x_max, y_max, length_percent, color, width, angle, mul=4):
+    """
+    Draw one hand turned `angle` degrees clockwise, downsampled to the display size.
+    Callers quantize the angle so the sprites can be reused frame after frame.
+    """
+    middle_point = (x_max / 2 * mul, y_max / 2 * mul)
+    x_middle = x_max / 2 * mul
+    top_point = (middle_point[0], x_middle - x_middle * length_percent)
+
+    hand = Image.new("RGBA", (x_size * mul, y_size * mul), (255, 255, 255, 0))
+    ImageDraw.Draw(hand).line((middle_point, top_point), fill=color, width=width * mul)
+    hand = hand.rotate(-angle, center=middle_point)
+    return hand.resize((x_size, y_size), Image.LANCZOS)
 
 
 def __draw_time(x_max=31, y_max=31):
@@ -29,95 +89,33 @@ def __draw_time(x_max=31, y_max=31):
         curSeconds = 30
         curMs = 0
 
-    middle_point = (x_max / 2 * mul, y_max / 2 * mul)
     sec_hand_len_percent = 0.85
     min_hand_len_percent = 0.71
     hour_hand_len_percent = 0.45
 
-    x_middle = x_max / 2 * mul
-    y_middle = y_max / 2 * mul
-    sec_top_point = (middle_point[0],
-                     x_middle - x_middle * sec_hand_len_percent)
-    min_top_point = (middle_point[0],
-                     x_middle - x_middle * min_hand_len_percent)
-    hour_top_point = (middle_point[0],
-                      x_middle - x_middle * hour_hand_len_percent)
-
-    out = Image.new("RGBA", (x_size, y_size), (255, 255, 255, 0))
-    time_sec = Image.new("RGBA", (x_size * mul, y_size * mul),
-                         (255, 255, 255, 0))
-    time_min = Image.new("RGBA", (x_size * mul, y_size * mul),
-                         (255, 255, 255, 0))
-    time_hour = Image.new("RGBA", (x_size * mul, y_size * mul),
-                          (255, 255, 255, 0))
-    center_dot = Image.new("RGBA", (x_size * mul, y_size * mul),
-                           (255, 255, 255, 0))
-    frame = Image.new("RGBA", (x_size * mul, y_size * mul), (255, 255, 255, 0))
-    face = Image.new("RGBA", (x_size * mul, y_size * mul), (255, 255, 255, 0))
+    def quantize(angle):
+        return round(angle / ANGLE_STEP) * ANGLE_STEP % 360
+
+    # the static parts and the hand sprites are cached, a frame only composites them
+    below, above = __draw_static_layers(x_max, y_max, bgcolor, (80, 80, 80, 255), mul)
+    out = below.copy()
 
-    # rotate_angle = curHours*(360/12)
     rotate_angle = curHours * (360 / 12) + curMinutes * (360 / (12 * 60))
-    time_hour = time_hour.rotate(rotate_angle, center=middle_point)
-    ImageDraw.Draw(time_hour).line(
-        (middle_point, hour_top_point),
-        fill=fgcolor3,
-        width=2 * mul,
+    out.alpha_composite(
+        __draw_hand(x_max, y_max, hour_hand_len_percent, fgcolor3, 2, quantize(rotate_angle), mul)
     )  # hour
-    time_hour = time_hour.rotate(-rotate_angle, center=middle_point)
 
-    # rotate_angle = curMinutes*(360/60)
     rotate_angle = curMinutes * (360 / 60) + curSeconds * (360 / (60 * 60))
-    time_min = time_min.rotate(rotate_angle, center=middle_point)
-    ImageDraw.Draw(time_min).line((middle_point, min_top_point),
-                                  fill=fgcolor2,
-                                  width=1 * mul)  # minute
-    time_min = time_min.rotate(-rotate_angle, center=middle_point)
+    out.alpha_composite(
+        __draw_hand(x_max, y_max, min_hand_len_percent, fgcolor2, 1, quantize(rotate_angle), mul)
+    )  # minute
 
-    # rotate_angle = curSeconds*(360/60)
     rotate_angle = curSeconds * (360 / 60) + curMs * (360 / (60 * 1000))
-    time_sec = time_sec.rotate(rotate_angle, center=middle_point)
-    ImageDraw.Draw(time_sec).line((middle_point, sec_top_point),
-                                  fill=fgcolor1,
-                                  width=1 * mul)  # second
-    time_sec = time_sec.rotate(-rotate_angle, center=middle_point)
-
-    # center dot
-    center_dot_tl = (x_middle - 1.5 * mul, y_middle - 1.5 * mul)
-    center_dot_br = (x_middle + 1.5 * mul, y_middle + 1.5 * mul)
-    ImageDraw.Draw(center_dot).rounded_rectangle(
-        (*center_dot_tl, *center_dot_br),
-        radius=1.5 * mul,
-        fill=(80, 80, 80, 255))
-
-    # frame
-    ImageDraw.Draw(frame).rounded_rectangle((0, 0, x_max * mul, y_max * mul),
-                                            outline=bgcolor,
-                                            radius=13 * mul,
-                                            width=1 * mul)
-
-    # face
-    ImageDraw.Draw(face).line(((x_middle, 0), (x_middle, 3.2 * mul)),
-                              fill=bgcolor,
-                              width=1 * mul)
-    face.alpha_composite(face.copy().rotate(180, center=middle_point))
-    face.alpha_composite(face.copy().rotate(90, center=middle_point))
-    temp = face.copy()
-    face.alpha_composite(temp.copy().rotate(30, center=middle_point))
-    face.alpha_composite(temp.copy().rotate(-30, center=middle_point))
+    out.alpha_composite(
+        __draw_hand(x_max, y_max, sec_hand_len_percent, fgcolor1, 1, quantize(rotate_angle), mul)
+    )  # second
 
-    # merge images
-    out = Image.alpha_composite(out,
-                                face.resize((x_size, y_size), Image.LANCZOS))
-    out = Image.alpha_composite(
-        out, time_hour.resize((x_size, y_size), Image.LANCZOS))
-    out = Image.alpha_composite(
-        out, time_min.resize((x_size, y_size), Image.LANCZOS))
-    out = Image.alpha_composite(
-        out, time_sec.resize((x_size, y_size), Image.LANCZOS))
-    out = Image.alpha_composite(
-        out, center_dot.resize((x_size, y_size), Image.NEAREST))
-    out = Image.alpha_composite(out,
-                                frame.resize((x_size, y_size), Image.LANCZOS))
+    out.alpha_composite(above)
 
     if DEBUG:
         __draw_debug_points(out, x_max, y_max)
@@ -159,3 +157,10 @@ def draw_time(x_max=21, y_max=21) -> Image:
     time = __draw_time(x_max, y_max)
     base.alpha_composite(time)
     return base
+
+
+def clock_widget(position=(0, 0)):
+    """
+    The "clock" scene plugin, drawn on every frame.
+    """
+    return DrawWidget(lambda: draw_time(x_max=32, y_max=32), position=position)
@@ -0,0 +1,141 @@
+import socket
+from time import sleep
+
+
+class Transport:
+    """
+    A byte stream to a device. Subclasses create the socket in `open_socket`.
+    """
+
+    SETTLE_TIME = 0  # seconds to wait after connecting before the device accepts data
+
+    def __init__(self):
+        self.sock = None
+        self.connect_timeout = 10  # seconds, None waits forever
+        self.timeout = None  # seconds a send may take, None waits forever
+
+    @property
+    def connected(self):
+        return self.sock is not None
+
+    def open_socket(self):
+        raise NotImplementedError
+
+    def connect(self):
+        self.close()
+        self.sock = self.open_socket()
+        self.sock.settimeout(self.timeout)
+        if self.SETTLE_TIME:
+            sleep(self.SETTLE_TIME)
+
+    def send(self, data):
+        self.sock.sendall(data)
+
+    def close(self):
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+        self.sock = None
+
+
+class RfcommTransport(Transport):
+    """
+    Bluetooth SPP (RFCOMM channel 1), what the real devices speak.
+    """
+
+    SETTLE_TIME = 1  # mandatory to wait at least 1 second
+
+    def __init__(self, mac_address, channel=1):
+        super().__init__()
+        self.mac_address = mac_address
+        self.channel = channel
+
+    def open_socket(self):
+        sock = socket.socket(socket.AF_BLUETOOTH, socket.SOCK_STREAM, socket.BTPROTO_RFCOMM)
+        sock.settimeout(self.connect_timeout)
+        try:
+            sock.connect((self.mac_address, self.channel))
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+
+class TcpTransport(Transport):
+    """
+    TCP connection, e.g. to the fake device in `modules.fake_device`.
+    """
+
+    def __init__(self, host, port):
+        super().__init__()
+        self.host = host
+        self.port = port
+
+    def open_socket(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.connect_timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock
+
+
+class UnixTransport(Transport):
+    """
+    Unix domain socket connection.
+    """
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+
+    def open_socket(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.connect_timeout)
+        try:
+            sock.connect(self.path)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+
+class RecorderTransport(Transport):
+    """
+    Keep everything sent in memory instead of talking to a device.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.sent = []
+        self.bytes_sent = 0
+
+    def open_socket(self):
+        return self  # there is no socket, the transport records what is sent itself
+
+    def connect(self):
+        self.sock = self.open_socket()
+
+    def send(self, data):
+        self.sent.append(bytes(data))
+        self.bytes_sent += len(data)
+
+    def close(self):
+        self.sock = None
+
+
+def transport_for(address):
+    """
+    Create a transport from an address:
+    "tcp://host:port", "unix:///path/to/socket", "record://" or a Bluetooth mac address.
+    """
+    scheme, sep, rest = address.partition("://")
+    if not sep:
+        return RfcommTransport(address)
+    if scheme == "tcp":
+        host, _, port = rest.rpartition(":")
+        return TcpTransport(host, int(port))
+    if scheme == "unix":
+        return UnixTransport(rest)
+    if scheme == "record":
+        return RecorderTransport()
+    raise ValueError(f"Unknown transport {scheme!r} in {address!r}")
@@ -0,0 +1,298 @@
+import heapq
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from threading import Event, Lock, Thread
+from time import monotonic
+
+from PIL import Image, ImageDraw, ImageOps
+
+POOL_RENDER_COST = 1  # widgets at least this costly render their layer on the worker pool
+
+
+class Widget:
+    """
+    A layer of the scene fed by a data source.
+
+    `source()` fetches the data, every `refresh_interval` seconds on the worker pool of the
+    scene, or on every frame if the interval is 0. The layer is only drawn again (by `draw`)
+    when the data changed. Widgets with a `render_cost` of at least POOL_RENDER_COST draw their
+    layer on the worker pool too, cheaper ones while the frame is composited.
+    """
+
+    def __init__(self, source=None, position=(0, 0), refresh_interval=0, render_cost=0):
+        self.source = source
+        self.position = position
+        self.refresh_interval = refresh_interval
+        self.render_cost = render_cost
+
+        self.lock = Lock()
+        self.data = None
+        self.version = 0  # bumped whenever the data changes
+        self.error = None
+        self.layer = None
+        self.layer_version = -1
+        self.updates = 0
+        self.renders = 0
+
+    @property
+    def live(self):
+        return not self.refresh_interval
+
+    def fetch(self):
+        return self.source() if self.source is not None else None
+
+    def draw(self, data):
+        """
+        Return the layer (an RGBA image) showing data.
+        """
+        raise NotImplementedError
+
+    def update(self):
+        """
+        Fetch new data, returns True if it changed.
+        """
+        try:
+            data, error = self.fetch(), None
+        except Exception as exception:  # pylint: disable=broad-except
+            data, error = self.data, exception
+
+        with self.lock:
+            self.updates += 1
+            # exceptions don't compare equal, the same failure again is no change though
+            changed = data != self.data or repr(error) != repr(self.error) or self.version == 0
+            if changed:
+                if error is not None:
+                    print(f"[!] {type(self).__name__}: {error!r}")
+                self.data, self.error = data, error
+                self.version += 1
+        if changed and self.render_cost >= POOL_RENDER_COST and not self.live:
+            self.render()
+        return changed
+
+    def render(self):
+        """
+        Return the layer for the current data, drawing it only if the data changed since.
+        """
+        with self.lock:
+            data, version = self.data, self.version
+            if version == self.layer_version:
+                return self.layer
+        layer = self.draw(data)
+        with self.lock:
+            if version >= self.layer_version:
+                self.layer, self.layer_version = layer, version
+                self.renders += 1
+        return layer
+
+
+class DrawWidget(Widget):
+    """
+    A layer drawn by `draw_layer()`, on every frame unless a `source` tells when it changes.
+    """
+
+    def __init__(self, draw_layer, source=None, **kwargs):
+        super().__init__(source, **kwargs)
+        self.draw_layer = draw_layer
+
+    def fetch(self):
+        return super().fetch() if self.source is not None else self.updates  # always changed
+
+    def draw(self, data):
+        return self.draw_layer()
+
+
+class PixelIndicator(Widget):
+    """
+    A single pixel, the color is the data of the source or `color_for(data)`.
+    Failing sources show `error_color`.
+    """
+
+    def __init__(self, source, color_for=None, error_color=(255, 255, 0, 255), **kwargs):
+        super().__init__(source, **kwargs)
+        self.color_for = color_for
+        self.error_color = error_color
+
+    def draw(self, data):
+        if self.error is not None or data is None:
+            color = self.error_color
+        else:
+            color = self.color_for(data) if self.color_for else data
+        return Image.new("RGBA", (1, 1), color)
+
+
+class Sparkline(Widget):
+    """
+    A line through the latest values of the source (a sequence of numbers), scaled to `size`.
+    `max_value` None scales to the largest value shown.
+    """
+
+    def __init__(self, source, size=(32, 8), color=(90, 255, 90, 255), max_value=None, **kwargs):
+        super().__init__(source, **kwargs)
+        self.size = size
+        self.color = color
+        self.max_value = max_value
+
+    def draw(self, data):
+        width, height = self.size
+        layer = Image.new("RGBA", self.size, (0, 0, 0, 0))
+        values = list(data or ())[-width:]
+        if not values:
+            return layer
+
+        top = self.max_value or max(values) or 1
+        offset = width - len(values)  # the newest value is on the right
+        points = [
+            (offset + x, height - 1 - round(min(max(value / top, 0), 1) * (height - 1)))
+            for x, value in enumerate(values)
+        ]
+        if len(points) > 1:
+            ImageDraw.Draw(layer).line(points, fill=self.color)
+        else:
+            layer.putpixel(points[0], self.color)
+        return layer
+
+
+class BarGraph(Widget):
+    """
+    Vertical bars for the values of the source (a sequence of fractions between 0 and 1).
+    """
+
+    def __init__(self, source, size=(32, 8), colors=((90, 90, 255, 255),), bar_width=1, gap=1, **kwargs):
+        super().__init__(source, **kwargs)
+        self.size = size
+        self.colors = colors
+        self.bar_width = bar_width
+        self.gap = gap
+
+    def draw(self, data):
+        width, height = self.size
+        layer = Image.new("RGBA", self.size, (0, 0, 0, 0))
+        draw = ImageDraw.Draw(layer)
+        for idx, value in enumerate(data or ()):
+            x = idx * (self.bar_width + self.gap)
+            bar_height = round(min(max(value, 0), 1) * height)
+            if x >= width:
+                break
+            if bar_height:
+                color = self.colors[idx % len(self.colors)]
+                draw.rectangle((x, height - bar_height, x + self.bar_width - 1, height - 1), fill=color)
+        return layer
+
+
+class TextWidget(Widget):
+    """
+    The text returned by the source, drawn with the default font.
+    """
+
+    def __init__(self, source, size=(32, 8), color=(255, 255, 255, 255), font=None, **kwargs):
+        super().__init__(source, **kwargs)
+        self.size = size
+        self.color = color
+        self.font = font
+
+    def draw(self, data):
+        layer = Image.new("RGBA", self.size, (0, 0, 0, 0))
+        text = "" if data is None else str(data)
+        ImageDraw.Draw(layer).text((0, 0), text, fill=self.color, font=self.font)
+        return layer
+
+
+class ImageWidget(Widget):
+    """
+    A picture from the source (the contents of a PNG, JPEG, ... file), cropped to fill `size`.
+    Data that isn't a picture shows nothing.
+    """
+
+    def __init__(self, source, size=(32, 32), **kwargs):
+        super().__init__(source, **kwargs)
+        self.size = size
+
+    def draw(self, data):
+        if data:
+            try:
+                with Image.open(BytesIO(data)) as img:
+                    return ImageOps.fit(img.convert("RGBA"), self.size, Image.LANCZOS)
+            except OSError as error:
+                print(f"[!] {type(self).__name__}: {error}")
+        return Image.new("RGBA", self.size, (0, 0, 0, 0))
+
+
+class WidgetScene:
+    """
+    Composite the layers of some widgets (bottom first) into frames.
+
+    Data sources are refreshed by a scheduler thread on a shared worker pool, each widget at
+    its own interval, and a layer is only redrawn when its data changed - the clock ticking
+    doesn't redraw the indicators. Live widgets (interval 0) are refreshed on every frame.
+    `on_change()` is called when the data of a scheduled widget changed, e.g. to request a frame.
+    """
+
+    def __init__(self, widgets, size=(32, 32), background=(0, 0, 0, 255), workers=2, on_change=None):
+        self.widgets = list(widgets)
+        self.size = size
+        self.background = Image.new("RGBA", size, background)
+        self.workers = workers
+        self.on_change = on_change
+
+        self.stop_event = Event()
+        self.pool = None
+        self.thread = None
+        self.pending = {}  # widget index: future of its running update
+
+    def start(self):
+        self.stop_event.clear()
+        self.pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="widget")
+        self.thread = Thread(target=self.__schedule_loop, name="widget-scheduler", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=2)
+            self.thread = None
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+
+    def render(self):
+        """
+        Return the current frame.
+        """
+        frame = self.background.copy()
+        for widget in self.widgets:
+            if widget.live:
+                widget.update()
+            elif widget.version == 0:
+                continue  # no data yet
+            frame.alpha_composite(widget.render(), dest=widget.position)
+        return frame
+
+    def stats(self):
+        return {
+            f"{idx}:{type(widget).__name__}": {"updates": widget.updates, "renders": widget.renders}
+            for idx, widget in enumerate(self.widgets)
+        }
+
+    def __schedule_loop(self):
+        due = [(monotonic(), idx) for idx, widget in enumerate(self.widgets) if not widget.live]
+        heapq.heapify(due)
+        while due and not self.stop_event.is_set():
+            next_at, idx = due[0]
+            delay = next_at - monotonic()
+            if delay > 0:
+                self.stop_event.wait(delay)
+                continue
+
+            heapq.heappop(due)
+            widget = self.widgets[idx]
+            running = self.pending.get(idx)
+            if running is None or running.done():  # a slow source doesn't pile up updates
+                self.pending[idx] = self.pool.submit(self.__update, widget)
+            next_at += widget.refresh_interval
+            if next_at < monotonic():
+                next_at = monotonic() + widget.refresh_interval  # fell behind, don't catch up in a burst
+            heapq.heappush(due, (next_at, idx))
+
+    def __update(self, widget):
+        if widget.update() and self.on_change is not None:
+            self.on_change()
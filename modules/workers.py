@@ -0,0 +1,331 @@
+"""
+Render and encode frames in worker processes, so they run on all cores instead of one.
+
+The worker processes write every frame (raw RGB pixels and the encoded payloads) into a slot of
+a `FrameRing` in shared memory, only slot numbers and sequence numbers travel through queues.
+The main process keeps the device connections: it puts the frames back in order and sends them.
+
+    ProcessPipeline("pixoo:build_scene", manager, fps=10, workers=3).run()
+
+The scene is given as "module:function" and built in every worker, so widget data sources
+(e.g. the GitHub poller) run once per worker. Frames are kept at the size of the largest device
+type and every encoder scales them to its own device. A worker only encodes a frame if it
+differs from the one every device shows already.
+"""
+import importlib
+import heapq
+import multiprocessing
+import struct
+from multiprocessing import shared_memory
+from queue import Empty, Full
+from threading import Event, Thread
+from time import monotonic
+
+from PIL import Image
+
+from modules.pipeline import StageStats
+from modules.pixoo_client import frame_fingerprint
+
+SLOT_HEADER = struct.Struct("<QI")  # sequence number, number of payloads
+LENGTH = struct.Struct("<I")
+MAX_PAYLOAD_SIZE = 4096  # a 32x32 picture with 256 colors takes ~1.8 KiB
+UNCHANGED = -1  # reported instead of a slot for a frame every device shows already
+NO_FINGERPRINT = bytes(16)
+
+
+class FrameRing:
+    """
+    `slots` fixed size slots in shared memory, each holding a sequence number, a size x size
+    RGB frame and up to `payloads` encoded payloads.
+    """
+
+    def __init__(self, slots, size=32, payloads=1, name=None):
+        self.slots = slots
+        self.size = size
+        self.payloads = payloads
+        self.rgb_size = size * size * 3
+        self.slot_size = SLOT_HEADER.size + self.rgb_size + payloads * (LENGTH.size + MAX_PAYLOAD_SIZE)
+
+        if name is None:
+            self.memory = shared_memory.SharedMemory(create=True, size=slots * self.slot_size)
+            self.owner = True
+        else:
+            # workers share the resource tracker of the process that created the ring, which
+            # removes it when it closes the ring
+            self.memory = shared_memory.SharedMemory(name=name)
+            self.owner = False
+
+    @property
+    def name(self):
+        return self.memory.name
+
+    def write(self, slot, sequence, rgb, payloads):
+        offset = slot * self.slot_size
+        buffer = self.memory.buf
+        SLOT_HEADER.pack_into(buffer, offset, sequence, len(payloads))
+        offset += SLOT_HEADER.size
+        buffer[offset : offset + self.rgb_size] = rgb
+        offset += self.rgb_size
+        for payload in payloads:
+            if len(payload) > MAX_PAYLOAD_SIZE:
+                raise ValueError(f"Payload of {len(payload)} bytes doesn't fit a slot")
+            LENGTH.pack_into(buffer, offset, len(payload))
+            buffer[offset + LENGTH.size : offset + LENGTH.size + len(payload)] = payload
+            offset += LENGTH.size + MAX_PAYLOAD_SIZE
+
+    def read(self, slot):
+        """
+        Return (sequence, rgb, payloads) of a slot, copied out of the shared memory.
+        """
+        offset = slot * self.slot_size
+        buffer = self.memory.buf
+        sequence, count = SLOT_HEADER.unpack_from(buffer, offset)
+        offset += SLOT_HEADER.size
+        rgb = bytes(buffer[offset : offset + self.rgb_size])
+        offset += self.rgb_size
+        payloads = []
+        for _ in range(count):
+            (length,) = LENGTH.unpack_from(buffer, offset)
+            payloads.append(bytes(buffer[offset + LENGTH.size : offset + LENGTH.size + length]))
+            offset += LENGTH.size + MAX_PAYLOAD_SIZE
+        return sequence, rgb, payloads
+
+    def close(self):
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+
+def load_renderer(path):
+    """
+    Build the renderer named "module:function": the function returns a render function or an
+    object with a render method (started first if it has a start method, like a WidgetScene).
+    """
+    module_name, _, function_name = path.partition(":")
+    renderer = getattr(importlib.import_module(module_name), function_name)()
+    if hasattr(renderer, "start"):
+        renderer.start()
+    return getattr(renderer, "render", renderer)
+
+
+def worker_main(renderer_path, device_classes, ring_name, slots, tasks, free_slots, ready, shown):
+    """
+    Worker process: render and encode a frame for every task (a sequence number and when it
+    was requested). Frames that fail are reported without a slot, so the order can move on, and
+    frames with the fingerprint in `shown` (what every device shows) as UNCHANGED, unencoded.
+    """
+    encoders = [device_class("record://") for device_class in device_classes]
+    ring = FrameRing(slots, max(encoder.SIZE for encoder in encoders), len(encoders), name=ring_name)
+    render = load_renderer(renderer_path)
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                return
+            sequence, requested_at = task
+            try:
+                frame = render().convert("RGB")
+                if frame.size != (ring.size, ring.size):
+                    frame = frame.resize((ring.size, ring.size))
+                fingerprint = frame_fingerprint(frame)
+                with shown.get_lock():
+                    unchanged = shown.raw == fingerprint
+                if unchanged:
+                    ready.put((sequence, UNCHANGED, requested_at))
+                    continue
+                payloads = [encoder.encode_pic(frame, fingerprint) for encoder in encoders]
+            except Exception as error:  # pylint: disable=broad-except
+                print(f"[!] Frame {sequence} failed: {error!r}")
+                ready.put((sequence, None, requested_at))
+                continue
+
+            slot = free_slots.get()
+            ring.write(slot, sequence, frame.tobytes(), payloads)
+            ready.put((sequence, slot, requested_at))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        ring.close()
+
+
+class ProcessPipeline:
+    """
+    Like FramePipeline, but frames are rendered and encoded by `workers` processes.
+
+    Tasks are handed out at `fps`, so frames are rendered in parallel but sent in the order
+    they were requested. A frame that arrives after a later frame was sent is dropped. Every
+    device type of the DeviceManager gets its own payload, encoded once per frame.
+    """
+
+    def __init__(self, renderer_path, manager, fps=10, workers=3, slots=None, report_interval=10):
+        self.renderer_path = renderer_path
+        self.manager = manager
+        self.fps = fps
+        self.workers = workers
+        self.report_interval = report_interval
+
+        self.device_classes = list(dict.fromkeys(type(device) for device in manager.devices))
+        self.slots = slots or workers * 2 + 2
+        size = max(device_class.SIZE for device_class in self.device_classes)
+        self.ring = FrameRing(self.slots, size, len(self.device_classes))
+
+        context = multiprocessing.get_context("spawn")  # the parent already runs threads
+        self.tasks = context.Queue(maxsize=workers)
+        self.free_slots = context.Queue()
+        self.ready = context.Queue()
+        self.shown = context.Array("c", NO_FINGERPRINT)  # fingerprint of the frame all devices show
+        self.last_fingerprint = None
+        for slot in range(self.slots):
+            self.free_slots.put(slot)
+        self.processes = [
+            context.Process(
+                target=worker_main,
+                args=(
+                    renderer_path,
+                    self.device_classes,
+                    self.ring.name,
+                    self.slots,
+                    self.tasks,
+                    self.free_slots,
+                    self.ready,
+                    self.shown,
+                ),
+                name=f"frame-worker-{idx}",
+                daemon=True,
+            )
+            for idx in range(workers)
+        ]
+
+        self.stop_event = Event()
+        self.threads = []
+        self.latency = StageStats()
+        self.requested = 0
+        self.sent = 0
+        self.skipped = 0
+        self.dropped = 0
+        self.last_report = monotonic()
+
+    def start(self):
+        self.last_report = monotonic()
+        for process in self.processes:
+            process.start()
+        self.threads = [
+            Thread(target=self.__request_loop, name="workers-request", daemon=True),
+            Thread(target=self.__collect_loop, name="workers-collect", daemon=True),
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        for thread in self.threads:
+            thread.join(timeout=2)
+        for _ in self.processes:
+            self.tasks.put(None)
+        for process in self.processes:
+            process.join(timeout=2)
+            if process.is_alive():
+                process.terminate()
+        self.ring.close()
+
+    def run(self):
+        """
+        Run until interrupted, printing a report every `report_interval` seconds.
+        """
+        self.start()
+        try:
+            while not self.stop_event.wait(self.report_interval):
+                print(self.report())
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def report(self):
+        """
+        Summarize the frames sent since the last report.
+        """
+        now = monotonic()
+        interval = max(now - self.last_report, 1e-9)
+        self.last_report = now
+        count, mean, peak = self.latency.take()
+        return (
+            f"Workers: {count / interval:.1f} fps sent, {self.skipped} unchanged, "
+            f"{self.dropped} dropped - ms mean/max from request to send: {mean * 1000:.1f}/{peak * 1000:.1f}"
+        )
+
+    def __request_loop(self):
+        period = 1.0 / self.fps
+        deadline = monotonic()
+        while not self.stop_event.is_set():
+            try:
+                self.tasks.put((self.requested, monotonic()), timeout=period)
+                self.requested += 1
+            except Full:
+                self.dropped += 1  # all workers are busy, skip this frame
+
+            deadline += period
+            delay = deadline - monotonic()
+            if delay < -period:
+                deadline = monotonic()
+            elif delay > 0:
+                self.stop_event.wait(delay)
+
+    def __collect_loop(self):
+        pending = []  # heap of (sequence, requested at, frame) that arrived before an earlier frame
+        next_sequence = 0
+        while not self.stop_event.is_set():
+            try:
+                sequence, slot, requested_at = self.ready.get(timeout=0.1)
+            except Empty:
+                continue
+            frame = None
+            if slot == UNCHANGED:
+                self.skipped += 1
+                self.__publish_shown()  # a device that reconnected needs the frame again
+            elif slot is not None:
+                frame = self.ring.read(slot)[1:]
+                self.free_slots.put(slot)
+
+            if sequence < next_sequence:
+                self.dropped += 1  # a later frame was sent already
+                continue
+            heapq.heappush(pending, (sequence, requested_at, frame))
+            # a frame another worker is still rendering is waited for, but only for so many frames
+            while pending and (pending[0][0] == next_sequence or len(pending) >= self.slots):
+                sequence, requested_at, frame = heapq.heappop(pending)
+                self.dropped += sequence - next_sequence
+                next_sequence = sequence + 1
+                if frame is not None:
+                    self.__send(requested_at, *frame)
+
+    def __send(self, requested_at, rgb, payloads):
+        img = Image.frombytes("RGB", (self.ring.size, self.ring.size), rgb)
+        fingerprint = frame_fingerprint(img)
+        payload_for = dict(zip(self.device_classes, payloads))
+        sent = False
+        for device in self.manager.devices:
+            if not device.connected or device.is_unchanged(img, fingerprint):
+                continue
+            device.remember_frame(img, fingerprint)
+            device.send_pic(payload_for[type(device)])
+            sent = True
+
+        if sent:
+            self.sent += 1
+            self.latency.record(monotonic() - requested_at)
+        else:
+            self.skipped += 1
+        self.last_fingerprint = fingerprint
+        self.__publish_shown()
+
+    def __publish_shown(self):
+        devices = self.manager.devices
+        shows_it = all(
+            device.connected and device.skip_unchanged and device.last_fingerprint == self.last_fingerprint
+            for device in devices
+        )
+        value = self.last_fingerprint if shows_it and self.last_fingerprint else NO_FINGERPRINT
+        with self.shown.get_lock():
+            if self.shown.raw != value:
+                self.shown.raw = value
@@ -1,33 +1,129 @@
 from os import getenv
-from time import sleep
-from PIL import Image
+
 from dotenv import load_dotenv
 
-from modules.time import draw_time
-from modules.github import draw_github_contribution
-import modules.pixoo_client as pixc
+from modules.startup import FirstFrame, StartupTimer  # the first module, the cold start is timed from here on
+from modules.devices import DeviceManager, parse_devices
+from modules.frame_cache import FrameCache
+from modules.plugins import build_widgets, validate_scene
+from modules.widgets import WidgetScene
+from modules.pipeline import FramePipeline
+from modules.scheduler import Schedule, Scheduler, parse_schedule
 
 load_dotenv("local.env", verbose=True)
 
+# Here you can change what is shown (or set SCENE in local.env), the widgets are drawn bottom first.
+# The clock is drawn on every frame, the github contribution pixel only when its color changes.
+# See modules/plugins.py for all plugins and their options.
+DEFAULT_SCENE = "clock; github user=HoroTW required=1 position=31,0"
+
+
+def scene_setting(name="default"):
+    """
+    The scene `name` (of a schedule): SCENE for "default", SCENE_<NAME> (e.g. SCENE_NIGHT) for others.
+    """
+    if name == "default":
+        return getenv("SCENE") or DEFAULT_SCENE
+    text = getenv(f"SCENE_{name.upper()}")
+    assert text, f"The schedule shows the scene {name!r}, set SCENE_{name.upper()} in local.env"
+    return text
+
+
+def build_scene(name="default"):
+    """
+    Build a scene, only the modules of the plugins it uses are imported.
+    """
+    return WidgetScene(build_widgets(scene_setting(name)))
+
+
+def scene_names(schedule):
+    """
+    The default scene and the scenes of the `schedule` rules, all validated before anything is loaded.
+    """
+    found = list(dict.fromkeys(["default", *(rule.scene for rule in schedule if rule.scene)]))
+    for name in found:
+        validate_scene(scene_setting(name))
+    return found
+
+
+def frame_cache_setting():
+    """
+    The FrameCache of FRAME_CACHE_SIZE MiB (default 8) kept in FRAME_CACHE_DIR, None if neither is set.
+    """
+    directory = getenv("FRAME_CACHE_DIR")
+    size = float(getenv("FRAME_CACHE_SIZE") or 0)
+    if not directory and not size:
+        return None
+    return FrameCache(int((size or 8) * 1024 * 1024), directory=directory)
+
+
+def serve_metrics(device_manager, port):
+    """
+    Serve /metrics and /profile?seconds=N on `port`, timers cost nothing unless enabled.
+    """
+    from modules import metrics  # pylint: disable=import-outside-toplevel
+
+    metrics.enable()
+    for stat in ("bytes_sent", "reconnects", "seconds_disconnected"):
+        metrics.REGISTRY.gauge(
+            f"link_{stat}",
+            lambda stat=stat: {address: link[stat] for address, link in device_manager.health().items()},
+        )
+    metrics.serve_metrics(port)
+    metrics.start_log_summary(60)
+
+
 if __name__ == "__main__":
-    bt_mac_addr = getenv("BT_MAC_ADDR")
-    tmp_folder = getenv("TEMP_FOLDER")
-    assert bt_mac_addr is not None, "Did you copy the example.env to local.env?"
-    assert tmp_folder is not None, "Did you copy the example.env to local.env?"
-
-    print(bt_mac_addr)
-    pixoo = pixc.PixooMax(bt_mac_addr)
-    pixoo.connect()
-
-    while True:  # Main loop - here you can change the drawing functions
-        base = Image.new("RGBA", (32, 32), (0, 0, 0, 0))  # Create a base new image
-        time_img = draw_time(x_max=32, y_max=32)  # Draw the clock
-        base.alpha_composite(time_img)  # Add the clock to the base image
-
-        # this draws the github contribution pixel on top of the base image
-        draw_github_contribution(base, "HoroTW", required_contributions=1)
-
-        # workaround for final displaying
-        base.save(tmp_folder + "tmp.png")
-        pixoo.draw_pic(tmp_folder + "tmp.png")
-        sleep(1.0 / 10)  # 10 fps are already pretty smooth
+    timer = StartupTimer()
+    devices = getenv("DEVICES")
+    assert devices is not None, "Did you copy the example.env to local.env?"
+    fps = float(getenv("FPS", "10"))  # 10 fps are already pretty smooth
+    tick = float(getenv("TICK") or 0) or None  # render only on changes and every tick seconds
+    rules = parse_schedule(getenv("SCHEDULE") or "")
+    names = scene_names(rules)  # fail on config errors before loading anything
+    timer.mark("imports")
+
+    # every device connects on its own
+    manager = DeviceManager(parse_devices(devices), frame_cache=frame_cache_setting())
+    manager.start()
+    first_frame = FirstFrame(getenv("CACHE_DIR") or ".cache")
+    if first_frame.show(manager):  # the last frame of the previous run, while the scene loads
+        timer.mark("cached frame queued")
+
+    workers = int(getenv("WORKERS") or 0)
+    scenes = {}
+    if not workers:
+        scenes = {scene_name: build_scene(scene_name) for scene_name in names}
+        for scene in scenes.values():
+            scene.start()  # refreshes the data of the widgets in the background
+        timer.mark("scene built")
+
+    metrics_port = getenv("METRICS_PORT")
+    if metrics_port:  # only the modules imported by now are timed
+        serve_metrics(manager, int(metrics_port))
+
+    if workers:  # render and encode in worker processes, each builds its own scene
+        from modules.workers import ProcessPipeline  # pylint: disable=import-outside-toplevel
+
+        assert not getenv("SCHEDULE"), "SCHEDULE is not supported with WORKERS yet"
+        assert not getenv("MQTT_HOST"), "MQTT is not supported with WORKERS yet"
+        ProcessPipeline("pixoo:build_scene", manager, fps=fps, workers=workers).run()
+        raise SystemExit
+
+    # render, encode and send run in their own threads, stale frames get dropped
+    send = first_frame.recording(manager, manager.send, timer)  # keeps the frame for the next start
+    pipeline = FramePipeline(scenes["default"].render, manager.encode, send, fps=fps, tick=tick)
+    for scene in scenes.values():
+        scene.on_change = pipeline.request_frame  # e.g. the github pixel changed
+
+    if getenv("MQTT_HOST"):  # push updates, device state and Home Assistant (needs paho-mqtt)
+        from modules.mqtt import shared_bridge  # pylint: disable=import-outside-toplevel
+
+        bridge = shared_bridge()
+        bridge.listeners.append(pipeline.request_frame)
+        bridge.attach(manager, pipeline)
+
+    if rules:  # switches scenes, brightness and fps by the time of day, pauses at night
+        renders = {scene_name: scene.render for scene_name, scene in scenes.items()}
+        Scheduler(Schedule(rules), renders, pipeline, manager, services=scenes.values()).start()
+    pipeline.run()
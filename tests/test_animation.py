@@ -0,0 +1,101 @@
+"""
+Animation uploads (0x49 chunks) decoded again: python -m unittest discover tests
+"""
+import tempfile
+import unittest
+from io import BytesIO
+from pathlib import Path
+
+from PIL import Image, ImageDraw
+
+from modules.container import upload_chunks
+from modules.fake_device import SppFrameParser
+from modules.pixoo_client import Pixoo, PixooMax
+
+
+def animated_gif(transparent, nb_frames=4, size=32):
+    """
+    A Gif with moving shapes, with `transparent` on a transparent background (its palette then
+    has entries only differing in alpha).
+    """
+    frames = []
+    for n in range(nb_frames):
+        img = Image.new("RGBA", (size, size), (0, 0, 0, 0) if transparent else (0, 0, 0, 255))
+        draw = ImageDraw.Draw(img)
+        draw.rectangle((n * 4, 4, n * 4 + 10, 20), fill=(0, 0, 0, 255))
+        draw.ellipse((10, n * 3, size - 2, 20 + n), fill=(200, 30, 60, 255))
+        frames.append(img)
+    buffer = BytesIO()
+    options = {"transparency": 0, "disposal": 2} if transparent else {}
+    frames[0].save(buffer, format="GIF", save_all=True, append_images=frames[1:], duration=80, **options)
+    buffer.seek(0)
+    return buffer
+
+
+def decode_upload(frames, header_size):
+    """
+    Check the 0x49 chunks of one upload, return the (size, number of colors) of every frame in it.
+    """
+    chunks = [args for cmd, args in SppFrameParser().feed(b"".join(frames)) if cmd == 0x49]
+    declared = {args[0] | (args[1] << 8) for args in chunks}
+    data = b"".join(args[3:] for args in chunks)
+    assert declared == {len(data)}, f"Declared {sorted(declared)} bytes, sent {len(data)}"
+    assert [args[2] for args in chunks] == [idx & 0xFF for idx in range(len(chunks))], "Chunks out of order"
+
+    decoded, offset = [], 0
+    while offset < len(data):
+        assert data[offset] == 0xAA, f"No frame starts at {offset}"
+        frame_size = data[offset + 1] | (data[offset + 2] << 8)
+        nb_colors = data[offset + 6] | (data[offset + 7] << 8 if header_size == 8 else 0)
+        decoded.append((frame_size, nb_colors))
+        offset += frame_size
+    assert offset == len(data), "The last frame is truncated"
+    return decoded
+
+
+class AnimationUploadTest(unittest.TestCase):
+    def sent_by(self, device_class, draw):
+        device = device_class("record://")
+        device.connect()
+        draw(device)
+        return device.transport.sent
+
+    def test_declared_size_matches_the_bytes_sent(self):
+        for transparent in (True, False):
+            with self.subTest(transparent=transparent):
+                sent = self.sent_by(PixooMax, lambda device, t=transparent: device.draw_gif(animated_gif(t)))
+                frames = decode_upload(sent, header_size=8)
+                self.assertEqual(len(frames), 4)
+                # the transparent background is black, like the shapes: the colors are merged
+                self.assertTrue(all(nb_colors == 2 for _, nb_colors in frames), frames)
+
+    def test_pixoo_gif(self):
+        sent = self.sent_by(Pixoo, lambda device: device.draw_gif(animated_gif(True, size=16)))
+        self.assertEqual(len(decode_upload(sent, header_size=7)), 4)
+
+    def test_anim_from_files(self):
+        with tempfile.TemporaryDirectory() as directory:
+            paths = []
+            for n, transparent in enumerate((True, False, True)):
+                path = Path(directory) / f"{n}.png"
+                Image.open(animated_gif(transparent)).convert(mode="RGBA").save(path)
+                paths.append(path)
+            sent = self.sent_by(PixooMax, lambda device: device.draw_anim(paths, 50))
+        self.assertEqual(len(decode_upload(sent, header_size=8)), 3)
+
+    def test_compiled_upload_chunks(self):
+        frames = [(img.convert(mode="RGBA"), 80) for img in self.gif_frames(animated_gif(True))]
+        for device_class, header_size in ((PixooMax, 8), (Pixoo, 7)):
+            chunks = upload_chunks(device_class("record://"), frames)
+            self.assertEqual(len(decode_upload(chunks, header_size)), 4)
+
+    @staticmethod
+    def gif_frames(gif):
+        img = Image.open(gif)
+        for n in range(img.n_frames):
+            img.seek(n)
+            yield img.copy()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+"""
+Compiled frame containers read back and played: python -m unittest discover tests
+"""
+import random
+import tempfile
+import unittest
+from pathlib import Path
+
+from PIL import Image, ImageDraw
+
+from modules.container import FrameContainer, compile_frames, load_frames, play, upload_chunks
+from modules.pixoo_client import Pixoo, PixooMax
+
+
+def moving_frames(nb_frames=5, size=32):
+    """
+    (RGBA image, duration) pairs of a square moving over a gradient.
+    """
+    frames = []
+    for n in range(nb_frames):
+        img = Image.linear_gradient("L").resize((size, size)).convert(mode="RGBA")
+        ImageDraw.Draw(img).rectangle((n, n, n + 6, n + 6), fill=(255, 40, 40, 255))
+        frames.append((img, 50 + n * 10))
+    return frames
+
+
+def noise_frames(nb_frames, size=32):
+    """
+    The same frame of random pixels, too many colors to compress.
+    """
+    img = Image.frombytes("RGB", (size, size), random.Random(nb_frames).randbytes(size * size * 3))
+    return [(img.convert("RGBA"), 100)] * nb_frames
+
+
+class FrameContainerTest(unittest.TestCase):
+    def setUp(self):
+        temporary = tempfile.TemporaryDirectory()
+        self.addCleanup(temporary.cleanup)
+        self.directory = Path(temporary.name)
+
+    def compiled(self, frames, device_class=PixooMax):
+        path = self.directory / "animation.pxf"
+        counts = compile_frames(frames, path, device_class)
+        self.assertEqual(counts[2], path.stat().st_size)
+        container = FrameContainer(path)
+        self.addCleanup(container.close)
+        return container
+
+    def test_round_trip(self):
+        for device_class in (PixooMax, Pixoo):
+            with self.subTest(device=device_class.__name__):
+                frames = moving_frames(size=device_class.SIZE)
+                container = self.compiled(frames, device_class)
+                device = device_class("record://")
+                self.assertEqual(container.size, device_class.SIZE)
+                self.assertEqual(
+                    [(bytes(frame), duration) for frame, duration in container.frames],
+                    [(device.build_pic(img), duration) for img, duration in frames],
+                )
+                self.assertEqual(container.duration, sum(duration for _, duration in frames))
+                self.assertEqual([bytes(chunk) for chunk in container.chunks], upload_chunks(device, frames))
+                container.close()
+
+    def test_play(self):
+        container = self.compiled(moving_frames())
+        device = PixooMax("record://")
+        device.connect()
+        self.assertTrue(play(container, device))
+        self.assertEqual(device.transport.sent, [bytes(chunk) for chunk in container.chunks])
+
+        device.transport.sent.clear()
+        self.assertTrue(play(container, device, live=True, loops=2))
+        self.assertEqual(device.transport.sent, [bytes(frame) for frame, _ in container.frames] * 2)
+        self.assertRaises(AssertionError, play, container, Pixoo("record://"))
+
+    def test_too_large_animations_are_only_played_live(self):
+        container = self.compiled(noise_frames(40))
+        self.assertEqual((len(container.frames), container.chunks), (40, []))
+        self.assertRaises(AssertionError, play, container, PixooMax("record://"))
+
+    def test_load_frames(self):
+        frames = moving_frames(3)
+        folder = self.directory / "frames"
+        folder.mkdir()
+        frames[0][0].save(folder / "b.png")
+        frames[1][0].save(folder / "a.png")
+        (folder / "notes.txt").write_text("no picture")
+        gif = self.directory / "anim.gif"
+        frames[0][0].save(gif, save_all=True, append_images=[frames[2][0]], duration=[30, 40])
+        loaded = load_frames([folder / "a.png", gif, folder], speed=70)
+        self.assertEqual([duration for _, duration in loaded], [70, 30, 40, 70, 70])
+        self.assertEqual(loaded[0][0].tobytes(), frames[1][0].tobytes())
+
+    def test_other_files_are_rejected(self):
+        path = self.directory / "other.pxf"
+        path.write_bytes(b"GIF89a" + bytes(20))
+        self.assertRaises(ValueError, FrameContainer, path)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,23 @@
+"""
+The encoders against the original per-pixel encoders, byte for byte: python -m unittest discover tests
+"""
+import unittest
+
+from benchmarks.reference_encoder import ENCODERS, encoder_mismatches, random_image
+
+
+class EncoderTest(unittest.TestCase):
+    def test_golden_corpus(self):
+        self.assertEqual(encoder_mismatches(), [])
+
+    def test_single_color(self):
+        # the original PixooMax encoder raised on frames with a single color
+        for device_class, size, pad in ENCODERS:
+            encoded = device_class("record://").encode_raw_image(random_image(size, 1))
+            nb_colors, palette, pixel_data = encoded
+            self.assertEqual((nb_colors, len(palette)), (1, 3))
+            self.assertEqual(len(pixel_data), size * size // 8 + pad)  # one bit per pixel
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+"""
+The fake device parsing what Pixoo sends: python -m unittest discover tests
+"""
+import socket
+import unittest
+from time import monotonic, sleep
+
+from PIL import Image
+
+from modules.fake_device import FakePixoo, SppFrameParser, decode_pic
+from modules.pixoo_client import Pixoo, PixooMax, spp_frame
+
+
+def wait_until(condition, timeout=2):
+    deadline = monotonic() + timeout
+    while not condition():
+        assert monotonic() < deadline, "Timed out"
+        sleep(0.005)
+
+
+def sample_image(size, colors=256):
+    """
+    A size x size image using `colors` colors.
+    """
+    pixels = [(color & 0xFF, color >> 8, 77) for color in (idx * 7 % colors for idx in range(size * size))]
+    img = Image.new("RGB", (size, size))
+    img.putdata(pixels)
+    return img
+
+
+class SppFrameParserTest(unittest.TestCase):
+    def test_frames_split_anywhere(self):
+        stream = spp_frame(0x74, [80]) + spp_frame(0x45, [0x1, 0x2]) + spp_frame(0x44, bytes(300))
+        parser = SppFrameParser()
+        frames = []
+        for offset in range(0, len(stream), 7):
+            frames += parser.feed(stream[offset : offset + 7])
+        self.assertEqual(frames, [(0x74, bytes([80])), (0x45, bytes([1, 2])), (0x44, bytes(300))])
+        self.assertEqual((parser.bad_checksums, parser.garbage_bytes), (0, 0))
+
+    def test_garbage_is_skipped(self):
+        parser = SppFrameParser()
+        self.assertEqual(parser.feed(b"\xff\xfe" + spp_frame(0x74, [10]) + b"\x00"), [(0x74, bytes([10]))])
+        self.assertEqual(parser.garbage_bytes, 3)
+
+    def test_bad_checksums_are_rejected(self):
+        broken = bytearray(spp_frame(0x74, [80]))
+        broken[4] = 81  # the checksum is of 80
+        parser = SppFrameParser()
+        self.assertEqual(parser.feed(bytes(broken) + spp_frame(0x74, [20])), [(0x74, bytes([20]))])
+        self.assertEqual(parser.bad_checksums, 1)
+
+    def test_a_missing_end_byte_is_rejected(self):
+        broken = bytearray(spp_frame(0x74, [80]))
+        broken[-1] = 3
+        parser = SppFrameParser()
+        self.assertEqual(parser.feed(bytes(broken)), [])
+        self.assertEqual(parser.bad_checksums, 1)
+
+
+class DecodePicTest(unittest.TestCase):
+    def test_pictures_decode_to_what_was_drawn(self):
+        for device_class, colors in ((PixooMax, 300), (Pixoo, 256), (PixooMax, 1), (Pixoo, 2)):
+            with self.subTest(device=device_class.__name__, colors=colors):
+                device = device_class("record://")
+                img = sample_image(device.SIZE, colors)
+                (frame,) = SppFrameParser().feed(device.build_pic(img))
+                decoded = decode_pic(frame[1])
+                self.assertEqual(decoded.size, img.size)
+                if device.quantizer is not None:  # PixooMax: at most 256 colors
+                    img = device.quantizer.quantize(img).convert(mode="RGB")
+                self.assertEqual(decoded.tobytes(), img.tobytes())
+
+    def test_other_frames_are_rejected(self):
+        self.assertRaises(ValueError, decode_pic, bytes(20))
+
+
+class FakePixooTest(unittest.TestCase):
+    def setUp(self):
+        self.fake = FakePixoo()
+        self.fake.start()
+        self.addCleanup(self.fake.server_close)
+        self.addCleanup(self.fake.shutdown)
+
+    def test_received_pictures(self):
+        device = PixooMax(self.fake.address)
+        device.connect()
+        self.addCleanup(device.transport.close)
+        device.draw_image(sample_image(32))
+        device.set_system_brightness(50)
+        wait_until(lambda: self.fake.stats()["commands"] == {0x44: 1, 0x74: 1})
+        self.assertEqual(self.fake.last_image.size, (32, 32))
+
+    def test_bad_checksums_are_counted(self):
+        broken = bytearray(spp_frame(0x74, [80]))
+        broken[4] = 81
+        with socket.create_connection(self.fake.server_address) as sock:
+            sock.sendall(bytes(broken) + spp_frame(0x74, [20]))
+            wait_until(lambda: self.fake.stats()["commands"])
+        stats = self.fake.stats()
+        self.assertEqual(stats["commands"], {0x74: 1})
+        self.assertEqual(stats["bad_checksums"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+"""
+The frame cache and its files on disk: python -m unittest discover tests
+"""
+import pickle
+import tempfile
+import unittest
+from pathlib import Path
+
+from modules.frame_cache import FrameCache
+from modules.pixoo_client import PixooMax
+
+
+class Exploit:  # pylint: disable=too-few-public-methods
+    loaded = False
+
+    def __reduce__(self):
+        return (setattr, (Exploit, "loaded", True))
+
+
+class FrameCacheTest(unittest.TestCase):
+    def setUp(self):
+        temporary = tempfile.TemporaryDirectory()
+        self.addCleanup(temporary.cleanup)
+        self.directory = Path(temporary.name)
+
+    def test_entries_are_loaded_again(self):
+        cache = FrameCache(directory=self.directory)
+        cache.put(("pic", 1), b"picture")
+        cache.put(("anim", 2), [b"chunk", b"", b"other chunk"])
+        cache = FrameCache(directory=self.directory)
+        self.assertEqual(cache.get(("pic", 1)), b"picture")
+        self.assertEqual(cache.get(("anim", 2)), [b"chunk", b"", b"other chunk"])
+        self.assertEqual(cache.stats()["bytes"], 23)
+
+    def test_foreign_and_truncated_files_are_removed(self):
+        cache = FrameCache(directory=self.directory)
+        cache.put("key", [b"chunk"] * 3)
+        (path,) = self.directory.glob("*.frame")
+        path.write_bytes(path.read_bytes()[:-2])
+        (self.directory / "pickled.frame").write_bytes(pickle.dumps(("key", Exploit())))
+        cache = FrameCache(directory=self.directory)
+        self.assertIsNone(cache.get("key"))
+        self.assertFalse(Exploit.loaded)
+        self.assertEqual(list(self.directory.iterdir()), [])
+
+    def test_evicted_entries_are_removed_from_disk(self):
+        cache = FrameCache(max_bytes=10, directory=self.directory)
+        for n in range(4):
+            cache.put(n, bytes(4))
+        self.assertEqual(len(list(self.directory.glob("*.frame"))), 2)
+        self.assertEqual(FrameCache(max_bytes=10, directory=self.directory).stats()["entries"], 2)
+
+    def test_files_are_only_read_with_a_cache(self):
+        missing = self.directory / "missing.gif"
+        self.assertIsNone(PixooMax("record://").anim_cache_key("gif", missing))
+        device = PixooMax("record://", frame_cache=FrameCache())
+        self.assertRaises(FileNotFoundError, device.anim_cache_key, "gif", missing)
+
+
+if __name__ == "__main__":
+    unittest.main()
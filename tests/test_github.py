@@ -0,0 +1,102 @@
+"""
+The GitHub poller against a stub GraphQL server on localhost: python -m unittest discover tests
+"""
+import json
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+
+from modules.github import GithubPoller
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    Answers with the `status`, `headers` and `body` of the server, by default the contributions
+    of every requested user (the length of the login), "ghost" is no GitHub user.
+    """
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        body = self.server.body
+        if body is None:
+            logins = {alias: login for alias, login in request["variables"].items() if alias != "day"}
+            users = {
+                alias: {"contributionsCollection": {"totalCommitContributions": len(login)}}
+                for alias, login in logins.items()
+                if login != "ghost"
+            }
+            body = json.dumps({"data": users})
+        content = body.encode()
+        self.send_response(self.server.status)
+        for name, value in self.server.headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        pass
+
+
+class GithubPollerTest(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+        self.server.status, self.server.headers, self.server.body = 200, {}, None
+        Thread(target=self.server.serve_forever, daemon=True).start()
+        endpoint = f"http://127.0.0.1:{self.server.server_address[1]}/graphql"
+        self.poller = GithubPoller(["octocat", "ghost"], endpoint=endpoint, headers={}, interval=60)
+
+    def tearDown(self):
+        self.poller.stop()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def respond(self, status=200, headers=None, body=None):
+        self.server.status, self.server.headers, self.server.body = status, headers or {}, body
+
+    def test_poll(self):
+        self.assertEqual(self.poller.poll(), 60)
+        self.assertEqual(self.poller.snapshot.contributions, {"octocat": 7})
+        self.assertEqual(list(self.poller.snapshot.errors), ["ghost"])
+
+    def test_exhausted_rate_limit_is_waited_out(self):
+        self.respond(headers={"Retry-After": "120"})
+        self.assertEqual(self.poller.poll(), 120)
+
+    def test_malformed_responses_are_failures(self):
+        self.poller.poll()
+        bodies = (
+            "not json",
+            "[]",
+            '{"data": {"u0": {"contributionsCollection": null}}}',
+            '{"data": {"u0": {"contributionsCollection": {"totalCommitContributions": "many"}}}}',
+        )
+        for failures, body in enumerate(bodies, 1):
+            self.respond(body=body)
+            self.assertEqual(self.poller.poll(), 60 * 2 ** (failures - 1), body)
+            self.assertEqual(self.poller.failures, failures)
+            self.assertEqual(set(self.poller.snapshot.errors), {"octocat", "ghost"})
+            self.assertEqual(self.poller.snapshot.contributions, {"octocat": 7})  # the last known
+
+    def test_malformed_rate_limit_headers_are_ignored(self):
+        for headers in (
+            {"Retry-After": "Wed, 21 Oct 2026 07:28:00 GMT"},
+            {"Retry-After": "nan"},
+            {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": "soon"},
+        ):
+            self.respond(status=403, headers=headers)
+            self.poller.failures = 0
+            self.assertEqual(self.poller.poll(), 60, headers)
+            self.respond(headers=headers)
+            self.assertEqual(self.poller.poll(), 60, headers)
+
+    def test_server_errors_back_off(self):
+        self.respond(status=503)
+        self.assertEqual([self.poller.poll() for _ in range(3)], [60, 120, 240])
+        self.respond()
+        self.assertEqual(self.poller.poll(), 60)
+        self.assertEqual(self.poller.failures, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
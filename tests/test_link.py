@@ -0,0 +1,129 @@
+"""
+LinkSupervisor against a scripted transport: python -m unittest discover tests
+"""
+import unittest
+from threading import Event
+from time import monotonic, sleep
+
+from modules.link import MAX_PENDING_FRAMES
+from modules.pixoo_client import PixooMax
+from modules.transport import Transport
+
+
+class ScriptedTransport(Transport):
+    """
+    Fails the next `connect_failures` connects and sends while `broken` is set, keeps what was
+    sent and waits for `gate` before every send.
+    """
+
+    def __init__(self, connect_failures=0):
+        super().__init__()
+        self.connect_failures = connect_failures
+        self.connects = []  # monotonic() of every connect attempt
+        self.broken = Event()
+        self.gate = Event()
+        self.gate.set()
+        self.sent = []
+
+    def open_socket(self):
+        raise NotImplementedError
+
+    def connect(self):
+        self.connects.append(monotonic())
+        if self.connect_failures:
+            self.connect_failures -= 1
+            raise ConnectionRefusedError("refused")
+        self.sock = self
+
+    def send(self, data):
+        self.gate.wait()
+        if self.broken.is_set():
+            raise ConnectionResetError("reset")
+        self.sent.append(bytes(data))
+
+    def close(self):
+        self.sock = None
+
+
+def wait_until(condition, timeout=2):
+    deadline = monotonic() + timeout
+    while not condition():
+        assert monotonic() < deadline, "Timed out"
+        sleep(0.005)
+
+
+class LinkSupervisorTest(unittest.TestCase):
+    def supervised(self, transport, **options):
+        device = PixooMax("scripted", transport=transport)
+        supervisor = device.supervise(**options)
+        self.addCleanup(supervisor.stop)
+        return device, supervisor
+
+    def test_reconnects_back_off(self):
+        transport = ScriptedTransport(connect_failures=4)
+        _, supervisor = self.supervised(transport, min_delay=0.02, max_delay=0.06, jitter=0)
+        wait_until(lambda: supervisor.connected)
+        waits = [later - earlier for earlier, later in zip(transport.connects, transport.connects[1:])]
+        for wait, expected in zip(waits, (0.02, 0.04, 0.06, 0.06)):
+            self.assertGreaterEqual(wait, expected)
+            self.assertLess(wait, expected + 0.05)
+        stats = supervisor.health.stats()
+        self.assertEqual((stats["connect_failures"], stats["reconnects"]), (4, 0))
+        self.assertGreater(stats["seconds_disconnected"], 0.15)
+
+    def test_a_broken_link_reconnects(self):
+        transport = ScriptedTransport()
+        connected = []
+        device, supervisor = self.supervised(transport, min_delay=0.02, on_connect=connected.append)
+        wait_until(lambda: supervisor.connected)
+        transport.broken.set()
+        device.send_pic(b"lost")
+        wait_until(lambda: supervisor.health.send_failures)
+        transport.broken.clear()
+        wait_until(lambda: len(connected) == 2)
+        device.send_pic(b"picture")
+        wait_until(lambda: transport.sent == [b"picture"])
+        stats = supervisor.health.stats()
+        self.assertEqual((stats["send_failures"], stats["reconnects"]), (1, 1))
+        self.assertEqual(connected, [device, device])
+
+    def test_the_latest_picture_waits_for_the_link(self):
+        transport = ScriptedTransport(connect_failures=2)
+        device, supervisor = self.supervised(transport, min_delay=0.02, jitter=0)
+        for picture in (b"old", b"older", b"latest"):
+            device.send_pic(picture)
+        wait_until(lambda: transport.sent)
+        self.assertEqual(transport.sent, [b"latest"])
+        self.assertEqual(supervisor.health.stats()["dropped"], 2)
+
+    def test_batches_are_dropped_while_down(self):
+        transport = ScriptedTransport(connect_failures=100)
+        device, _ = self.supervised(transport, min_delay=10)
+        self.assertFalse(device.send_anim_chunks([b"a", b"b"]))
+        self.assertEqual(transport.sent, [])
+
+    def test_a_large_batch_is_sent_whole(self):
+        transport = ScriptedTransport()
+        device, supervisor = self.supervised(transport)
+        wait_until(lambda: supervisor.connected)
+        chunks = [bytes([n & 0xFF]) for n in range(MAX_PENDING_FRAMES + 10)]
+        self.assertTrue(device.send_anim_chunks(chunks))
+        wait_until(lambda: len(transport.sent) == len(chunks))
+        self.assertEqual(transport.sent, chunks)
+
+    def test_a_batch_that_does_not_fit_is_dropped_whole(self):
+        transport = ScriptedTransport()
+        device, supervisor = self.supervised(transport)
+        wait_until(lambda: supervisor.connected)
+        transport.gate.clear()  # the first batch stays queued
+        self.assertTrue(device.send_anim_chunks([b"first"] * (MAX_PENDING_FRAMES - 1)))
+        self.assertFalse(device.send_anim_chunks([b"second"] * 2))
+        self.assertTrue(device.send_anim_chunks([b"third"]))
+        transport.gate.set()
+        wait_until(lambda: len(transport.sent) == MAX_PENDING_FRAMES)
+        self.assertNotIn(b"second", transport.sent)
+        self.assertEqual(supervisor.health.stats()["dropped"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
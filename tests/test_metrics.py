@@ -0,0 +1,51 @@
+"""
+Stage timers and the /metrics text: python -m unittest discover tests
+"""
+import unittest
+
+from modules.metrics import Registry, Timer, render_metrics, summary
+
+
+class MetricsTest(unittest.TestCase):
+    def setUp(self):
+        self.registry = Registry()
+        self.registry.timer("encode").record(0.002)
+        self.registry.timer("encode").record(0.004)
+        self.registry.timer("render", "Clock").record(0.001)
+        self.registry.gauge("links", lambda: {"b": 2, "a": 1})
+
+    def test_timer(self):
+        timer = Timer()
+        for seconds in (0.5, 2.0, 1.0):
+            timer.record(seconds)
+        self.assertEqual((timer.count, timer.total, timer.max), (3, 3.5, 2.0))
+
+    def test_families_are_not_interleaved(self):
+        lines = render_metrics(self.registry).splitlines()
+        families = []
+        for line in lines:
+            family = line.split()[2] if line.startswith("# TYPE") else None
+            if family is None:
+                name = line.split("{")[0].split()[0]
+                family = "pixoo_stage_seconds" if name.endswith(("_count", "_sum")) else name
+            if not families or families[-1] != family:
+                families.append(family)
+        self.assertEqual(families, ["pixoo_stage_seconds", "pixoo_stage_seconds_max", "pixoo_links"])
+        self.assertIn('pixoo_stage_seconds_count{stage="encode"} 2', lines)
+        self.assertIn('pixoo_stage_seconds_max{stage="render",class="Clock"} 0.001000', lines)
+        self.assertEqual(lines[-2:], ['pixoo_links{label="a"} 1', 'pixoo_links{label="b"} 2'])
+
+    def test_failing_gauges_are_reported(self):
+        self.registry.gauge("broken", lambda: 1 / 0)
+        self.assertIn("# broken failed: ZeroDivisionError", render_metrics(self.registry))
+
+    def test_summary_resets_the_maximums(self):
+        self.assertEqual(
+            summary(self.registry),
+            "Metrics (calls mean/max ms): encode 2x 3.00/4.00, render/Clock 1x 1.00/1.00",
+        )
+        self.assertEqual(self.registry.timer("encode").max, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
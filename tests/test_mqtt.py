@@ -0,0 +1,120 @@
+"""
+MQTT commands and Home Assistant discovery, without a broker: python -m unittest discover tests
+"""
+import json
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from modules import mqtt
+from modules.mqtt import MqttBridge, discovery_payloads, payload_color
+
+
+class FakeManager:
+    def __init__(self, *addresses):
+        self.devices = [SimpleNamespace(mac_address=address, connected=True) for address in addresses]
+        self.commands = []
+
+    def command(self, name, *args):
+        self.commands.append((name, *args))
+
+
+class FakePipeline:
+    def __init__(self):
+        self.paused = False
+
+    def pause(self):
+        self.paused = True
+
+    def resume(self):
+        self.paused = False
+
+
+class DiscoveryTest(unittest.TestCase):
+    def test_a_light_and_a_sensor_per_device(self):
+        payloads = dict(discovery_payloads("pixoo", "pixoo", ["11:75:58:F0:DE:D6", "tcp://host:4000"]))
+        self.assertEqual(
+            sorted(payloads),
+            [
+                "homeassistant/binary_sensor/pixoo/11_75_58_f0_de_d6/config",
+                "homeassistant/binary_sensor/pixoo/tcp_host_4000/config",
+                "homeassistant/light/pixoo/display/config",
+            ],
+        )
+        light = payloads["homeassistant/light/pixoo/display/config"]
+        self.assertEqual((light["command_topic"], light["state_topic"]), ("pixoo/set", "pixoo/state"))
+        self.assertEqual(light["unique_id"], "pixoo_display")
+        sensor = payloads["homeassistant/binary_sensor/pixoo/tcp_host_4000/config"]
+        self.assertEqual(sensor["unique_id"], "pixoo_tcp_host_4000_link")
+        self.assertIn('value_json.devices["tcp://host:4000"]', sensor["value_template"])
+        self.assertEqual(len({payload["unique_id"] for payload in payloads.values()}), 3)
+        json.dumps(payloads)  # published as JSON
+
+    def test_payload_color(self):
+        self.assertEqual(payload_color(b"ON"), (0, 255, 0, 255))
+        self.assertEqual(payload_color(b" open\n"), (0, 255, 0, 255))
+        self.assertEqual(payload_color(b"off"), (255, 0, 0, 255))
+        self.assertEqual(payload_color(b"#0000ff"), (0, 0, 255, 255))
+        self.assertEqual(payload_color(b"#nope"), (255, 0, 0, 255))
+
+
+# the client is never connected, so paho-mqtt itself isn't needed either
+@mock.patch.object(mqtt, "mqtt", mock.Mock())
+@mock.patch.object(mqtt, "new_client", mock.MagicMock)
+class MqttBridgeTest(unittest.TestCase):
+    def bridge(self):
+        bridge = MqttBridge("localhost", prefix="pixoo")
+        bridge.client.is_connected.return_value = False
+        manager, pipeline = FakeManager("11:75:58:F0:DE:D6"), FakePipeline()
+        bridge.attach(manager, pipeline)
+        return bridge, manager, pipeline
+
+    @staticmethod
+    def receive(bridge, topic, payload):
+        bridge.client.on_message(bridge.client, None, SimpleNamespace(topic=topic, payload=payload))
+
+    def published_state(self, bridge):
+        topic, text = bridge.client.publish.call_args.args
+        self.assertEqual(topic, "pixoo/state")
+        return json.loads(text)
+
+    def test_brightness(self):
+        bridge, manager, _ = self.bridge()
+        self.receive(bridge, "pixoo/set", b'{"brightness": 40}')
+        self.receive(bridge, "pixoo/set", b'{"brightness": 400}')
+        self.assertEqual(manager.commands, [("set_system_brightness", 40), ("set_system_brightness", 100)])
+        state = self.published_state(bridge)
+        self.assertEqual((state["state"], state["brightness"]), ("ON", 100))
+        self.assertEqual(state["devices"], {"11:75:58:F0:DE:D6": True})
+
+    def test_off_and_on(self):
+        bridge, manager, pipeline = self.bridge()
+        self.receive(bridge, "pixoo/set", b'{"state": "OFF"}')
+        self.assertTrue(pipeline.paused)
+        self.assertEqual(self.published_state(bridge)["state"], "OFF")
+        self.receive(bridge, "pixoo/set", b'{"state": "ON", "brightness": 30}')
+        self.assertFalse(pipeline.paused)
+        self.assertEqual(manager.commands, [("set_system_brightness", 0), ("set_system_brightness", 30)])
+
+    def test_invalid_commands_are_ignored(self):
+        bridge, manager, pipeline = self.bridge()
+        for payload in (b"brighter", b'{"brightness": "high"}', b"5", b'{"brightness": null}'):
+            self.receive(bridge, "pixoo/set", payload)
+        self.assertEqual(manager.commands, [])
+        self.assertFalse(pipeline.paused)
+        bridge.client.publish.assert_not_called()
+
+    def test_values_and_listeners(self):
+        bridge, _, _ = self.bridge()
+        changes = []
+        bridge.listeners.append(lambda: changes.append(1))
+        source = bridge.source("home/text")
+        self.assertIsNone(source())
+        for payload in (b"Hello", b"Hello", b"World"):
+            self.receive(bridge, "home/text", payload)
+        self.assertEqual((source(), len(changes), bridge.messages), (b"World", 2, 3))
+        self.assertRaises(AssertionError, bridge.source, "home/#")
+
+
+if __name__ == "__main__":
+    unittest.main()
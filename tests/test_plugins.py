@@ -0,0 +1,80 @@
+"""
+Scene validation and its error messages: python -m unittest discover tests
+"""
+import unittest
+from unittest import mock
+
+from modules.plugins import PLUGINS, REQUIRED, Plugin, build_widgets, color, register, validate_scene
+
+
+def dot_widget(position, size):
+    return ("dot", position, size)
+
+
+class ValidateSceneTest(unittest.TestCase):
+    def assertInvalid(self, scene, *fragments):  # pylint: disable=invalid-name
+        with self.assertRaises(AssertionError) as context:
+            validate_scene(scene)
+        for fragment in fragments:
+            self.assertIn(fragment, str(context.exception))
+
+    def test_defaults_are_filled_in(self):
+        ((plugin, options),) = validate_scene("graph metric=memory color=#ff000080")
+        self.assertIs(plugin, PLUGINS["graph"])
+        self.assertEqual(
+            options,
+            {
+                "position": (0, 24),
+                "metric": "memory",
+                "size": (32, 8),
+                "color": (255, 0, 0, 128),
+                "max_value": None,
+            },
+        )
+
+    def test_text_options_can_contain_spaces(self):
+        ((_, options),) = validate_scene("text text=Hello_world")
+        self.assertEqual(options["text"], "Hello world")
+
+    def test_unknown_plugins_and_options(self):
+        self.assertInvalid("clock; weather", "Unknown plugin 'weather'", "clock")
+        self.assertInvalid("clock colour=red", "Unknown option(s) ['colour'] of 'clock'", "position")
+
+    def test_missing_options_and_settings(self):
+        self.assertInvalid("marquee", "'marquee' needs the option text=...")
+        with mock.patch.dict("os.environ", {"GITHUB_TOKEN": ""}):
+            self.assertInvalid("github user=octocat", "'github' needs the GITHUB_TOKEN setting")
+        with mock.patch.dict("os.environ", {"GITHUB_TOKEN": "token"}):
+            self.assertInvalid("github", "needs the option user=...")
+
+    def test_invalid_values(self):
+        for scene, fragments in (
+            ("clock position=1", ("Invalid position='1' of 'clock'",)),
+            ("graph metric=gpu", ("Invalid metric='gpu'", "use one of cpu")),
+            ("graph color=#12345", ("Invalid color='#12345'", "#rrggbb[aa]")),
+            ("graph color=0,0,300", ("Invalid color='0,0,300'",)),
+            ("slideshow folder=. shuffle=maybe", ("Invalid shuffle='maybe'", "true or false")),
+            ("marquee text=hi speed=fast", ("Invalid speed='fast' of 'marquee'",)),
+        ):
+            with self.subTest(scene=scene):
+                self.assertInvalid(scene, *fragments)
+
+    def test_malformed_scenes(self):
+        self.assertInvalid(" ; ", "The scene is empty")
+        self.assertInvalid("clock position", "Options are key=value, got 'position'")
+
+    def test_color(self):
+        self.assertEqual(color("90,255,90"), (90, 255, 90, 255))
+        self.assertEqual(color("#5aff5a"), (90, 255, 90, 255))
+        self.assertRaises(ValueError, color, "1,2")
+
+
+class BuildWidgetsTest(unittest.TestCase):
+    def test_registered_plugins(self):
+        register("dot", Plugin(f"{__name__}:dot_widget", {"size": (int, REQUIRED)}))
+        self.addCleanup(PLUGINS.pop, "dot")
+        self.assertEqual(build_widgets("dot size=2 position=3,4"), [("dot", (3, 4), 2)])
+
+
+if __name__ == "__main__":
+    unittest.main()
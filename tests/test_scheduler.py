@@ -0,0 +1,154 @@
+"""
+Schedules, their carried over settings and the scheduler switching scenes:
+python -m unittest discover tests
+"""
+import unittest
+from datetime import datetime
+
+from modules.scheduler import Rule, Schedule, Scheduler, parse_days, parse_schedule
+
+MONDAY = datetime(2026, 10, 19)
+
+
+def at(day, time):
+    hour, minute = (int(value) for value in time.split(":"))
+    return MONDAY.replace(day=MONDAY.day + day, hour=hour, minute=minute)
+
+
+class FakePipeline:
+    def __init__(self):
+        self.render = None
+        self.fps = 10
+        self.paused = False
+
+    def pause(self):
+        self.paused = True
+
+    def resume(self):
+        self.paused = False
+
+
+class FakeManager:
+    def __init__(self):
+        self.commands = []
+        self.forgotten = 0
+
+    def command(self, name, *args):
+        self.commands.append((name, *args))
+
+    def forget_frames(self):
+        self.forgotten += 1
+
+
+class FakeService:
+    def __init__(self):
+        self.running = True
+
+    def start(self):
+        self.running = True
+
+    def stop(self):
+        self.running = False
+
+
+class ParseScheduleTest(unittest.TestCase):
+    def test_parse_days(self):
+        self.assertEqual(parse_days("*"), frozenset(range(7)))
+        self.assertEqual(parse_days("mon-fri"), frozenset(range(5)))
+        self.assertEqual(parse_days("sat,sun"), frozenset({5, 6}))
+        self.assertEqual(parse_days("fri-mon"), frozenset({4, 5, 6, 0}))
+        self.assertRaises(ValueError, parse_days, "someday")
+
+    def test_parse_schedule(self):
+        rules = parse_schedule("07:00 mon-fri default brightness=80 fps=12.5;; 23:00 off box_mode=1 ")
+        self.assertEqual(len(rules), 2)
+        day, night = rules
+        self.assertEqual((day.time, day.days, day.scene), ((7, 0), frozenset(range(5)), "default"))
+        self.assertEqual((day.brightness, day.fps, day.off), (80, 12.5, False))
+        self.assertEqual((night.time, night.days, night.scene), ((23, 0), parse_days("*"), None))
+        self.assertEqual((night.off, night.box_mode), (True, 1))
+        self.assertTrue(parse_schedule("20:00 night fps=0")[0].off)
+
+    def test_invalid_rules_are_rejected(self):
+        for text in ("25:00 default", "07:00 default speed=2", "07:00 default brightness=high", "seven"):
+            with self.subTest(text=text):
+                self.assertRaises((AssertionError, ValueError), parse_schedule, text)
+
+
+class ScheduleTest(unittest.TestCase):
+    schedule = Schedule(
+        parse_schedule(
+            "07:00 mon-fri default brightness=80 fps=10; 09:00 sat,sun default; 20:00 night; 23:00 off"
+        )
+    )
+
+    def test_values_are_carried_over(self):
+        settings = self.schedule.settings(at(0, "21:00"))
+        self.assertEqual(
+            settings, {"scene": "night", "off": False, "brightness": 80, "fps": 10, "box_mode": None}
+        )
+        self.assertTrue(self.schedule.settings(at(0, "23:30"))["off"])
+
+    def test_the_night_lasts_until_the_next_rule(self):
+        self.assertTrue(self.schedule.settings(at(1, "06:59"))["off"])
+        monday = self.schedule.settings(at(1, "07:00"))
+        self.assertEqual((monday["scene"], monday["off"]), ("default", False))
+        self.assertTrue(self.schedule.settings(at(5, "08:00"))["off"])  # saturday starts at 09:00
+
+    def test_next_transition(self):
+        self.assertEqual(self.schedule.next_transition(at(0, "07:00")), at(0, "20:00"))
+        self.assertEqual(self.schedule.next_transition(at(4, "23:30")), at(5, "09:00"))
+        self.assertIsNone(Schedule([]).next_transition(MONDAY))
+
+
+class SchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.now = at(0, "12:00")
+        self.pipeline, self.manager, self.service = FakePipeline(), FakeManager(), FakeService()
+        rules = parse_schedule("07:00 default brightness=80; 20:00 night fps=2; 23:00 off box_mode=1")
+        self.scheduler = Scheduler(
+            Schedule(rules),
+            {"default": "render default", "night": "render night"},
+            self.pipeline,
+            self.manager,
+            services=[self.service],
+            now=lambda: self.now,
+        )
+
+    def switch_to(self, time):
+        self.now = at(*time) if isinstance(time, tuple) else at(0, time)
+        return self.scheduler.apply()
+
+    def test_scenes_and_settings_are_switched(self):
+        self.assertEqual(self.switch_to("12:00"), at(0, "20:00"))
+        self.assertEqual(self.pipeline.render, "render default")
+        self.assertEqual(self.manager.commands, [("set_system_brightness", 80)])
+        self.switch_to("20:00")
+        self.assertEqual((self.pipeline.render, self.pipeline.fps), ("render night", 2))
+        self.assertEqual(len(self.manager.commands), 1)  # the brightness didn't change
+
+    def test_off_pauses_until_the_next_rule(self):
+        self.switch_to("23:00")
+        self.assertTrue(self.pipeline.paused)
+        self.assertFalse(self.service.running)
+        self.assertEqual(self.manager.commands[-1], ("set_box_mode", 1))
+        self.assertEqual(self.manager.forgotten, 1)
+
+        self.switch_to((1, "07:00"))
+        self.assertFalse(self.pipeline.paused)
+        self.assertTrue(self.service.running)
+        self.assertEqual(self.pipeline.render, "render default")
+        self.assertEqual(self.manager.forgotten, 2)  # the devices showed their clock, send the scene again
+
+    def test_unchanged_settings_do_nothing(self):
+        self.switch_to("12:00")
+        self.switch_to("13:00")
+        self.assertEqual(self.manager.commands, [("set_system_brightness", 80)])
+
+    def test_unknown_scenes_are_rejected(self):
+        rules = [Rule("07:00", scene="party")]
+        self.assertRaises(AssertionError, Scheduler, Schedule(rules), {}, self.pipeline, self.manager)
+
+
+if __name__ == "__main__":
+    unittest.main()
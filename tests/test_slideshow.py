@@ -0,0 +1,115 @@
+"""
+Slideshow scanning, prefetching and cropping: python -m unittest discover tests
+"""
+import tempfile
+import unittest
+from pathlib import Path
+from time import monotonic, sleep
+
+from PIL import Image
+
+from modules.slideshow import Slideshow, SlideshowWidget, fit_box, load_image, scan
+
+
+def wait_until(condition, timeout=2):
+    deadline = monotonic() + timeout
+    while not condition():
+        assert monotonic() < deadline, "Timed out"
+        sleep(0.005)
+
+
+class SlideshowTest(unittest.TestCase):
+    def setUp(self):
+        temporary = tempfile.TemporaryDirectory()
+        self.addCleanup(temporary.cleanup)
+        self.directory = Path(temporary.name)
+
+    def picture(self, name, size=(400, 200), color=(200, 0, 0)):
+        path = self.directory / name
+        Image.new("RGB", size, color).save(path)
+        return str(path)
+
+    def slideshow(self, **options):
+        slideshow = Slideshow(self.directory, **options)
+        slideshow.start()
+        self.addCleanup(slideshow.stop)
+        return slideshow
+
+    def test_scan_finds_pictures_only(self):
+        pictures = {self.picture("a.png"), self.picture("b.JPG")}
+        (self.directory / "notes.txt").write_text("no picture")
+        (self.directory / "folder.png").mkdir()
+        self.assertEqual(set(scan(self.directory)), pictures)
+
+    def test_load_image_reduces_to_the_working_size(self):
+        for name in ("large.jpg", "large.png"):
+            with self.subTest(name=name):
+                img = load_image(self.picture(name, size=(1200, 900)), 128)
+                self.assertEqual(img.mode, "RGB")
+                self.assertEqual(min(img.size), 128)
+                self.assertAlmostEqual(img.width / img.height, 4 / 3, places=1)
+        self.assertEqual(load_image(self.picture("small.png", size=(40, 20)), 128).size, (40, 20))
+
+    def test_fit_box(self):
+        self.assertEqual(fit_box((400, 200)), (100, 0, 300, 200))
+        self.assertEqual(fit_box((400, 200), zoom=2, center=(0, 0)), (0, 0, 100, 100))
+        self.assertEqual(fit_box((400, 200), zoom=2, center=(1, 1)), (300, 100, 400, 200))
+        self.assertEqual(fit_box((200, 400), aspect=2), (0, 150, 200, 250))
+
+    def test_prefetch_is_bounded(self):
+        for n in range(6):
+            self.picture(f"{n}.png")
+        slideshow = self.slideshow(prefetch=2)
+        wait_until(slideshow.queue.full)
+        sleep(0.05)
+        self.assertEqual(slideshow.queue.qsize(), 2)
+
+    def test_slides_switch_after_their_duration(self):
+        self.picture("red.png", color=(255, 0, 0))
+        self.picture("blue.png", color=(0, 0, 255))
+        slideshow = self.slideshow(duration=10, pan_zoom=False)
+        wait_until(slideshow.queue.full)
+        first, _ = slideshow.position(now=100)
+        self.assertIs(slideshow.position(now=109)[0], first)
+        self.assertEqual(slideshow.position(now=105)[1], 0.5)
+        second, progress = slideshow.position(now=110)
+        self.assertIsNot(second, first)
+        self.assertEqual(progress, 0)
+
+    def test_frames_are_cropped_to_a_square(self):
+        path = self.directory / "halves.png"
+        img = Image.new("RGB", (400, 200), (255, 0, 0))
+        img.paste((0, 0, 255), (200, 0, 400, 200))
+        img.save(path)
+        slideshow = self.slideshow(size=16, pan_zoom=False)
+        wait_until(lambda: slideshow.frame(now=1) is not None)
+        frame = slideshow.frame(now=1)
+        self.assertEqual(frame.size, (16, 16))
+        self.assertEqual(frame.getpixel((0, 8)), (255, 0, 0))  # the center square, half of each color
+        self.assertEqual(frame.getpixel((15, 8)), (0, 0, 255))
+        self.assertIs(slideshow.frame(now=2), frame)  # a still is only resized once
+
+    def test_panning_stays_inside_the_picture(self):
+        self.picture("wide.png", size=(600, 200))
+        slideshow = self.slideshow(size=32, pan_zoom=True)
+        wait_until(lambda: slideshow.frame(now=1) is not None)
+        slide, _ = slideshow.position(now=1)
+        for progress in (0, 0.5, 1):
+            left, top, right, bottom = slide.box(progress)
+            self.assertTrue(0 <= left < right <= slide.source.width)
+            self.assertTrue(0 <= top < bottom <= slide.source.height)
+        self.assertEqual(slideshow.frame(now=5).size, (32, 32))
+
+    def test_broken_pictures_are_skipped(self):
+        (self.directory / "broken.png").write_bytes(b"not a picture")
+        slideshow = self.slideshow()
+        wait_until(lambda: slideshow.failed)
+
+    def test_widget_without_pictures_is_empty(self):
+        widget = SlideshowWidget(Slideshow(self.directory, size=8))
+        widget.update()
+        self.assertEqual(widget.render().getbbox(), None)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+"""
+Ring buffers and the scrolling graphs of the system load: python -m unittest discover tests
+"""
+import tempfile
+import unittest
+from pathlib import Path
+
+from modules.system import MetricGraph, ProcCollector, RingBuffer
+
+PROC_FILES = {
+    "stat": "cpu  {busy} 0 0 {idle} 0 0 0 0 0 0\ncpu0 0 0 0 0 0 0 0 0 0 0\n",
+    "meminfo": "MemTotal: 1000 kB\nMemFree: 100 kB\nMemAvailable: 250 kB\n",
+    "net/dev": "header\nheader\n    lo: 999 0 0 0 0 0 0 0 999 0\n  eth0: {net} 0 0 0 0 0 0 0 {net} 0\n",
+    "diskstats": "",
+}
+
+
+class RingBufferTest(unittest.TestCase):
+    def test_keeps_the_latest_values_oldest_first(self):
+        ring = RingBuffer(3, "i")
+        self.assertEqual((list(ring), len(ring), ring.latest(-1)), ([], 0, -1))
+        for value in range(1, 6):
+            ring.append(value)
+        self.assertEqual(list(ring), [3, 4, 5])
+        self.assertEqual((len(ring), ring.latest()), (3, 5))
+
+    def test_partly_filled(self):
+        ring = RingBuffer(4)
+        ring.append(0.5)
+        ring.append(1.5)
+        self.assertEqual(list(ring), [0.5, 1.5])
+        self.assertEqual(ring.latest(), 1.5)
+
+
+class ProcCollectorTest(unittest.TestCase):
+    def test_samples_from_proc_files(self):
+        with tempfile.TemporaryDirectory() as proc:
+            (Path(proc) / "net").mkdir()
+            collector = ProcCollector(proc=proc)
+            for busy, idle, net in ((100, 100, 0), (150, 250, 1000)):
+                for name, text in PROC_FILES.items():
+                    (Path(proc) / name).write_text(text.format(busy=busy, idle=idle, net=net))
+                collector.sample()
+            collector.stop()
+        self.assertEqual(collector.samples, 1)  # the first sample is the baseline
+        self.assertAlmostEqual(collector.values("cpu")[0], 50 / 200)
+        self.assertAlmostEqual(collector.values("memory")[0], 0.75)
+        self.assertGreater(collector.values("net_rx")[0], 0)
+
+
+class MetricGraphTest(unittest.TestCase):
+    def setUp(self):
+        self.collector = ProcCollector(history=8)
+
+    def add_samples(self, *values):
+        for value in values:
+            self.collector.history["cpu"].append(value)
+            self.collector.samples += 1
+
+    def drawn_from_scratch(self, **options):
+        graph = MetricGraph(self.collector, "cpu", size=(4, 4), **options)
+        return graph.draw(self.collector.samples).tobytes()
+
+    def test_shifted_graph_equals_a_full_redraw(self):
+        graph = MetricGraph(self.collector, "cpu", size=(4, 4))
+        for values in ((0.25,), (1, 0.5), (0, 0.75, 0.25), (1,) * 5):
+            self.add_samples(*values)
+            with self.subTest(values=values):
+                self.assertEqual(graph.draw(self.collector.samples).tobytes(), self.drawn_from_scratch())
+
+    def test_newest_sample_on_the_right(self):
+        graph = MetricGraph(self.collector, "cpu", size=(4, 4))
+        self.add_samples(1, 0)
+        bitmap = graph.draw(self.collector.samples)
+        self.assertEqual([bitmap.getpixel((x, 3))[3] for x in range(4)], [0, 0, 255, 0])
+        self.add_samples(0.5)
+        bitmap = graph.draw(self.collector.samples)
+        self.assertEqual([bitmap.getpixel((x, 3))[3] for x in range(4)], [0, 255, 0, 255])
+        self.assertEqual([bitmap.getpixel((1, y))[3] for y in range(4)], [255] * 4)
+
+    def test_rescaled_when_the_largest_value_changes(self):
+        graph = MetricGraph(self.collector, "cpu", size=(4, 4), max_value=0)
+        self.add_samples(2, 4)
+        graph.draw(self.collector.samples)
+        self.add_samples(8)
+        self.assertEqual(graph.draw(self.collector.samples).tobytes(), self.drawn_from_scratch(max_value=0))
+        self.assertEqual(graph.scale, 8)
+
+    def test_unknown_metrics_are_rejected(self):
+        self.assertRaises(AssertionError, MetricGraph, self.collector, "gpu")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,128 @@
+"""
+Widgets refreshing their data and redrawing only on changes: python -m unittest discover tests
+"""
+import unittest
+from threading import Event
+from time import monotonic, sleep
+
+from PIL import Image
+
+from modules.widgets import DrawWidget, PixelIndicator, Sparkline, Widget, WidgetScene
+
+
+def wait_until(condition, timeout=2):
+    deadline = monotonic() + timeout
+    while not condition():
+        assert monotonic() < deadline, "Timed out"
+        sleep(0.005)
+
+
+class Source:
+    """
+    Returns `value` and counts the calls, raises `value` if it is an exception.
+    """
+
+    def __init__(self, value):
+        self.value = value
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if isinstance(self.value, Exception):
+            raise self.value
+        return self.value
+
+
+class WidgetTest(unittest.TestCase):
+    def test_redrawn_only_on_changes(self):
+        source = Source((255, 0, 0, 255))
+        widget = PixelIndicator(source, refresh_interval=10)
+        self.assertTrue(widget.update())
+        layer = widget.render()
+        self.assertEqual(layer.getpixel((0, 0)), (255, 0, 0, 255))
+
+        self.assertFalse(widget.update())
+        self.assertIs(widget.render(), layer)
+        self.assertEqual((widget.updates, widget.renders), (2, 1))
+
+        source.value = (0, 255, 0, 255)
+        self.assertTrue(widget.update())
+        self.assertEqual(widget.render().getpixel((0, 0)), (0, 255, 0, 255))
+        self.assertEqual(widget.renders, 2)
+
+    def test_the_same_failure_is_no_change(self):
+        source = Source(ValueError("offline"))
+        widget = PixelIndicator(source, refresh_interval=10)
+        self.assertTrue(widget.update())
+        self.assertEqual(widget.render().getpixel((0, 0)), widget.error_color)
+        self.assertFalse(widget.update())
+        source.value = (1, 2, 3, 255)
+        self.assertTrue(widget.update())
+        self.assertIsNone(widget.error)
+
+    def test_costly_widgets_render_when_updated(self):
+        widget = Sparkline(Source([1, 2, 3]), refresh_interval=10, render_cost=1)
+        widget.update()
+        self.assertEqual(widget.renders, 1)
+        widget.render()
+        self.assertEqual(widget.renders, 1)
+
+    def test_draw_widgets_without_a_source_always_change(self):
+        widget = DrawWidget(lambda: Image.new("RGBA", (1, 1), (0, 0, 0, 255)))
+        self.assertTrue(widget.update())
+        self.assertTrue(widget.update())
+
+
+class WidgetSceneTest(unittest.TestCase):
+    def scene(self, widgets, **options):
+        scene = WidgetScene(widgets, **options)
+        scene.start()
+        self.addCleanup(scene.stop)
+        return scene
+
+    def test_scheduled_widgets_refresh_on_their_own(self):
+        changed = Event()
+        slow, fast = Source((255, 0, 0, 255)), Source((0, 0, 255, 255))
+        scene = self.scene(
+            [
+                PixelIndicator(slow, refresh_interval=60),
+                PixelIndicator(fast, position=(1, 0), refresh_interval=0.02),
+            ],
+            on_change=changed.set,
+        )
+        wait_until(lambda: fast.calls >= 5)
+        self.assertTrue(changed.is_set())
+        self.assertEqual(slow.calls, 1)
+        frame = scene.render()
+        self.assertEqual(frame.getpixel((0, 0)), (255, 0, 0, 255))
+        self.assertEqual(frame.getpixel((1, 0)), (0, 0, 255, 255))
+        self.assertEqual(scene.widgets[1].renders, 1)  # unchanged data isn't drawn again
+
+    def test_no_change_no_callback(self):
+        changes = []
+        source = Source((255, 0, 0, 255))
+        self.scene([PixelIndicator(source, refresh_interval=0.02)], on_change=lambda: changes.append(1))
+        wait_until(lambda: source.calls >= 5)
+        self.assertEqual(changes, [1])
+
+    def test_widgets_without_data_are_not_drawn(self):
+        widget = PixelIndicator(Source((255, 0, 0, 255)), refresh_interval=60)
+        scene = WidgetScene([widget])  # not started, nothing was fetched
+        self.assertEqual(scene.render().getpixel((0, 0)), (0, 0, 0, 255))
+        self.assertEqual(widget.renders, 0)
+
+    def test_live_widgets_update_on_every_frame(self):
+        source = Source((255, 255, 255, 255))
+        scene = WidgetScene([PixelIndicator(source)])
+        for _ in range(3):
+            scene.render()
+        self.assertEqual(source.calls, 3)
+        self.assertEqual(scene.widgets[0].renders, 1)
+        self.assertEqual(scene.stats(), {"0:PixelIndicator": {"updates": 3, "renders": 1}})
+
+    def test_widgets_must_draw(self):
+        self.assertRaises(NotImplementedError, Widget().draw, None)
+
+
+if __name__ == "__main__":
+    unittest.main()
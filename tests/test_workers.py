@@ -0,0 +1,103 @@
+"""
+ProcessPipeline rendering in worker processes and sending to a fake device:
+python -m unittest discover tests
+"""
+import unittest
+from itertools import count
+from time import monotonic, sleep
+
+from PIL import Image
+
+from modules.devices import DeviceManager, parse_devices
+from modules.fake_device import FakePixoo
+from modules.workers import FrameRing, ProcessPipeline, load_renderer
+
+
+def wait_until(condition, timeout=10):
+    deadline = monotonic() + timeout
+    while not condition():
+        assert monotonic() < deadline, "Timed out"
+        sleep(0.01)
+
+
+def moving_pixel():
+    """
+    A renderer built in every worker: a white pixel moving a step on every frame.
+    """
+    frames = count()
+
+    def render():
+        img = Image.new("RGB", (32, 32))
+        img.putpixel((next(frames) % 32, 0), (255, 255, 255))
+        return img
+
+    return render
+
+
+def still_image():
+    return lambda: Image.new("RGB", (32, 32), (10, 20, 30))
+
+
+class FrameRingTest(unittest.TestCase):
+    def test_slots_round_trip(self):
+        ring = FrameRing(2, size=4, payloads=2)
+        self.addCleanup(ring.close)
+        rgb = bytes(range(48))
+        ring.write(1, 7, rgb, [b"first", b""])
+        self.assertEqual(ring.read(1), (7, rgb, [b"first", b""]))
+        self.assertRaises(ValueError, ring.write, 0, 8, rgb, [bytes(5000), b""])
+
+    def test_load_renderer(self):
+        render = load_renderer(f"{__name__}:still_image")
+        self.assertEqual(render().getpixel((0, 0)), (10, 20, 30))
+
+
+class ProcessPipelineTest(unittest.TestCase):
+    def run_pipeline(self, renderer, until):
+        fake = FakePixoo()
+        fake.start()
+        self.addCleanup(fake.server_close)
+        self.addCleanup(fake.shutdown)
+        manager = DeviceManager(parse_devices(f"{fake.address}=pixoo_max"))
+        manager.start()
+        self.addCleanup(manager.stop)
+        wait_until(lambda: all(device.connected for device in manager.devices))
+
+        pipeline = ProcessPipeline(f"{__name__}:{renderer}", manager, fps=20, workers=2)
+        pipeline.start()
+        try:
+            wait_until(lambda: until(pipeline, fake))
+        finally:
+            pipeline.stop()
+        return pipeline, fake
+
+    def test_frames_reach_the_device(self):
+        # a newer picture replaces one the device link didn't send yet, count what was received
+        pipeline, fake = self.run_pipeline(
+            "moving_pixel", lambda pipeline, fake: fake.stats()["commands"].get(0x44, 0) >= 10
+        )
+        self.assertEqual(fake.stats()["bad_pictures"], 0)
+        self.assertEqual(fake.last_image.size, (32, 32))
+        self.assertEqual(sum(fake.last_image.getpixel((x, 0)) == (255, 255, 255) for x in range(32)), 1)
+        self.assertIn("fps sent", pipeline.report())
+
+    def test_report_measures_the_interval(self):
+        manager = DeviceManager(parse_devices("record://=pixoo_max"))
+        pipeline = ProcessPipeline(f"{__name__}:still_image", manager, workers=1, report_interval=10)
+        self.addCleanup(pipeline.ring.close)
+        for _ in range(20):
+            pipeline.latency.record(0.01)
+        pipeline.last_report = monotonic() - 2  # reported late, e.g. after a suspend
+        report = pipeline.report()
+        self.assertTrue(report.startswith("Workers: 10.0 fps sent"), report)
+
+    def test_unchanged_frames_are_not_sent_again(self):
+        pipeline, fake = self.run_pipeline("still_image", lambda pipeline, fake: pipeline.skipped >= 10)
+        self.assertEqual(pipeline.sent, 1)
+        wait_until(lambda: fake.last_image is not None)
+        self.assertEqual(fake.stats()["commands"], {0x44: 1})
+        self.assertEqual(fake.last_image.getpixel((5, 5)), (10, 20, 30))
+
+
+if __name__ == "__main__":
+    unittest.main()